@@ -1,23 +1,33 @@
 import os
+import json
 import asyncio
 import time
 import uuid
 from datetime import datetime, timedelta
 from typing import Optional, List, Dict, Any
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, status, Request, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, Response, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from sqlalchemy import select, desc
+from sqlalchemy import select, update, delete, desc, func, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from dotenv import load_dotenv
 
-from db import SessionLocal, init_db, User, Message, UploadedFile, Task, TaskStatus, Meeting, ProjectSettings, Decision, Milestone, ProjectSettings, DecisionLog, DecisionCategory, DecisionType, ActiveConflict, ConflictVote, Group, GroupMembership
+from db import SessionLocal, init_db, User, Message, UploadedFile, Task, TaskStatus, Meeting, ProjectSettings, Decision, Milestone, ProjectSettings, DecisionLog, DecisionCategory, DecisionType, ActiveConflict, ConflictVote, Group, GroupMembership, MessageEvent
 from auth import get_password_hash, verify_password, create_access_token, get_current_user_token
-from websocket_manager import ConnectionManager
-from llm import chat_completion
-from file_processor import extract_text_from_pdf, extract_text_from_docx, chunk_text
+from websocket_manager import manager, group_topic, dm_topic, message_topic, negotiate_encoding
+from change_notifier import change_notifier
+from serializers import task_to_dict, meeting_to_dict, milestone_to_dict, conflict_to_dict
+from user_cache import get_username, get_usernames, remember_username, invalidate_user, get_user_cache_stats
+from dashboard import get_dashboard_cached, get_dashboard_stats
+from task_assignees import set_task_assignees, assigned_to_username, parse_assignees
+from dates import iso_date, iso_datetime
+from blob_store import blob_store, BLOB_SWEEP_INTERVAL, BLOB_SWEEP_GRACE
+from llm import chat_completion, init_http_client, close_http_client, get_llm_stats
+from llm_scheduler import PRIORITY_BACKGROUND
+from file_processor import chunk_text
+from uploads import store_upload, too_large, MAX_UPLOAD_MB
 from vector_db import add_documents, search_documents, delete_documents_by_file_id, collection
 from conversation_chain import conversation_chain, clear_conversation_history
 from chat_compactor import compact_chat_history, should_compact_history
@@ -27,13 +37,17 @@ from project_manager import analyze_project, get_project_status
 from task_extractor import extract_tasks
 from meeting_detector import detect_meeting_request, generate_zoom_link
 from dialectic_engine import monitor_message_for_conflicts, process_vote_command, SocraticInterventionGenerator
-from project_pulse import calculate_project_pulse
+from project_pulse import calculate_project_pulse, load_project_pulse
 from milestone_suggester import suggest_milestones
-from milestone_manager import detect_milestone_changes
+from milestone_manager import wants_milestone_change, plan_milestone_change, apply_milestone_change
 from task_assigner import assign_task_to_user
 from role_normalizer import normalize_role
 from task_manager import detect_task_action
 from task_assignment_detector import detect_task_assignment
+from message_analyzer import analyze_message, get_analyzer_stats
+from message_features import extract_features, classify_chit_chat
+from message_pipeline import message_pipeline, conversation_key, PipelineFull, MESSAGE_EVENT_RECLAIM_AFTER, MESSAGE_EVENT_SWEEP_INTERVAL
+from detector_registry import Detector, DetectorRegistry
 from tone_adjuster import adjust_tone, TONES
 from user_preferences import set_user_tone, get_user_tone
 
@@ -41,6 +55,9 @@ load_dotenv()
 
 APP_HOST = os.getenv("APP_HOST", "0.0.0.0")
 APP_PORT = int(os.getenv("APP_PORT", "8000"))
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() in ("1", "true", "yes")
+# Minimum delay between message_delta events for one streamed answer
+STREAM_FLUSH_INTERVAL = float(os.getenv("STREAM_FLUSH_INTERVAL", "0.05"))
 
 app = FastAPI(title="OmniPal Chat")
 
@@ -53,7 +70,14 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-manager = ConnectionManager()
+UPLOAD_PATHS = ("/api/upload", "/transcript")
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Refuse uploads whose Content-Length is over the limit before the body is read."""
+    if request.method == "POST" and request.url.path.endswith(UPLOAD_PATHS) and too_large(request.headers.get("content-length")):
+        return JSONResponse({"detail": f"File is larger than {MAX_UPLOAD_MB:g} MB"}, status_code=413)
+    return await call_next(request)
 
 # Duplicate prevention: track recent questions
 recent_questions = {}
@@ -61,6 +85,9 @@ recent_questions = {}
 # Context tracking: remember when waiting for meeting info
 waiting_for_meeting_info = {}
 
+# Only one chat compaction at a time
+_compaction_lock = asyncio.Lock()
+
 # --------- Schemas ---------
 class AuthPayload(BaseModel):
     username: str
@@ -92,7 +119,7 @@ async def generate_and_update_summary(file_id: int, text: str, filename: str):
                 file_obj.summary = summary
                 await session.commit()
                 print(f"Summary saved to database for file {file_id}")
-                await manager.broadcast({"type": "file_summary_updated", "file_id": file_id})
+                await manager.publish_group(file_obj.group_id, {"type": "file_summary_updated", "file_id": file_id})
             else:
                 print(f"File {file_id} not found in database")
     except Exception as e:
@@ -103,18 +130,43 @@ async def generate_and_update_summary(file_id: int, text: str, filename: str):
                 if file_obj:
                     file_obj.summary = f"Summary generation failed: {str(e)}"
                     await session.commit()
-                    await manager.broadcast({"type": "file_summary_updated", "file_id": file_id})
+                    await manager.publish_group(file_obj.group_id, {"type": "file_summary_updated", "file_id": file_id})
         except:
             pass
 
-async def broadcast_message(session: AsyncSession, msg: Message):
+async def sweep_unreferenced_blobs():
+    """Background task to delete blobs that no uploaded file references any more.
+
+    Identical uploads share a blob, so deleting a file row leaves the blob for this sweep:
+    an upload of the same content may still be on its way to committing its row. Blobs
+    stored within BLOB_SWEEP_GRACE are skipped (storing existing content refreshes that).
+    """
+    while True:
+        try:
+            await asyncio.sleep(BLOB_SWEEP_INTERVAL)
+            candidates = await asyncio.to_thread(lambda: list(blob_store.keys_older_than(BLOB_SWEEP_GRACE)))
+            removed = 0
+            async with SessionLocal() as session:
+                for start in range(0, len(candidates), 500):
+                    batch = candidates[start:start + 500]
+                    res = await session.execute(
+                        select(UploadedFile.blob_key, UploadedFile.text_key)
+                        .where(or_(UploadedFile.blob_key.in_(batch), UploadedFile.text_key.in_(batch)))
+                    )
+                    referenced = {key for row in res.all() for key in row}
+                    for key in batch:
+                        if key not in referenced and blob_store.delete_if_older(key, BLOB_SWEEP_GRACE):
+                            removed += 1
+            if removed:
+                print(f"🧹 Removed {removed} unreferenced blobs")
+        except Exception as e:
+            print(f"Blob sweep failed: {e}")
+
+async def broadcast_message(session: AsyncSession, msg: Message, stream_id: Optional[str] = None, event_type: str = "message"):
     # Load username
-    username = None
-    if msg.user_id:
-        u = await session.get(User, msg.user_id)
-        username = u.username if u else "unknown"
-    await manager.broadcast({
-        "type": "message",
+    username = await get_username(session, msg.user_id) if msg.user_id else None
+    event = {
+        "type": event_type,
         "message": {
             "id": msg.id,
             "username": username if not msg.is_bot else "LLM Bot",
@@ -122,8 +174,66 @@ async def broadcast_message(session: AsyncSession, msg: Message):
             "is_bot": msg.is_bot,
             "created_at": str(msg.created_at)
         }
+    }
+    if stream_id:
+        # Lets clients replace the in-progress streamed answer with the saved message
+        event["stream_id"] = stream_id
+    await manager.publish(message_topic(msg.group_id, msg.user_id, msg.dm_user_id), event)
+
+async def send_private_message(user_id: int, content: str):
+    """Show a bot message to one user only (not saved to DB)."""
+    await manager.publish_user(user_id, {
+        "type": "message",
+        "message": {
+            "id": -1,
+            "username": "LLM Bot",
+            "content": content,
+            "is_bot": True,
+            "created_at": str(datetime.now()),
+            "private": True
+        }
     })
 
+async def notify_assignees(session: AsyncSession, assigned_to: Optional[str], text: str):
+    """Send a notice to each assigned user's own sockets."""
+    usernames = [name.strip() for name in (assigned_to or "").split(",") if name.strip()]
+    if not usernames:
+        return
+    res = await session.execute(select(User.id).where(User.username.in_(usernames)))
+    for user_id in res.scalars().all():
+        await manager.publish_user(user_id, {"type": "notice", "message": text})
+
+class DeltaPublisher:
+    """on_delta callback that pushes streamed tokens to clients in small batches.
+
+    close() must run when the answer is done: it publishes the tokens still pending and,
+    when the answer failed, a message_stream_error so clients drop the partial answer.
+    """
+
+    def __init__(self, stream_id: str, group_id: Optional[int] = None):
+        self.stream_id = stream_id
+        self.group_id = group_id
+        self._pending = []
+        self._last_flush = 0.0
+
+    async def __call__(self, token: str):
+        self._pending.append(token)
+        if time.monotonic() - self._last_flush >= STREAM_FLUSH_INTERVAL:
+            await self.flush()
+
+    async def flush(self):
+        self._last_flush = time.monotonic()
+        if not self._pending:
+            return
+        delta = "".join(self._pending)
+        self._pending.clear()
+        await manager.publish_group(self.group_id, {"type": "message_delta", "stream_id": self.stream_id, "group_id": self.group_id, "delta": delta})
+
+    async def close(self, error: Optional[BaseException] = None):
+        await self.flush()
+        if error is not None:
+            await manager.publish_group(self.group_id, {"type": "message_stream_error", "stream_id": self.stream_id, "group_id": self.group_id, "error": str(error) or type(error).__name__})
+
 async def extract_and_save_tasks(session: AsyncSession, content: str, message_id: int) -> bool:
     """Extract and save tasks from a message. Returns True if tasks were added."""
     print(f"Extracting tasks from: {content}")
@@ -131,32 +241,44 @@ async def extract_and_save_tasks(session: AsyncSession, content: str, message_id
     print(f"Extracted {len(tasks)} tasks: {tasks}")
     if tasks:
         task_names = []
+        created = []
+        undated = []
         for task_data in tasks:
             if isinstance(task_data, dict):
+                raw_due = task_data.get("due_date")
+                due_date = iso_date(raw_due)
+                if raw_due and due_date is None:
+                    # Free-text dates ("Friday") are not stored; ask for one in the confirmation
+                    print(f"⚠️  Unparseable due date {raw_due!r} for task {task_data.get('task')!r}")
+                    undated.append(task_data.get("task"))
                 task = Task(
                     content=task_data.get("task"),
                     extracted_from_message_id=message_id,
                     status=TaskStatus.pending,
-                    due_date=task_data.get("due_date") if task_data.get("due_date") else None,
-                    assigned_to=task_data.get("assigned_to") if task_data.get("assigned_to") else None
+                    due_date=due_date
                 )
+                session.add(task)
+                await set_task_assignees(session, task, task_data.get("assigned_to"))
                 task_names.append(task.content)
                 print(f"Created task: {task.content}, due: {task.due_date}, assigned: {task.assigned_to}")
             else:
                 task = Task(content=task_data, extracted_from_message_id=message_id, status=TaskStatus.pending)
                 task_names.append(task_data)
-            session.add(task)
+                session.add(task)
+            created.append(task)
         await session.commit()
-        await session.flush()
         print("Tasks committed to database")
-        await manager.broadcast({"type": "tasks_updated"})
-        print(f"Broadcast tasks_updated event to {len(manager.active_connections)} connections")
+        # One coalesced tasks_updated event carries all extracted tasks
+        for task in created:
+            change_notifier.changed("tasks", None, task.id)
         
         # Send confirmation message
         if len(task_names) == 1:
             confirmation = f"✅ Added task: **{task_names[0]}**"
         else:
             confirmation = f"✅ Added {len(task_names)} tasks: " + ", ".join([f"**{t}**" for t in task_names])
+        if undated:
+            confirmation += "\n\n📅 I couldn't read a due date for " + ", ".join([f"**{t}**" for t in undated]) + ". Please give it as YYYY-MM-DD."
         bot_msg = Message(user_id=None, content=confirmation, is_bot=True)
         session.add(bot_msg)
         await session.commit()
@@ -165,7 +287,7 @@ async def extract_and_save_tasks(session: AsyncSession, content: str, message_id
         return True
     return False
 
-async def detect_and_suggest_meeting(session: AsyncSession, content: str, user_id: int, group_id: int = None) -> bool:
+async def detect_and_suggest_meeting(session: AsyncSession, content: str, user_id: int, group_id: int = None, verdict=None, meeting_info: Optional[dict] = None) -> bool:
     """Detect meeting requests and auto-create meeting with extracted details. Returns True if handled."""
     print(f"detect_and_suggest_meeting called with content: {content}")
     
@@ -204,7 +326,8 @@ async def detect_and_suggest_meeting(session: AsyncSession, content: str, user_i
             elif ':' not in time_str:
                 time_str = f"{time_str}:00"
             
-            meeting_data['datetime'] = f"{date_str}T{time_str}"
+            # None (e.g. "2025-02-30") keeps the date/time on the missing list
+            meeting_data['datetime'] = iso_datetime(f"{date_str}T{time_str}")
         
         # Try to parse duration (e.g., "60 minutes", "1 hour", "30min")
         duration_match = re.search(r'(\d+)\s*(?:min|minute|minutes|hour|hours|hrs?)', content_without_url, re.IGNORECASE)
@@ -247,7 +370,7 @@ async def detect_and_suggest_meeting(session: AsyncSession, content: str, user_i
             await session.commit()
             await session.refresh(meeting)
             
-            await manager.broadcast({"type": "meetings_updated"})
+            change_notifier.changed("meetings", group_id, meeting.id)
             
             attendees_str = f" with {meeting.attendees}" if meeting.attendees else ""
             bot_msg = Message(
@@ -289,9 +412,12 @@ async def detect_and_suggest_meeting(session: AsyncSession, content: str, user_i
             await broadcast_message(session, bot_msg)
             return True
     
-    meeting_info = await detect_meeting_request(content)
+    if meeting_info is None:
+        meeting_info = await detect_meeting_request(content, verdict)
     print(f"Meeting info detected: {meeting_info}")
     if meeting_info:
+        # The LLM may answer with free text ("next Tuesday"); anything unparseable is asked for again
+        meeting_info["datetime"] = iso_datetime(meeting_info.get("datetime"))
         # Check what info is missing
         missing = []
         if not meeting_info.get("title") or meeting_info.get("title") == "Team Meeting":
@@ -338,8 +464,7 @@ async def detect_and_suggest_meeting(session: AsyncSession, content: str, user_i
         print(f"✅ Meeting created in DB: ID={meeting.id}, title={meeting.title}, datetime={meeting.datetime}, attendees={meeting.attendees}")
         
         # Broadcast update FIRST
-        await manager.broadcast({"type": "meetings_updated"})
-        print("Broadcast meetings_updated event")
+        change_notifier.changed("meetings", group_id, meeting.id)
         
         # Send confirmation message
         attendees_str = f" with {meeting.attendees}" if meeting.attendees else ""
@@ -356,10 +481,9 @@ async def detect_and_suggest_meeting(session: AsyncSession, content: str, user_i
         return True
     return False
 
-async def detect_and_set_ship_date(session: AsyncSession, content: str) -> bool:
-    """Detect natural language ship date setting. Returns True if handled."""
+def find_ship_date(content: str) -> Optional[str]:
+    """Return the YYYY-MM-DD ship date a message sets, if any."""
     import re
-    from datetime import datetime
     
     # Check for ship date patterns
     patterns = [
@@ -380,33 +504,42 @@ async def detect_and_set_ship_date(session: AsyncSession, content: str) -> bool:
             try:
                 # Validate date format
                 datetime.strptime(date_str, "%Y-%m-%d")
-                
-                # Get or create project settings
-                settings_res = await session.execute(select(ProjectSettings).limit(1))
-                settings = settings_res.scalar_one_or_none()
-                if not settings:
-                    settings = ProjectSettings(ship_date=date_str)
-                    session.add(settings)
-                else:
-                    settings.ship_date = date_str
-                await session.commit()
-                
-                # Send confirmation message
-                bot_msg = Message(user_id=None, content=f"🚢 Ship date set to: **{date_str}**", is_bot=True)
-                session.add(bot_msg)
-                await session.commit()
-                await session.refresh(bot_msg)
-                await broadcast_message(session, bot_msg)
-                
-                # Broadcast ship date update to refresh frontend
-                await manager.broadcast({"type": "ship_date_updated", "ship_date": date_str})
-                return True
+                return date_str
             except ValueError:
                 continue
     
-    return False
+    return None
 
-async def maybe_answer_with_llm(session: AsyncSession, content: str, message_id: int = None, user_id: int = None, group_id: int = None):
+async def detect_and_set_ship_date(session: AsyncSession, content: str, date_str: Optional[str] = None) -> bool:
+    """Detect natural language ship date setting. Returns True if handled."""
+    date_str = date_str or find_ship_date(content)
+    if not date_str:
+        return False
+    
+    # Get or create project settings
+    settings_res = await session.execute(select(ProjectSettings).limit(1))
+    settings = settings_res.scalar_one_or_none()
+    if not settings:
+        settings = ProjectSettings(ship_date=date_str)
+        session.add(settings)
+    else:
+        settings.ship_date = date_str
+    await session.commit()
+    
+    # Send confirmation message
+    bot_msg = Message(user_id=None, content=f"🚢 Ship date set to: **{date_str}**", is_bot=True)
+    session.add(bot_msg)
+    await session.commit()
+    await session.refresh(bot_msg)
+    await broadcast_message(session, bot_msg)
+    
+    # Broadcast ship date update to refresh frontend
+    await manager.broadcast({"type": "ship_date_updated", "ship_date": date_str})
+    return True
+
+async def maybe_answer_with_llm(session: AsyncSession, content: str, message_id: int = None, user_id: int = None, group_id: int = None, verdict=None):
+    stream_id = None
+    publisher = None
     # Check for milestone suggestion command, accept all, or requests for more stages
     if content.strip().lower() == "accept all":
         # Get current suggested milestones from recent bot message
@@ -427,6 +560,10 @@ async def maybe_answer_with_llm(session: AsyncSession, content: str, message_id:
                         match = re.match(r'\d+\. (.+?) \((.+?) to (.+?)\)', line.strip())
                         if match:
                             title, start_date, end_date = match.groups()
+                            start_date, end_date = iso_date(start_date), iso_date(end_date)
+                            if not start_date or not end_date or end_date < start_date:
+                                print(f"⚠️  Skipping milestone with unreadable dates: {line.strip()}")
+                                continue
                             milestones.append({"title": title, "start_date": start_date, "end_date": end_date})
                 
                 if milestones:
@@ -454,7 +591,7 @@ async def maybe_answer_with_llm(session: AsyncSession, content: str, message_id:
             await session.commit()
             
             # Broadcast milestone update
-            await manager.broadcast({"type": "milestones_updated"})
+            change_notifier.reset("milestones", group_id)
             
             # Send confirmation
             reply_text = f"✅ **Accepted all {len(milestone_data)} milestones!**\n\nMilestones added to project timeline."
@@ -481,7 +618,14 @@ async def maybe_answer_with_llm(session: AsyncSession, content: str, message_id:
             if extra_param.isdigit():
                 milestone_count = int(extra_param)
             elif '-' in extra_param:  # likely a date
-                ship_date = extra_param
+                ship_date = iso_date(extra_param)
+                if ship_date is None:
+                    bot_msg = Message(user_id=None, content=f"❌ `{extra_param}` is not a date. Use `/milestones YYYY-MM-DD` to set the ship date.", is_bot=True, group_id=group_id)
+                    session.add(bot_msg)
+                    await session.commit()
+                    await session.refresh(bot_msg)
+                    await broadcast_message(session, bot_msg)
+                    return
         
         # Save ship date if provided
         if ship_date:
@@ -537,7 +681,7 @@ Provide a brief, practical explanation focusing on project flow and timeline con
         await broadcast_message(session, bot_msg)
         
         # Broadcast milestone suggestions to frontend to trigger UI
-        await manager.broadcast({"type": "milestones_suggested", "milestones": milestones, "ship_date": current_ship_date})
+        await manager.publish_group(group_id, {"type": "milestones_suggested", "milestones": milestones, "ship_date": current_ship_date})
         
         return
     elif content.strip().lower().startswith("/project analyze"):
@@ -567,7 +711,6 @@ Provide a brief, practical explanation focusing on project flow and timeline con
             # Create manual vote
             from datetime import datetime, timedelta
             from db import ActiveConflict, ConflictSeverity
-            import uuid
             
             conflict_id = f"V{str(uuid.uuid4())[:8].upper()}"
             expires_at = datetime.now() + timedelta(hours=2)
@@ -589,7 +732,7 @@ Provide a brief, practical explanation focusing on project flow and timeline con
             reply_text = f"🗳️ **TEAM VOTE STARTED** - {conflict_id}\n\n**Question:** {vote_question}\n\n**Options:**\n**A:** Yes/Approve\n**B:** No/Reject\n**C:** Alternative/Modify\n\nVote with: `@bot decision {conflict_id} A/B/C [your reasoning]`"
             
             # Broadcast new vote
-            await manager.broadcast({"type": "new_conflict", "conflict_id": conflict_id})
+            await manager.publish_group(group_id, {"type": "new_conflict", "conflict_id": conflict_id})
     elif content.strip().lower().startswith("/role "):
         # Set user's role: /role Frontend Developer
         user_input = content.strip()[6:].strip()
@@ -615,6 +758,7 @@ Provide a brief, practical explanation focusing on project flow and timeline con
                     # Update global role
                     user.role = normalized_role
                 await session.commit()
+                invalidate_user(user_id)
                 if normalized_role != user_input:
                     reply_text = f"✅ Your role has been set to: **{normalized_role}**\n\n💡 Normalized from: \"{user_input}\""
                 else:
@@ -637,27 +781,27 @@ Provide a brief, practical explanation focusing on project flow and timeline con
             # Assign existing task by ID
             task = await session.get(Task, int(assign_param))
             if task:
-                result = await assign_task_to_user(session, task.content, task.id, content, group_id=payload.group_id)
+                result = await assign_task_to_user(session, task.content, task.id, content, group_id=group_id)
                 due_date_text = f"\n📅 Due: {result['due_date']}" if result.get('due_date') else ""
                 reply_text = f"✅ Task assigned to **{result['assigned_to']}**{due_date_text}\n\n📋 Task: {task.content}\n\n💡 Reason: {result['reason']}"
-                await manager.broadcast({"type": "tasks_updated"})
+                change_notifier.changed("tasks", group_id, task.id)
             else:
                 reply_text = f"❌ Task #{assign_param} not found"
         else:
             # Assign new task with natural language support
-            result = await assign_task_to_user(session, assign_param, None, content, group_id=payload.group_id)
+            result = await assign_task_to_user(session, assign_param, None, content, group_id=group_id)
             task = Task(
                 content=assign_param,
-                assigned_to=result['assigned_to'],
                 due_date=result.get('due_date'),
                 status=TaskStatus.pending,
                 group_id=group_id
             )
             session.add(task)
+            await set_task_assignees(session, task, result['assigned_to'])
             await session.commit()
             due_date_text = f"\n📅 Due: {result['due_date']}" if result.get('due_date') else ""
             reply_text = f"✅ Task created and assigned to **{result['assigned_to']}**{due_date_text}\n\n📋 Task: {assign_param}\n\n💡 Reason: {result['reason']}"
-            await manager.broadcast({"type": "tasks_updated"})
+            change_notifier.changed("tasks", group_id, task.id)
     elif content.strip().lower() == "/decisions":
         from db import DecisionLog
         if group_id:
@@ -676,12 +820,12 @@ Provide a brief, practical explanation focusing on project flow and timeline con
         tasks_res = await session.execute(select(Task).where(Task.status == TaskStatus.pending, Task.assigned_to == None).order_by(desc(Task.created_at)).limit(1))
         task = tasks_res.scalar_one_or_none()
         if task:
-            await manager.broadcast({"type": "open_assign_modal", "task_id": task.id})
+            await manager.publish_user(user_id, {"type": "open_assign_modal", "task_id": task.id})
         else:
             reply_text = "No unassigned tasks found."
         return
     elif content.strip().lower() == "/schedule":
-        await manager.broadcast({"type": "open_meeting_modal"})
+        await manager.publish_user(user_id, {"type": "open_meeting_modal"})
         return
     elif content.strip().lower().startswith("/ship date"):
         # Extract date if provided
@@ -746,7 +890,10 @@ Provide a brief, practical explanation focusing on project flow and timeline con
         recent_questions[message_key] = current_time
         
         try:
-            reply_text = await conversation_chain.get_response(content)
+            if LLM_STREAMING:
+                stream_id = uuid.uuid4().hex
+                publisher = DeltaPublisher(stream_id, group_id)
+            reply_text = await conversation_chain.get_response(content, on_delta=publisher, verdict=verdict)
             
             # Check if response is a vote request
             if reply_text.startswith("__VOTE_REQUEST__"):
@@ -755,7 +902,6 @@ Provide a brief, practical explanation focusing on project flow and timeline con
                 # Create manual vote (same logic as /vote command)
                 from datetime import datetime, timedelta
                 from db import ActiveConflict, ConflictSeverity
-                import uuid
                 
                 conflict_id = f"V{str(uuid.uuid4())[:8].upper()}"
                 expires_at = datetime.now() + timedelta(hours=2)
@@ -777,7 +923,7 @@ Provide a brief, practical explanation focusing on project flow and timeline con
                 reply_text = f"🗳️ **TEAM VOTE STARTED** - {conflict_id}\n\n**Question:** {vote_question}\n\n**Options:**\n**A:** Yes/Approve\n**B:** No/Reject\n**C:** Alternative/Modify\n\nVote with: `@bot decision {conflict_id} A/B/C [your reasoning]`"
                 
                 # Broadcast new vote
-                await manager.broadcast({"type": "new_conflict", "conflict_id": conflict_id})
+                await manager.publish_group(group_id, {"type": "new_conflict", "conflict_id": conflict_id})
             
             # Check if response is a milestone request
             elif reply_text.startswith("__MILESTONE_REQUEST__"):
@@ -817,7 +963,7 @@ Provide a brief, practical explanation focusing on project flow and timeline con
                 reply_text += f"\n🧠 Reasoning: {reasoning}\n\nReply **\"accept all\"** to add all milestones to your project."
                 
                 # Broadcast milestone suggestions to frontend
-                await manager.broadcast({"type": "milestones_suggested", "milestones": milestones, "ship_date": current_ship_date})
+                await manager.publish_group(group_id, {"type": "milestones_suggested", "milestones": milestones, "ship_date": current_ship_date})
             
             # Check if response is a task request
             elif reply_text.startswith("__TASK_REQUEST__"):
@@ -835,19 +981,41 @@ Provide a brief, practical explanation focusing on project flow and timeline con
         except Exception as e:
             reply_text = f"(LLM error) {e}"
     
-    bot_msg = Message(user_id=None, content=reply_text, is_bot=True, group_id=group_id)
-    session.add(bot_msg)
-    await session.commit()
-    await session.refresh(bot_msg)
-    await broadcast_message(session, bot_msg)
+    error = None
+    try:
+        if publisher:
+            # Last tokens go out before the saved message replaces the streamed answer
+            await publisher.flush()
+        bot_msg = Message(user_id=None, content=reply_text, is_bot=True, group_id=group_id)
+        session.add(bot_msg)
+        await session.commit()
+        await session.refresh(bot_msg)
+        await broadcast_message(session, bot_msg, stream_id=stream_id)
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        if publisher:
+            await publisher.close(error)
 
 # --------- Routes ---------
 @app.on_event("startup")
 async def on_startup():
+    await init_http_client()
     await init_db()
     await run_migrations()
     asyncio.create_task(check_expired_assignments())
     asyncio.create_task(check_expired_votes())
+    asyncio.create_task(sweep_unreferenced_blobs())
+    message_pipeline.start(handle_message_event)
+    asyncio.create_task(recover_message_events())
+    await manager.start()
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await message_pipeline.stop()
+    await manager.stop()
+    await close_http_client()
 
 async def check_expired_votes():
     """Background task to check for expired votes and generate outcome statements."""
@@ -908,7 +1076,7 @@ Provide a concise statement that:
 Start with: "✅ Vote Concluded:"""
                         
                         try:
-                            outcome_statement = await chat_completion([{"role": "user", "content": outcome_prompt}], temperature=0.3)
+                            outcome_statement = await chat_completion([{"role": "user", "content": outcome_prompt}], temperature=0.3, priority=PRIORITY_BACKGROUND)
                         except:
                             outcome_statement = f"✅ Vote Concluded: Team chose Option {winner} with {vote_counts[winner]} votes (A:{vote_counts['A']}, B:{vote_counts['B']}, C:{vote_counts['C']})."
                     else:
@@ -929,7 +1097,7 @@ Start with: "✅ Vote Concluded:"""
                     await session.commit()
                     await session.refresh(bot_msg)
                     await broadcast_message(session, bot_msg)
-                    await manager.broadcast({"type": "voting_updated"})
+                    change_notifier.changed("conflicts", conflict.group_id, conflict.conflict_id)
         except Exception as e:
             print(f"Error checking expired votes: {e}")
 
@@ -950,7 +1118,7 @@ async def check_expired_assignments():
                 
                 for task in expired_tasks:
                     assignee = task.assigned_to
-                    task.assigned_to = None
+                    await set_task_assignees(session, task, None)
                     task.pending_assignment = False
                     task.assignment_expires_at = None
                     await session.commit()
@@ -958,13 +1126,14 @@ async def check_expired_assignments():
                     bot_msg = Message(
                         user_id=None,
                         content=f"⏰ Task assignment expired. **@{assignee}** didn't respond.\n\n📋 Task: **{task.content}**\n\nNow open for anyone to claim: `claim {task.id}`",
-                        is_bot=True
+                        is_bot=True,
+                        group_id=task.group_id
                     )
                     session.add(bot_msg)
                     await session.commit()
                     await session.refresh(bot_msg)
                     await broadcast_message(session, bot_msg)
-                    await manager.broadcast({"type": "tasks_updated"})
+                    change_notifier.changed("tasks", task.group_id, task.id)
         except Exception as e:
             print(f"Error checking expired assignments: {e}")
 
@@ -994,7 +1163,7 @@ async def generate_login_summary(username: str, session: AsyncSession, group_id:
         tasks_res = await session.execute(
             select(Task).where(
                 Task.status == TaskStatus.pending,
-                Task.assigned_to.like(f"%{username}%"),
+                assigned_to_username(username),
                 Task.group_id == group_id
             ).order_by(Task.due_date)
         )
@@ -1002,7 +1171,7 @@ async def generate_login_summary(username: str, session: AsyncSession, group_id:
         tasks_res = await session.execute(
             select(Task).where(
                 Task.status == TaskStatus.pending,
-                Task.assigned_to.like(f"%{username}%"),
+                assigned_to_username(username),
                 Task.group_id == None
             ).order_by(Task.due_date)
         )
@@ -1016,11 +1185,11 @@ async def generate_login_summary(username: str, session: AsyncSession, group_id:
     from datetime import datetime
     if group_id:
         meetings_res = await session.execute(
-            select(Meeting).where(Meeting.datetime >= datetime.now().isoformat(), Meeting.group_id == group_id).order_by(Meeting.datetime).limit(3)
+            select(Meeting).where(Meeting.datetime >= datetime.now(), Meeting.group_id == group_id).order_by(Meeting.datetime).limit(3)
         )
     else:
         meetings_res = await session.execute(
-            select(Meeting).where(Meeting.datetime >= datetime.now().isoformat(), Meeting.group_id == None).order_by(Meeting.datetime).limit(3)
+            select(Meeting).where(Meeting.datetime >= datetime.now(), Meeting.group_id == None).order_by(Meeting.datetime).limit(3)
         )
     meetings = meetings_res.scalars().all()
     
@@ -1033,12 +1202,12 @@ async def generate_login_summary(username: str, session: AsyncSession, group_id:
     
     if messages:
         context += "Recent chat (last 20 messages):\n"
+        names = await get_usernames(session, [m.user_id for m in messages[-10:] if not m.is_bot])
         for m in messages[-10:]:
             if m.is_bot:
                 context += f"Bot: {m.content[:100]}...\n"
             else:
-                user_res = await session.get(User, m.user_id)
-                uname = user_res.username if user_res else "unknown"
+                uname = names.get(m.user_id, "unknown")
                 context += f"{uname}: {m.content[:100]}...\n"
     
     if pending_assignments:
@@ -1072,9 +1241,9 @@ async def login(payload: AuthPayload, session: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     token = create_access_token({"sub": u.username})
     
-    # Generate login summary asynchronously
+    # Generate login summary asynchronously; it goes only to this user's sockets, and is
+    # held for them if their WebSocket is not connected yet
     async def send_summary():
-        await asyncio.sleep(1)  # Wait for WebSocket connection
         async with SessionLocal() as new_session:
             # Get user's last active group
             user_res = await new_session.execute(select(User).where(User.username == payload.username))
@@ -1085,11 +1254,7 @@ async def login(payload: AuthPayload, session: AsyncSession = Depends(get_db)):
             # Remove any prefix like "Here's a brief welcome message for username:"
             import re
             summary = re.sub(r'^.*?welcome message.*?:\s*["\']?', '', summary, flags=re.IGNORECASE).strip('"\'')
-            bot_msg = Message(user_id=None, content=f"👋 {summary}", is_bot=True, group_id=group_id)
-            new_session.add(bot_msg)
-            await new_session.commit()
-            await new_session.refresh(bot_msg)
-            await broadcast_message(new_session, bot_msg)
+            await send_private_message(u.id, f"👋 {summary}")
     
     asyncio.create_task(send_summary())
     return {"ok": True, "token": token}
@@ -1106,6 +1271,7 @@ async def update_user_role(payload: RolePayload, username: str = Depends(get_cur
         raise HTTPException(status_code=404, detail="User not found")
     user.role = payload.role
     await session.commit()
+    invalidate_user(user.id)
     return {"ok": True, "role": user.role}
 
 @app.get("/api/users")
@@ -1115,32 +1281,56 @@ async def get_users(username: str = Depends(get_current_user_token), session: As
     users = res.scalars().all()
     return {"users": [{"username": u.username, "role": u.role} for u in users]}
 
+def _messages_with_usernames():
+    """Messages joined with their author's username, so a page loads in one query."""
+    return select(Message, User.username).outerjoin(User, User.id == Message.user_id)
+
+# Largest page /api/messages returns
+MESSAGE_PAGE_MAX = 200
+
+def _message_page(query, limit: int, before_id: Optional[int], after_id: Optional[int]):
+    """Apply an id cursor. One extra row is fetched to tell whether there are more."""
+    if after_id is not None:
+        return query.where(Message.id > after_id).order_by(Message.id).limit(limit + 1)
+    if before_id is not None:
+        query = query.where(Message.id < before_id)
+    return query.order_by(desc(Message.id)).limit(limit + 1)
+
 @app.get("/api/messages")
-async def get_messages(limit: int = 50, group_id: Optional[int] = None, dm_user_id: Optional[int] = None, session: AsyncSession = Depends(get_db), username: str = Depends(get_current_user_token)):
+async def get_messages(limit: int = 50, group_id: Optional[int] = None, dm_user_id: Optional[int] = None, before_id: Optional[int] = None, after_id: Optional[int] = None, session: AsyncSession = Depends(get_db), username: str = Depends(get_current_user_token)):
+    """A page of messages in id order (oldest first).
+
+    Without cursors: the newest page. before_id: the page just older than that message
+    (scrolling back). after_id: messages newer than that id (catching up after a
+    reconnect). has_more says whether another page exists in the same direction.
+    """
+    limit = max(1, min(limit, MESSAGE_PAGE_MAX))
     if dm_user_id:
         user_res = await session.execute(select(User).where(User.username == username))
         current_user = user_res.scalar_one_or_none()
-        from sqlalchemy import or_, and_
-        res = await session.execute(
-            select(Message).where(
-                Message.dm_user_id != None,
-                or_(
-                    and_(Message.user_id == current_user.id, Message.dm_user_id == dm_user_id),
-                    and_(Message.user_id == dm_user_id, Message.dm_user_id == current_user.id)
-                )
-            ).order_by(desc(Message.created_at)).limit(limit)
-        )
+        # One index range per direction of the conversation instead of an OR over the table
+        rows = []
+        for sender, recipient in ((current_user.id, dm_user_id), (dm_user_id, current_user.id)):
+            res = await session.execute(_message_page(
+                _messages_with_usernames().where(Message.user_id == sender, Message.dm_user_id == recipient),
+                limit, before_id, after_id,
+            ))
+            rows.extend(res.all())
+        rows.sort(key=lambda row: row[0].id, reverse=after_id is None)
+        rows = rows[:limit + 1]
     elif group_id:
-        res = await session.execute(select(Message).where(Message.group_id == group_id, Message.dm_user_id == None).order_by(desc(Message.created_at)).limit(limit))
+        res = await session.execute(_message_page(_messages_with_usernames().where(Message.group_id == group_id, Message.dm_user_id == None), limit, before_id, after_id))
+        rows = res.all()
     else:
-        res = await session.execute(select(Message).where(Message.group_id == None, Message.dm_user_id == None).order_by(desc(Message.created_at)).limit(limit))
-    items = list(reversed(res.scalars().all()))
+        res = await session.execute(_message_page(_messages_with_usernames().where(Message.group_id == None, Message.dm_user_id == None), limit, before_id, after_id))
+        rows = res.all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    items = rows if after_id is not None else list(reversed(rows))
     out = []
-    for m in items:
-        username = None
-        if not m.is_bot and m.user_id:
-            u = await session.get(User, m.user_id)
-            username = u.username if u else "unknown"
+    for m, username in items:
+        if username:
+            remember_username(m.user_id, username)
         out.append({
             "id": m.id,
             "username": "LLM Bot" if m.is_bot else (username or "unknown"),
@@ -1148,7 +1338,7 @@ async def get_messages(limit: int = 50, group_id: Optional[int] = None, dm_user_
             "is_bot": m.is_bot,
             "created_at": str(m.created_at)
         })
-    return {"messages": out}
+    return {"messages": out, "has_more": has_more}
 
 @app.post("/api/messages")
 async def post_message(payload: MessagePayload, username: str = Depends(get_current_user_token), session: AsyncSession = Depends(get_db)):
@@ -1157,225 +1347,376 @@ async def post_message(payload: MessagePayload, username: str = Depends(get_curr
     if not u:
         raise HTTPException(status_code=401, detail="Invalid user")
     
-    # Check if chat history needs compacting
-    if await should_compact_history():
-        compact_result = await compact_chat_history()
-        if compact_result:
-            await manager.broadcast({"type": "history_compacted", "message": compact_result})
-    
-    # Apply tone adjustment if requested
-    message_content = payload.content
-    if payload.tone and payload.tone in TONES:
-        message_content = await adjust_tone(payload.content, payload.tone)
-    
-    m = Message(user_id=u.id, content=message_content, is_bot=False, group_id=payload.group_id, dm_user_id=payload.dm_user_id)
-    session.add(m)
-    await session.commit()
-    await session.refresh(m)
-    await broadcast_message(session, m)
+    # Reserve room in the post-processing pipeline before saving anything
+    try:
+        shard = await message_pipeline.reserve(conversation_key(payload.group_id, u.id, payload.dm_user_id))
+    except PipelineFull:
+        raise HTTPException(status_code=503, detail="Server is busy, please try again shortly")
+    
+    try:
+        m = Message(user_id=u.id, content=payload.content, is_bot=False, group_id=payload.group_id, dm_user_id=payload.dm_user_id)
+        session.add(m)
+        await session.flush()
+        event = {
+            "message_id": m.id,
+            "user_id": u.id,
+            "content": payload.content,
+            "tone": payload.tone,
+            "group_id": payload.group_id,
+            "dm_user_id": payload.dm_user_id,
+        }
+        # Committed with the message, so the pipeline work survives a restart
+        session.add(MessageEvent(message_id=m.id, payload=json.dumps(event)))
+        await session.commit()
+        await session.refresh(m)
+        await broadcast_message(session, m)
+    except Exception:
+        message_pipeline.release(shard)
+        raise
     
     # Set LLM tone preference if provided
     if payload.llm_tone:
         set_user_tone(username, payload.llm_tone)
     
-    # DIALECTIC ENGINE: Check for decision responses FIRST
-    if "@bot decision" in payload.content.lower():
-        decision_response = await process_vote_command(payload.content, u.id, session)
-        if decision_response:
-            bot_msg = Message(user_id=None, content=decision_response, is_bot=True, group_id=payload.group_id)
-            session.add(bot_msg)
-            await session.commit()
-            await session.refresh(bot_msg)
-            await broadcast_message(session, bot_msg)
-            # Broadcast voting update to decision bar
-            await manager.broadcast({"type": "voting_updated"})
-            return {"ok": True, "id": m.id}
-    
-    # DIALECTIC ENGINE: Silent monitoring for conflicts (skip system commands)
-    is_system_command = payload.content.strip().lower().startswith(("accept ", "decline ", "claim ", "/role", "/assign", "/tasks", "/decisions", "/milestones", "/project", "/vote"))
-    conflict_data = None if is_system_command else await monitor_message_for_conflicts(payload.content, m.id, session, payload.group_id)
-    if conflict_data:
-        bot_msg = Message(user_id=None, content=conflict_data['intervention_message'], is_bot=True, group_id=payload.group_id)
-        session.add(bot_msg)
-        await session.commit()
-        await session.refresh(bot_msg)
-        await broadcast_message(session, bot_msg)
-        # Broadcast new conflict to decision bar
-        await manager.broadcast({"type": "new_conflict", "conflict_id": conflict_data['conflict_id']})
-        return {"ok": True, "id": m.id}
-    
+    # Tone adjustment, conflict/task/meeting detection and bot replies run in the pipeline
+    message_pipeline.submit(shard, event)
+    return {"ok": True, "id": m.id}
+
+async def compact_history_if_needed():
+    """Compact chat history in the background; skipped while a compaction is already running."""
+    if _compaction_lock.locked():
+        return
+    async with _compaction_lock:
+        try:
+            if await should_compact_history():
+                compact_result = await compact_chat_history()
+                if compact_result:
+                    await manager.broadcast({"type": "history_compacted", "message": compact_result})
+        except Exception as e:
+            print(f"Chat compaction failed: {e}")
 
+# --------- Message detectors ---------
+async def _detect_task_assignment(ctx: Dict[str, Any]):
+    # Skip task detection if: system command, question, or lacks task indicators
+    if not ctx["check_task_assignment"]:
+        return None
+    assignment = await detect_task_assignment(ctx["content_for_detection"], ctx["verdict"])
+    print(f"Task assignment detection result: {assignment}")
+    return assignment
+
+async def _handle_task_assignment(ctx: Dict[str, Any], assignment: dict) -> bool:
+    session, content, group_id = ctx["session"], ctx["content"], ctx["group_id"]
+    task_desc = assignment['task']
+    assignee_hint = assignment.get('assignee')
+    user_msg = content if assignee_hint else None
+    
+    result = await assign_task_to_user(session, task_desc, None, user_msg, group_id=group_id)
+    
+    # Create task with pending assignment (24h to accept)
+    expires_at = datetime.now() + timedelta(hours=24)
+    task = Task(
+        content=task_desc,
+        due_date=result.get('due_date'),
+        status=TaskStatus.pending,
+        pending_assignment=True,
+        assignment_expires_at=expires_at,
+        group_id=group_id
+    )
+    session.add(task)
+    await set_task_assignees(session, task, result['assigned_to'])
+    await session.commit()
+    await session.refresh(task)
     
-    # Handle task acceptance/decline
-    content_lower = payload.content.strip().lower()
-    if content_lower.startswith("accept ") or content_lower.startswith("decline "):
-        action = "accept" if content_lower.startswith("accept") else "decline"
-        task_id_str = content_lower.split()[1] if len(content_lower.split()) > 1 else None
-        
-        if task_id_str and task_id_str.isdigit():
-            task = await session.get(Task, int(task_id_str))
-            if task and task.pending_assignment:
-                # Check if current user is the assigned user
-                if task.assigned_to != u.username:
-                    # Send temporary error message (not saved to DB)
-                    await manager.broadcast({
-                        "type": "message",
-                        "message": {
-                            "id": -1,
-                            "username": "LLM Bot",
-                            "content": f"❌ Only **@{task.assigned_to}** can accept or decline this task.",
-                            "is_bot": True,
-                            "created_at": str(datetime.now())
-                        }
-                    })
-                    return {"ok": True, "id": m.id}
-                
-                if action == "accept":
-                    task.pending_assignment = False
-                    task.assignment_expires_at = None
+    due_date_text = f"\n📅 Due: {result['due_date']}" if result.get('due_date') else ""
+    bot_msg = Message(
+        user_id=None,
+        content=f"🔔 Task suggested for **@{result['assigned_to']}**{due_date_text}\n\n📋 Task: {task_desc}\n\n💡 {result['reason']}\n\n**@{result['assigned_to']}**, reply:\n- `accept {task.id}` to accept\n- `decline {task.id}` to decline\n\n⏱️ Expires in 24 hours",
+        is_bot=True,
+        group_id=group_id
+    )
+    session.add(bot_msg)
+    await session.commit()
+    await session.refresh(bot_msg)
+    await broadcast_message(session, bot_msg)
+    change_notifier.changed("tasks", group_id, task.id)
+    await notify_assignees(session, result['assigned_to'], f"🔔 You were suggested for a task: {task_desc}. Reply accept {task.id} or decline {task.id}.")
+    return True
+
+async def _detect_task_action(ctx: Dict[str, Any]):
+    if not ctx["check_task_action"]:
+        return None
+    # Own session: detectors run concurrently
+    async with SessionLocal() as session:
+        task_action = await detect_task_action(session, ctx["content"], ctx["verdict"])
+        if not task_action or task_action.get("action") not in ("complete", "delete"):
+            return None
+        if not await session.get(Task, task_action["task_id"]):
+            return None
+    return task_action
+
+async def _handle_task_action(ctx: Dict[str, Any], task_action: dict) -> bool:
+    session, group_id = ctx["session"], ctx["group_id"]
+    task = await session.get(Task, task_action['task_id'])
+    if not task:
+        return False
+    if task_action['action'] == 'complete':
+        task.status = TaskStatus.completed
+        await session.commit()
+        bot_msg = Message(user_id=None, content=f"✅ Task completed: **{task.content}**", is_bot=True, group_id=group_id)
+    else:
+        task_content = task.content
+        await session.delete(task)
+        await session.commit()
+        bot_msg = Message(user_id=None, content=f"🗑️ Task deleted: **{task_content}**", is_bot=True, group_id=group_id)
+    session.add(bot_msg)
+    await session.commit()
+    await session.refresh(bot_msg)
+    await broadcast_message(session, bot_msg)
+    change_notifier.changed("tasks", group_id, task.id)
+    return True
+
+async def _detect_meeting(ctx: Dict[str, Any]):
+    # Only run meeting detection if message contains meeting keywords
+    if ctx["content"].startswith("/") or not ctx["has_meeting_keywords"]:
+        return None
+    if ctx["user"].id in waiting_for_meeting_info:
+        # Follow-up with missing meeting details, parsed by the handler
+        return {"follow_up": True}
+    return await detect_meeting_request(ctx["content"], ctx["verdict"])
+
+async def _handle_meeting(ctx: Dict[str, Any], meeting_info: dict) -> bool:
+    return await detect_and_suggest_meeting(
+        ctx["session"], ctx["content"], ctx["user"].id, ctx["group_id"], ctx["verdict"],
+        None if meeting_info.get("follow_up") else meeting_info,
+    )
+
+async def _detect_milestone(ctx: Dict[str, Any]):
+    if ctx["content"].startswith("/") or not wants_milestone_change(ctx["content"], ctx["verdict"]):
+        return None
+    return await plan_milestone_change(ctx["content"])
+
+async def _handle_milestone(ctx: Dict[str, Any], plan: dict) -> bool:
+    session = ctx["session"]
+    milestone_response = await apply_milestone_change(plan, ctx["user"].id)
+    bot_msg = Message(user_id=None, content=milestone_response, is_bot=True, group_id=ctx["group_id"])
+    session.add(bot_msg)
+    await session.commit()
+    await session.refresh(bot_msg)
+    await broadcast_message(session, bot_msg)
+    return True
+
+async def _detect_ship_date(ctx: Dict[str, Any]):
+    if ctx["content"].startswith("/"):
+        return None
+    return find_ship_date(ctx["content"])
+
+async def _handle_ship_date(ctx: Dict[str, Any], date_str: str) -> bool:
+    return await detect_and_set_ship_date(ctx["session"], ctx["content"], date_str)
+
+# Precedence follows the original handler order; task detectors claim the message exclusively
+message_detectors = DetectorRegistry()
+message_detectors.register(Detector("task_assignment", 10, _detect_task_assignment, _handle_task_assignment, exclusive=True))
+message_detectors.register(Detector("task_action", 20, _detect_task_action, _handle_task_action, exclusive=True))
+message_detectors.register(Detector("meeting", 30, _detect_meeting, _handle_meeting))
+message_detectors.register(Detector("milestone", 40, _detect_milestone, _handle_milestone))
+message_detectors.register(Detector("ship_date", 50, _detect_ship_date, _handle_ship_date))
+
+async def clear_message_event(message_id: int):
+    async with SessionLocal() as session:
+        await session.execute(delete(MessageEvent).where(MessageEvent.message_id == message_id))
+        await session.commit()
+
+async def handle_message_event(event: Dict[str, Any]):
+    """Pipeline handler: process the event, then delete its persisted row (kept if the worker is cancelled)."""
+    try:
+        await process_message_event(event)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        await clear_message_event(event["message_id"])
+        raise
+    await clear_message_event(event["message_id"])
+
+async def recover_message_events():
+    """Background task to re-queue persisted message events that no worker finished (restart or crash)."""
+    while True:
+        try:
+            pending = message_pipeline.pending_ids()
+            stale = datetime.now() - timedelta(seconds=MESSAGE_EVENT_RECLAIM_AFTER)
+            async with SessionLocal() as session:
+                if pending:
+                    # Renew this process's claims so no worker (this one included) reclaims them
+                    await session.execute(update(MessageEvent).where(MessageEvent.message_id.in_(pending)).values(claimed_at=func.now()))
                     await session.commit()
-                    bot_msg = Message(user_id=None, content=f"✅ **@{task.assigned_to}** confirmed task: **{task.content}**", is_bot=True, group_id=payload.group_id)
-                else:
-                    # Decline - make it open for others
-                    task.assigned_to = None
-                    task.pending_assignment = False
-                    task.assignment_expires_at = None
+                query = select(MessageEvent.id, MessageEvent.payload).where(MessageEvent.claimed_at < stale)
+                if pending:
+                    query = query.where(MessageEvent.message_id.notin_(pending))
+                res = await session.execute(query.order_by(MessageEvent.id))
+                for event_id, payload in res.all():
+                    # Claim before queueing so only one worker picks each event up
+                    claimed = await session.execute(
+                        update(MessageEvent).where(MessageEvent.id == event_id, MessageEvent.claimed_at < stale).values(claimed_at=func.now())
+                    )
                     await session.commit()
-                    bot_msg = Message(user_id=None, content=f"🔄 **@{u.username}** declined. Task now open: **{task.content}**\n\nAnyone can claim with: `claim {task.id}`", is_bot=True, group_id=payload.group_id)
-                
-                session.add(bot_msg)
-                await session.commit()
-                await session.refresh(bot_msg)
-                await broadcast_message(session, bot_msg)
-                await manager.broadcast({"type": "tasks_updated"})
-                return {"ok": True, "id": m.id}
-    
-    # Handle task claiming
-    if content_lower.startswith("claim "):
-        task_id_str = content_lower.split()[1] if len(content_lower.split()) > 1 else None
-        if task_id_str and task_id_str.isdigit():
-            task = await session.get(Task, int(task_id_str))
-            if task and not task.assigned_to:
-                task.assigned_to = u.username
-                await session.commit()
-                bot_msg = Message(user_id=None, content=f"✅ **@{u.username}** claimed task: **{task.content}**", is_bot=True, group_id=payload.group_id)
+                    if claimed.rowcount != 1:
+                        continue
+                    event = json.loads(payload)
+                    print(f"🔁 Re-queueing unprocessed message {event['message_id']}")
+                    # Waits for shard room without holding up the next sweep's claim renewal
+                    asyncio.create_task(message_pipeline.requeue(conversation_key(event.get("group_id"), event.get("user_id"), event.get("dm_user_id")), event))
+        except Exception as e:
+            print(f"Message event recovery failed: {e}")
+        await asyncio.sleep(MESSAGE_EVENT_SWEEP_INTERVAL)
+
+async def process_message_event(event: Dict[str, Any]):
+    """Pipeline handler: everything that reacts to a saved user message."""
+    # Check if chat history needs compacting
+    asyncio.create_task(compact_history_if_needed())
+        
+    async with SessionLocal() as session:
+        u = await session.get(User, event["user_id"])
+        m = await session.get(Message, event["message_id"])
+        if not u or not m:
+            return
+        content = event["content"]
+        group_id = event["group_id"]
+        
+        # Apply tone adjustment if requested
+        tone = event.get("tone")
+        if tone and tone in TONES:
+            m.content = await adjust_tone(content, tone)
+            await session.commit()
+            await broadcast_message(session, m, event_type="message_updated")
+        
+        # DIALECTIC ENGINE: Check for decision responses FIRST
+        if "@bot decision" in content.lower():
+            decision_response = await process_vote_command(content, u.id, session)
+            if decision_response:
+                bot_msg = Message(user_id=None, content=decision_response, is_bot=True, group_id=group_id)
                 session.add(bot_msg)
                 await session.commit()
                 await session.refresh(bot_msg)
                 await broadcast_message(session, bot_msg)
-                await manager.broadcast({"type": "tasks_updated"})
-                return {"ok": True, "id": m.id}
-    
-    # Detect natural language task assignment (without /assign command) - check BEFORE bot response
-    content_for_detection = payload.content.replace("@bot", "").strip()
-    content_lower_stripped = content_for_detection.lower()
-    
-    # Skip task detection if: system command, question, or lacks task indicators
-    is_system_cmd = content_lower_stripped.startswith(("accept ", "decline ", "claim "))
-    has_question_mark = "?" in payload.content
-    starts_with_question = content_lower_stripped.startswith(("what", "how", "why", "when", "where", "who", "which", "can", "could", "would", "should", "is", "are", "do", "does"))
-    task_indicators = ["assign", "task", "need", "should", "must", "work on", "handle", "take care", "complete", "finish"]
-    has_task_indicator = any(kw in content_lower_stripped for kw in task_indicators)
-    
-    if not payload.content.startswith("/") and not is_system_cmd and not has_question_mark and not starts_with_question and has_task_indicator:
-        assignment = await detect_task_assignment(content_for_detection)
-        print(f"Task assignment detection result: {assignment}")
-        if assignment:
-            task_desc = assignment['task']
-            assignee_hint = assignment.get('assignee')
-            user_msg = payload.content if assignee_hint else None
-            
-            result = await assign_task_to_user(session, task_desc, None, user_msg, group_id=payload.group_id)
-            
-            # Create task with pending assignment (24h to accept)
-            expires_at = datetime.now() + timedelta(hours=24)
-            task = Task(
-                content=task_desc,
-                assigned_to=result['assigned_to'],
-                due_date=result.get('due_date'),
-                status=TaskStatus.pending,
-                pending_assignment=True,
-                assignment_expires_at=expires_at,
-                group_id=payload.group_id
-            )
-            session.add(task)
-            await session.commit()
-            await session.refresh(task)
-            
-            due_date_text = f"\n📅 Due: {result['due_date']}" if result.get('due_date') else ""
-            bot_msg = Message(
-                user_id=None,
-                content=f"🔔 Task suggested for **@{result['assigned_to']}**{due_date_text}\n\n📋 Task: {task_desc}\n\n💡 {result['reason']}\n\n**@{result['assigned_to']}**, reply:\n- `accept {task.id}` to accept\n- `decline {task.id}` to decline\n\n⏱️ Expires in 24 hours",
-                is_bot=True,
-                group_id=payload.group_id
-            )
-            session.add(bot_msg)
-            await session.commit()
-            await session.refresh(bot_msg)
-            await broadcast_message(session, bot_msg)
-            await manager.broadcast({"type": "tasks_updated"})
-            return {"ok": True, "id": m.id}
-    
-    # Detect task completion/deletion requests (skip if it's accept/decline/claim/vote)
-    is_task_command = content_lower.startswith(("accept ", "decline ", "claim ", "/vote"))
-    task_action = None if is_task_command else await detect_task_action(session, payload.content)
-    if task_action:
-        task = await session.get(Task, task_action['task_id'])
-        if task:
-            if task_action['action'] == 'complete':
-                task.status = TaskStatus.completed
-                await session.commit()
-                bot_msg = Message(user_id=None, content=f"✅ Task completed: **{task.content}**", is_bot=True, group_id=payload.group_id)
-            elif task_action['action'] == 'delete':
-                task_content = task.content
-                await session.delete(task)
-                await session.commit()
-                bot_msg = Message(user_id=None, content=f"🗑️ Task deleted: **{task_content}**", is_bot=True, group_id=payload.group_id)
-            session.add(bot_msg)
-            await session.commit()
-            await session.refresh(bot_msg)
-            await broadcast_message(session, bot_msg)
-            await manager.broadcast({"type": "tasks_updated"})
-            return {"ok": True, "id": m.id}
-    
-    # Check if bot should respond (only commands or @bot mention)
-    should_respond = (
-        payload.content.startswith("/") or
-        "@bot" in payload.content.lower()
-    )
-    
-    # Always detect meetings, milestones, and ship date from non-command messages FIRST
-    meeting_handled = False
-    milestone_handled = False
-    ship_date_handled = False
-    if not payload.content.startswith("/"):
-        # Only run meeting detection if message contains meeting keywords
-        meeting_keywords = ["meeting", "schedule", "meet", "call", "zoom"]
-        has_meeting_keywords = any(kw in payload.content.lower() for kw in meeting_keywords)
-        if has_meeting_keywords:
-            meeting_handled = await detect_and_suggest_meeting(session, payload.content, u.id, payload.group_id)
-        milestone_response = await detect_milestone_changes(payload.content, u.id)
-        if milestone_response:
-            milestone_handled = True
-            bot_msg = Message(user_id=None, content=milestone_response, is_bot=True, group_id=payload.group_id)
+                # Broadcast voting update to decision bar
+                change_notifier.reset("conflicts", group_id)
+                return
+        
+        # Routing features from one keyword scan (cheap checks before any LLM call)
+        features = extract_features(content)
+        content_lower = features.lower
+        content_for_detection = content.replace("@bot", "").strip()
+        is_system_command = features.is_system_command
+        # Skip task detection if: system command, question, or lacks task indicators
+        check_task_assignment = not features.is_command and not features.is_assignment_reply and not features.is_question and features.has("task_indicator")
+        # Skip if it's accept/decline/claim/vote or nothing sounds like finishing/removing a task
+        check_task_action = not features.is_task_command and features.has("task_action")
+        has_meeting_keywords = features.has("meeting")
+        # Bot only answers commands or @bot mentions
+        should_respond = features.is_command or features.mentions_bot
+        # Small talk never reaches the conflict detector
+        check_conflicts = not is_system_command and len(content.strip()) >= 10 and not await classify_chit_chat(features)
+        
+        # One combined LLM analysis instead of a prompt per detector
+        verdict = await analyze_message(
+            session,
+            content,
+            check_conflicts=check_conflicts,
+            check_task_assignment=check_task_assignment,
+            check_task_action=check_task_action,
+            check_meeting=not features.is_command and has_meeting_keywords and u.id not in waiting_for_meeting_info,
+            check_milestone=not features.is_command and features.is_milestone_request,
+            check_intent=should_respond and not content.startswith("/"),
+        )
+        
+        # DIALECTIC ENGINE: Silent monitoring for conflicts (skip system commands and small talk)
+        conflict_data = None if not check_conflicts else await monitor_message_for_conflicts(content, m.id, session, group_id, verdict)
+        if conflict_data:
+            bot_msg = Message(user_id=None, content=conflict_data['intervention_message'], is_bot=True, group_id=group_id)
             session.add(bot_msg)
             await session.commit()
             await session.refresh(bot_msg)
             await broadcast_message(session, bot_msg)
-        ship_date_handled = await detect_and_set_ship_date(session, payload.content)
-    
-    if should_respond and not meeting_handled and not milestone_handled and not ship_date_handled:
-        # Add user message to conversation history (skip commands)
-        if not payload.content.startswith("/"):
-            conversation_chain.add_to_history("user", payload.content)
+            # Broadcast new conflict to decision bar
+            await manager.publish_group(group_id, {"type": "new_conflict", "conflict_id": conflict_data['conflict_id']})
+            return
         
-        # fire-and-forget LLM answer with fresh session
-        async def llm_task():
-            async with SessionLocal() as new_session:
-                await maybe_answer_with_llm(new_session, payload.content, m.id, u.id, payload.group_id)
-        asyncio.create_task(llm_task())
-    
-    return {"ok": True, "id": m.id}
+
+        
+        # Handle task acceptance/decline
+        if content_lower.startswith("accept ") or content_lower.startswith("decline "):
+            action = "accept" if content_lower.startswith("accept") else "decline"
+            task_id_str = content_lower.split()[1] if len(content_lower.split()) > 1 else None
+        
+            if task_id_str and task_id_str.isdigit():
+                task = await session.get(Task, int(task_id_str))
+                if task and task.pending_assignment:
+                    # Check if current user is the assigned user
+                    if u.username not in parse_assignees(task.assigned_to):
+                        # Send temporary error message (not saved to DB) to the sender only
+                        await send_private_message(u.id, f"❌ Only **@{task.assigned_to}** can accept or decline this task.")
+                        return
+                
+                    if action == "accept":
+                        task.pending_assignment = False
+                        task.assignment_expires_at = None
+                        await session.commit()
+                        bot_msg = Message(user_id=None, content=f"✅ **@{task.assigned_to}** confirmed task: **{task.content}**", is_bot=True, group_id=group_id)
+                    else:
+                        # Decline - make it open for others
+                        await set_task_assignees(session, task, None)
+                        task.pending_assignment = False
+                        task.assignment_expires_at = None
+                        await session.commit()
+                        bot_msg = Message(user_id=None, content=f"🔄 **@{u.username}** declined. Task now open: **{task.content}**\n\nAnyone can claim with: `claim {task.id}`", is_bot=True, group_id=group_id)
+                
+                    session.add(bot_msg)
+                    await session.commit()
+                    await session.refresh(bot_msg)
+                    await broadcast_message(session, bot_msg)
+                    change_notifier.changed("tasks", group_id, task.id)
+                    return
+        
+        # Handle task claiming
+        if content_lower.startswith("claim "):
+            task_id_str = content_lower.split()[1] if len(content_lower.split()) > 1 else None
+            if task_id_str and task_id_str.isdigit():
+                task = await session.get(Task, int(task_id_str))
+                if task and not task.assigned_to:
+                    await set_task_assignees(session, task, u.username)
+                    await session.commit()
+                    bot_msg = Message(user_id=None, content=f"✅ **@{u.username}** claimed task: **{task.content}**", is_bot=True, group_id=group_id)
+                    session.add(bot_msg)
+                    await session.commit()
+                    await session.refresh(bot_msg)
+                    await broadcast_message(session, bot_msg)
+                    change_notifier.changed("tasks", group_id, task.id)
+                    return
+        
+        # Task assignment, task actions, meetings, milestones and ship date are detected concurrently
+        ctx = {
+            "session": session,
+            "user": u,
+            "message": m,
+            "content": content,
+            "content_for_detection": content_for_detection,
+            "group_id": group_id,
+            "verdict": verdict,
+            "check_task_assignment": check_task_assignment,
+            "check_task_action": check_task_action,
+            "has_meeting_keywords": has_meeting_keywords,
+        }
+        handled = await message_detectors.run(ctx)
+        
+        if should_respond and not handled:
+            # Add user message to conversation history (skip commands)
+            if not content.startswith("/"):
+                conversation_chain.add_to_history("user", content)
+        
+            # fire-and-forget LLM answer with fresh session
+            async def llm_task():
+                async with SessionLocal() as new_session:
+                    await maybe_answer_with_llm(new_session, content, m.id, u.id, group_id, verdict)
+            asyncio.create_task(llm_task())
 
 @app.delete("/api/messages")
 async def clear_messages(group_id: Optional[int] = None, dm_user_id: Optional[int] = None, username: str = Depends(get_current_user_token), session: AsyncSession = Depends(get_db)):
@@ -1397,7 +1738,8 @@ async def clear_messages(group_id: Optional[int] = None, dm_user_id: Optional[in
         await session.execute(delete(Message).where(Message.group_id == None, Message.dm_user_id == None))
     await session.commit()
     clear_conversation_history()  # Clear AI conversation memory
-    await manager.broadcast({"type": "clear"})
+    topic = dm_topic(current_user.id, dm_user_id) if dm_user_id else group_topic(group_id)
+    await manager.publish(topic, {"type": "clear"})
     return {"ok": True}
 
 @app.post("/api/upload")
@@ -1412,16 +1754,8 @@ async def upload_file(file: UploadFile = File(...), group_id: Optional[int] = Fo
     if not u:
         raise HTTPException(status_code=401, detail="Invalid user")
     
-    # Read file content
-    content = await file.read()
-    
-    # Extract text based on file type
-    if file.filename.lower().endswith('.pdf'):
-        text = extract_text_from_pdf(content)
-    elif file.filename.lower().endswith('.docx'):
-        text = extract_text_from_docx(content)
-    else:  # .txt file
-        text = content.decode('utf-8')
+    # Spool to disk (size-limited), extract text from the file and keep the bytes in the blob store
+    spooled, blob_key, text = await store_upload(file)
     
     # Chunk the text
     chunks = chunk_text(text)
@@ -1432,16 +1766,16 @@ async def upload_file(file: UploadFile = File(...), group_id: Optional[int] = Fo
     metadatas = [{"filename": file.filename, "username": username, "chunk_id": i} for i in range(len(chunks))]
     
     # Store in vector database
-    add_documents(chunks, metadatas, ids)
+    await asyncio.to_thread(add_documents, chunks, metadatas, ids)
     
-    # Store file metadata and base64 encoded data in database
-    import base64
+    # Bytes and extracted text go to the blob store; the row keeps their keys
     uploaded_file = UploadedFile(
         filename=file.filename,
         file_id=file_id,
         user_id=u.id,
-        content=text,
-        file_data=base64.b64encode(content).decode('utf-8'),
+        blob_key=blob_key,
+        text_key=await blob_store.put(text.encode('utf-8')),
+        size=spooled.size,
         summary="Generating summary...",
         group_id=group_id
     )
@@ -1474,9 +1808,9 @@ async def get_files(group_id: Optional[int] = None, username: str = Depends(get_
     files = files_res.scalars().all()
     
     files_with_users = []
+    uploaders = await get_usernames(session, [f.user_id for f in files])
     for f in files:
-        user_obj = await session.get(User, f.user_id)
-        uploader_username = user_obj.username if user_obj else "unknown"
+        uploader_username = uploaders.get(f.user_id, "unknown")
         files_with_users.append({
             "id": f.id,
             "filename": f.filename,
@@ -1506,7 +1840,7 @@ async def delete_file(file_id: int, username: str = Depends(get_current_user_tok
     # Delete from vector database
     delete_documents_by_file_id(file_obj.file_id)
     
-    # Delete from database
+    # Delete from database; the blobs may be shared and are removed by sweep_unreferenced_blobs
     await session.delete(file_obj)
     await session.commit()
     
@@ -1530,10 +1864,68 @@ async def debug_vector_db():
     except Exception as e:
         return {"error": str(e)}
 
+@app.get("/api/debug/llm-stats")
+async def debug_llm_stats():
+    """Debug endpoint to check LLM connection pool usage"""
+    return {**get_llm_stats(), "message_analyzer": get_analyzer_stats()}
+
+@app.get("/api/debug/pipeline-stats")
+async def debug_pipeline_stats():
+    """Debug endpoint to check message pipeline queue depths and detector timings"""
+    return {**message_pipeline.get_stats(), "message_detectors": message_detectors.get_stats(), "username_cache": get_user_cache_stats(), "dashboard_cache": get_dashboard_stats()}
+
+async def _user_group_ids(session: AsyncSession, user_id: int) -> List[int]:
+    res = await session.execute(select(GroupMembership.group_id).where(GroupMembership.user_id == user_id))
+    return list(res.scalars().all())
+
+@app.get("/api/presence")
+async def get_presence(username: str = Depends(get_current_user_token), session: AsyncSession = Depends(get_db)):
+    """Users with at least one connected WebSocket who share a group with the caller."""
+    res = await session.execute(select(User).where(User.username == username))
+    u = res.scalar_one_or_none()
+    if not u:
+        raise HTTPException(status_code=401, detail="Invalid user")
+    group_ids = await _user_group_ids(session, u.id)
+    members_res = await session.execute(select(GroupMembership.user_id).where(GroupMembership.group_id.in_(group_ids)))
+    return {"online": manager.online_users(set(members_res.scalars().all()) | {u.id})}
+
+@app.get("/api/debug/ws-stats")
+async def debug_ws_stats():
+    """Debug endpoint to check WebSocket topics, per-connection queue depth and lag"""
+    return {**manager.get_stats(), "change_events": change_notifier.get_stats()}
+
+def parse_byte_range(header: Optional[str], size: int):
+    """(start, end) inclusive for a single "bytes=" range; None to send the whole file; "invalid" for 416."""
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None  # absent, other units or multiple ranges: a full 200 is allowed
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first == "":
+            suffix = int(last)  # "bytes=-500": the last 500 bytes
+            if suffix <= 0:
+                return "invalid"
+            return max(0, size - suffix), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if end < start:
+        return None  # malformed, ignored like a missing header
+    if start >= size:
+        return "invalid"
+    return start, min(end, size - 1)
+
+def _etag_matches(header: Optional[str], etag: str) -> bool:
+    if not header:
+        return False
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
 @app.get("/api/files/{file_id}/download")
-async def download_file(file_id: int, token: str, session: AsyncSession = Depends(get_db)):
+async def download_file(file_id: int, token: str, request: Request, session: AsyncSession = Depends(get_db)):
     from auth import decode_access_token
-    from fastapi.responses import Response
+    from email.utils import format_datetime, parsedate_to_datetime
+    from datetime import timezone
     try:
         payload = decode_access_token(token)
         username = payload.get("sub")
@@ -1549,13 +1941,9 @@ async def download_file(file_id: int, token: str, session: AsyncSession = Depend
         select(UploadedFile).where(UploadedFile.id == file_id, UploadedFile.user_id == u.id)
     )
     file_obj = file_res.scalar_one_or_none()
-    if not file_obj or not file_obj.file_data:
+    if not file_obj or not file_obj.blob_key or not blob_store.exists(file_obj.blob_key):
         raise HTTPException(status_code=404, detail="File not found")
     
-    # Decode base64 data
-    import base64
-    file_content = base64.b64decode(file_obj.file_data)
-    
     # Determine content type
     content_type = "application/octet-stream"
     if file_obj.filename.lower().endswith('.pdf'):
@@ -1565,10 +1953,57 @@ async def download_file(file_id: int, token: str, session: AsyncSession = Depend
     elif file_obj.filename.lower().endswith('.docx'):
         content_type = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
     
-    return Response(
-        content=file_content,
+    # The blob key is the SHA-256 of the content, so it doubles as a strong ETag
+    etag = f'"{file_obj.blob_key}"'
+    uploaded_at = file_obj.created_at
+    if uploaded_at.tzinfo is None:
+        uploaded_at = uploaded_at.replace(tzinfo=timezone.utc)
+    headers = {
+        "ETag": etag,
+        "Last-Modified": format_datetime(uploaded_at.astimezone(timezone.utc), usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=3600",
+        "Content-Disposition": f"inline; filename={file_obj.filename}",
+    }
+    
+    # Conditional GET: the viewer re-opening a file it already has costs no body
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif request.headers.get("if-modified-since"):
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"])
+            if uploaded_at.replace(microsecond=0) <= since:
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+    
+    size = blob_store.size(file_obj.blob_key)
+    byte_range = parse_byte_range(request.headers.get("range"), size)
+    # If-Range: only honour the range when the client's copy is still current
+    if_range = request.headers.get("if-range")
+    if byte_range and if_range and if_range.strip() != etag:
+        byte_range = None
+    if byte_range == "invalid":
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    
+    # Streamed from the blob store in chunks instead of decoding the whole file in memory
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        return StreamingResponse(
+            blob_store.iter_chunks(file_obj.blob_key, start, end - start + 1),
+            status_code=206,
+            media_type=content_type,
+            headers=headers
+        )
+    headers["Content-Length"] = str(size)
+    return StreamingResponse(
+        blob_store.iter_chunks(file_obj.blob_key),
         media_type=content_type,
-        headers={"Content-Disposition": f"inline; filename={file_obj.filename}"}
+        headers=headers
     )
 
 @app.get("/api/tasks")
@@ -1578,19 +2013,16 @@ async def get_tasks(group_id: Optional[int] = None, username: str = Depends(get_
     else:
         tasks_res = await session.execute(select(Task).where(Task.group_id == None).order_by(desc(Task.created_at)))
     tasks = tasks_res.scalars().all()
-    result = []
-    for t in tasks:
-        result.append({
-            "id": t.id, 
-            "content": t.content, 
-            "status": t.status.value, 
-            "assigned_to": t.assigned_to, 
-            "due_date": t.due_date, 
-            "milestone_id": t.milestone_id,
-            "pending_assignment": t.pending_assignment if hasattr(t, 'pending_assignment') else False,
-            "created_at": str(t.created_at)
-        })
-    return {"tasks": result}
+    return {"tasks": [task_to_dict(t) for t in tasks]}
+
+def _date_field(value: Optional[str], field: str, with_time: bool = False) -> Optional[str]:
+    """Canonical ISO form of a date (or date and time) from a request; 400 if it is not one, None for ""."""
+    if value is None or value == "":
+        return None
+    normalized = iso_datetime(value) if with_time else iso_date(value)
+    if normalized is None:
+        raise HTTPException(status_code=400, detail=f"Invalid {field}: expected {'YYYY-MM-DDTHH:MM' if with_time else 'YYYY-MM-DD'}")
+    return normalized
 
 class DueDatePayload(BaseModel):
     due_date: str
@@ -1600,9 +2032,9 @@ async def set_due_date(task_id: int, payload: DueDatePayload, username: str = De
     task = await session.get(Task, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    task.due_date = payload.due_date
+    task.due_date = _date_field(payload.due_date, "due_date")
     await session.commit()
-    await manager.broadcast({"type": "tasks_updated"})
+    change_notifier.changed("tasks", task.group_id, task.id)
     return {"ok": True}
 
 @app.get("/api/users")
@@ -1625,7 +2057,7 @@ async def create_task(payload: MessagePayload, username: str = Depends(get_curre
     task = Task(content=payload.content, status=TaskStatus.pending, group_id=payload.group_id)
     session.add(task)
     await session.commit()
-    await manager.broadcast({"type": "tasks_updated"})
+    change_notifier.changed("tasks", task.group_id, task.id)
     return {"ok": True}
 
 class TaskUpdatePayload(BaseModel):
@@ -1642,13 +2074,13 @@ async def update_task(task_id: int, payload: TaskUpdatePayload, username: str =
     if payload.content:
         task.content = payload.content
     if payload.due_date is not None:
-        task.due_date = payload.due_date
+        task.due_date = _date_field(payload.due_date, "due_date")
     if payload.assigned_to is not None:
-        task.assigned_to = payload.assigned_to
+        await set_task_assignees(session, task, payload.assigned_to)
     if payload.milestone_id is not None:
         task.milestone_id = payload.milestone_id
     await session.commit()
-    await manager.broadcast({"type": "tasks_updated"})
+    change_notifier.changed("tasks", task.group_id, task.id)
     return {"ok": True}
 
 class AssignPayload(BaseModel):
@@ -1659,9 +2091,9 @@ async def assign_task(task_id: int, payload: AssignPayload, username: str = Depe
     task = await session.get(Task, task_id)
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
-    task.assigned_to = payload.usernames
+    await set_task_assignees(session, task, payload.usernames)
     await session.commit()
-    await manager.broadcast({"type": "tasks_updated"})
+    change_notifier.changed("tasks", task.group_id, task.id)
     return {"ok": True}
 
 @app.post("/api/tasks/{task_id}/complete")
@@ -1671,7 +2103,7 @@ async def complete_task(task_id: int, username: str = Depends(get_current_user_t
         raise HTTPException(status_code=404, detail="Task not found")
     task.status = TaskStatus.completed
     await session.commit()
-    await manager.broadcast({"type": "tasks_updated"})
+    change_notifier.changed("tasks", task.group_id, task.id)
     # Send notification message
     bot_msg = Message(user_id=None, content=f"✅ Task completed: **{task.content}**", is_bot=True)
     session.add(bot_msg)
@@ -1688,7 +2120,7 @@ async def delete_task(task_id: int, username: str = Depends(get_current_user_tok
     task_content = task.content
     await session.delete(task)
     await session.commit()
-    await manager.broadcast({"type": "tasks_updated"})
+    change_notifier.changed("tasks", task.group_id, task.id)
     # Send notification message
     bot_msg = Message(user_id=None, content=f"🗑️ Task deleted: **{task_content}**", is_bot=True)
     session.add(bot_msg)
@@ -1704,7 +2136,7 @@ async def update_task_content(task_id: int, payload: MessagePayload, username: s
         raise HTTPException(status_code=404, detail="Task not found")
     task.content = payload.content
     await session.commit()
-    await manager.broadcast({"type": "tasks_updated"})
+    change_notifier.changed("tasks", task.group_id, task.id)
     return {"ok": True}
 
 @app.delete("/api/tasks/{task_id}")
@@ -1714,7 +2146,7 @@ async def delete_task(task_id: int, username: str = Depends(get_current_user_tok
         raise HTTPException(status_code=404, detail="Task not found")
     await session.delete(task)
     await session.commit()
-    await manager.broadcast({"type": "tasks_updated"})
+    change_notifier.changed("tasks", task.group_id, task.id)
     return {"ok": True}
 
 class MeetingPayload(BaseModel):
@@ -1732,9 +2164,12 @@ async def create_meeting(payload: MeetingPayload, username: str = Depends(get_cu
         raise HTTPException(status_code=401, detail="Invalid user")
     
     zoom_link = payload.zoom_link if payload.zoom_link else "No Zoom link provided"
+    meeting_time = _date_field(payload.datetime, "datetime", with_time=True)
+    if not meeting_time:
+        raise HTTPException(status_code=400, detail="datetime is required")
     meeting = Meeting(
         title=payload.title,
-        datetime=payload.datetime,
+        datetime=meeting_time,
         duration_minutes=payload.duration_minutes,
         zoom_link=zoom_link,
         created_by=u.id,
@@ -1743,7 +2178,7 @@ async def create_meeting(payload: MeetingPayload, username: str = Depends(get_cu
     session.add(meeting)
     await session.commit()
     await session.refresh(meeting)
-    await manager.broadcast({"type": "meetings_updated"})
+    change_notifier.changed("meetings", meeting.group_id, meeting.id)
     return {"ok": True, "zoom_link": zoom_link, "id": meeting.id}
 
 @app.post("/api/meetings/{meeting_id}/transcript")
@@ -1760,21 +2195,20 @@ async def upload_transcript(meeting_id: int, file: UploadFile = File(...), usern
     if not meeting:
         raise HTTPException(status_code=404, detail="Meeting not found")
     
-    content = await file.read()
-    text = content.decode('utf-8')
+    spooled, blob_key, text = await store_upload(file)
     chunks = chunk_text(text)
     file_id = str(uuid.uuid4())
     ids = [f"{file_id}_{i}" for i in range(len(chunks))]
     metadatas = [{"filename": file.filename, "username": username, "chunk_id": i, "meeting_id": meeting_id} for i in range(len(chunks))]
-    add_documents(chunks, metadatas, ids)
+    await asyncio.to_thread(add_documents, chunks, metadatas, ids)
     
-    import base64
     uploaded_file = UploadedFile(
         filename=file.filename,
         file_id=file_id,
         user_id=u.id,
-        content=text,
-        file_data=base64.b64encode(content).decode('utf-8'),
+        blob_key=blob_key,
+        text_key=await blob_store.put(text.encode('utf-8')),
+        size=spooled.size,
         summary="Transcript uploaded"
     )
     session.add(uploaded_file)
@@ -1783,7 +2217,7 @@ async def upload_transcript(meeting_id: int, file: UploadFile = File(...), usern
     
     meeting.transcript_file_id = uploaded_file.id
     await session.commit()
-    await manager.broadcast({"type": "meetings_updated"})
+    change_notifier.changed("meetings", meeting.group_id, meeting.id)
     return {"ok": True}
 
 @app.get("/api/meetings")
@@ -1799,7 +2233,7 @@ async def get_meetings(group_id: Optional[int] = None, username: str = Depends(g
         if m.transcript_file_id:
             tf = await session.get(UploadedFile, m.transcript_file_id)
             transcript_filename = tf.filename if tf else None
-        result.append({"id": m.id, "title": m.title, "datetime": m.datetime, "duration_minutes": m.duration_minutes, "zoom_link": m.zoom_link, "transcript_filename": transcript_filename, "attendees": m.attendees, "created_at": str(m.created_at)})
+        result.append(meeting_to_dict(m, transcript_filename))
     return {"meetings": result}
 
 @app.patch("/api/meetings/{meeting_id}/attendees")
@@ -1809,7 +2243,7 @@ async def set_attendees(meeting_id: int, payload: AssignPayload, username: str =
         raise HTTPException(status_code=404, detail="Meeting not found")
     meeting.attendees = payload.usernames
     await session.commit()
-    await manager.broadcast({"type": "meetings_updated"})
+    change_notifier.changed("meetings", meeting.group_id, meeting.id)
     return {"ok": True}
 
 class DurationPayload(BaseModel):
@@ -1822,7 +2256,7 @@ async def set_duration(meeting_id: int, payload: DurationPayload, username: str
         raise HTTPException(status_code=404, detail="Meeting not found")
     meeting.duration_minutes = payload.duration_minutes
     await session.commit()
-    await manager.broadcast({"type": "meetings_updated"})
+    change_notifier.changed("meetings", meeting.group_id, meeting.id)
     return {"ok": True}
 
 class MeetingTitlePayload(BaseModel):
@@ -1835,7 +2269,7 @@ async def update_meeting_title(meeting_id: int, payload: MeetingTitlePayload, us
         raise HTTPException(status_code=404, detail="Meeting not found")
     meeting.title = payload.title
     await session.commit()
-    await manager.broadcast({"type": "meetings_updated"})
+    change_notifier.changed("meetings", meeting.group_id, meeting.id)
     return {"ok": True}
 
 class MeetingDatetimePayload(BaseModel):
@@ -1846,9 +2280,12 @@ async def update_meeting_datetime(meeting_id: int, payload: MeetingDatetimePaylo
     meeting = await session.get(Meeting, meeting_id)
     if not meeting:
         raise HTTPException(status_code=404, detail="Meeting not found")
-    meeting.datetime = payload.datetime
+    meeting_time = _date_field(payload.datetime, "datetime", with_time=True)
+    if not meeting_time:
+        raise HTTPException(status_code=400, detail="datetime is required")
+    meeting.datetime = meeting_time
     await session.commit()
-    await manager.broadcast({"type": "meetings_updated"})
+    change_notifier.changed("meetings", meeting.group_id, meeting.id)
     return {"ok": True}
 
 class ZoomLinkPayload(BaseModel):
@@ -1861,7 +2298,7 @@ async def update_zoom_link(meeting_id: int, payload: ZoomLinkPayload, username:
         raise HTTPException(status_code=404, detail="Meeting not found")
     meeting.zoom_link = payload.zoom_link
     await session.commit()
-    await manager.broadcast({"type": "meetings_updated"})
+    change_notifier.changed("meetings", meeting.group_id, meeting.id)
     return {"ok": True}
 
 @app.delete("/api/meetings/{meeting_id}")
@@ -1871,7 +2308,7 @@ async def delete_meeting(meeting_id: int, username: str = Depends(get_current_us
         raise HTTPException(status_code=404, detail="Meeting not found")
     await session.delete(meeting)
     await session.commit()
-    await manager.broadcast({"type": "meetings_updated"})
+    change_notifier.changed("meetings", meeting.group_id, meeting.id)
     return {"ok": True}
 
 # --------- Milestones Routes ---------
@@ -1901,6 +2338,14 @@ class MilestonePayload(BaseModel):
     risk_level: Optional[str] = None
     dependencies: Optional[str] = None
 
+def _milestone_dates(payload: MilestonePayload):
+    start, end = _date_field(payload.start_date, "start_date"), _date_field(payload.end_date, "end_date")
+    if not start or not end:
+        raise HTTPException(status_code=400, detail="start_date and end_date are required")
+    if end < start:
+        raise HTTPException(status_code=400, detail="end_date is before start_date")
+    return start, end
+
 @app.post("/api/milestones/bulk")
 async def bulk_accept_milestones(milestones: List[MilestonePayload], group_id: Optional[int] = None, username: str = Depends(get_current_user_token), session: AsyncSession = Depends(get_db)):
     """Accept multiple milestones at once."""
@@ -1909,6 +2354,8 @@ async def bulk_accept_milestones(milestones: List[MilestonePayload], group_id: O
     if not u:
         raise HTTPException(status_code=401, detail="Invalid user")
     
+    dates = [_milestone_dates(m_data) for m_data in milestones]
+    
     # Clear existing milestones for this group
     if group_id:
         existing_res = await session.execute(select(Milestone).where(Milestone.group_id == group_id))
@@ -1918,11 +2365,11 @@ async def bulk_accept_milestones(milestones: List[MilestonePayload], group_id: O
         await session.delete(m)
     
     # Add new milestones
-    for m_data in milestones:
+    for m_data, (start_date, end_date) in zip(milestones, dates):
         milestone = Milestone(
             title=m_data.title,
-            start_date=m_data.start_date,
-            end_date=m_data.end_date,
+            start_date=start_date,
+            end_date=end_date,
             description=m_data.description,
             assigned_roles=m_data.assigned_roles,
             risk_level=m_data.risk_level,
@@ -1933,7 +2380,7 @@ async def bulk_accept_milestones(milestones: List[MilestonePayload], group_id: O
         session.add(milestone)
     
     await session.commit()
-    await manager.broadcast({"type": "milestones_updated"})
+    change_notifier.reset("milestones", group_id)
     return {"ok": True, "count": len(milestones)}
 
 @app.post("/api/milestones")
@@ -1944,10 +2391,11 @@ async def create_milestone(payload: MilestonePayload, username: str = Depends(ge
     if not u:
         raise HTTPException(status_code=401, detail="Invalid user")
     
+    start_date, end_date = _milestone_dates(payload)
     milestone = Milestone(
         title=payload.title,
-        start_date=payload.start_date,
-        end_date=payload.end_date,
+        start_date=start_date,
+        end_date=end_date,
         description=payload.description,
         assigned_roles=payload.assigned_roles,
         risk_level=payload.risk_level,
@@ -1957,6 +2405,7 @@ async def create_milestone(payload: MilestonePayload, username: str = Depends(ge
     session.add(milestone)
     await session.commit()
     await session.refresh(milestone)
+    change_notifier.changed("milestones", milestone.group_id, milestone.id)
     return {"ok": True, "id": milestone.id}
 
 @app.get("/api/milestones")
@@ -1967,7 +2416,7 @@ async def get_milestones(group_id: Optional[int] = None, username: str = Depends
     else:
         milestones_res = await session.execute(select(Milestone).where(Milestone.group_id == None).order_by(Milestone.start_date))
     milestones = milestones_res.scalars().all()
-    return {"milestones": [{"id": m.id, "title": m.title, "start_date": m.start_date, "end_date": m.end_date, "description": m.description, "assigned_roles": m.assigned_roles, "risk_level": m.risk_level, "dependencies": m.dependencies} for m in milestones]}
+    return {"milestones": [milestone_to_dict(m) for m in milestones]}
 
 @app.delete("/api/milestones/{milestone_id}")
 async def delete_milestone(milestone_id: int, username: str = Depends(get_current_user_token), session: AsyncSession = Depends(get_db)):
@@ -1977,6 +2426,7 @@ async def delete_milestone(milestone_id: int, username: str = Depends(get_curren
         raise HTTPException(status_code=404, detail="Milestone not found")
     await session.delete(milestone)
     await session.commit()
+    change_notifier.changed("milestones", milestone.group_id, milestone.id)
     return {"ok": True}
 
 @app.patch("/api/milestones/{milestone_id}")
@@ -1986,14 +2436,16 @@ async def update_milestone(milestone_id: int, payload: MilestonePayload, usernam
     if not milestone:
         raise HTTPException(status_code=404, detail="Milestone not found")
     
+    start_date, end_date = _milestone_dates(payload)
     milestone.title = payload.title
-    milestone.start_date = payload.start_date
-    milestone.end_date = payload.end_date
+    milestone.start_date = start_date
+    milestone.end_date = end_date
     milestone.description = payload.description
     milestone.assigned_roles = payload.assigned_roles
     milestone.risk_level = payload.risk_level
     milestone.dependencies = payload.dependencies
     await session.commit()
+    change_notifier.changed("milestones", milestone.group_id, milestone.id)
     return {"ok": True}
 
 # --------- Project Pulse Route ---------
@@ -2002,6 +2454,11 @@ class ProjectPulsePayload(BaseModel):
     milestones: List[Dict]
     tasks: List[Dict]
 
+@app.get("/api/project-pulse")
+async def get_stored_project_pulse(group_id: Optional[int] = None, username: str = Depends(get_current_user_token), session: AsyncSession = Depends(get_db)):
+    """Project pulse for the group's saved milestones, computed in SQL."""
+    return await load_project_pulse(session, group_id)
+
 @app.post("/api/project-pulse")
 async def get_project_pulse(payload: ProjectPulsePayload, username: str = Depends(get_current_user_token)):
     """Calculate project pulse status."""
@@ -2019,13 +2476,14 @@ async def set_ship_date(payload: ShipDatePayload, group_id: Optional[int] = None
     else:
         settings_res = await session.execute(select(ProjectSettings).where(ProjectSettings.group_id == None).limit(1))
     settings = settings_res.scalar_one_or_none()
+    ship_date = _date_field(payload.ship_date, "ship_date")
     if not settings:
-        settings = ProjectSettings(ship_date=payload.ship_date, group_id=group_id)
+        settings = ProjectSettings(ship_date=ship_date, group_id=group_id)
         session.add(settings)
     else:
-        settings.ship_date = payload.ship_date
+        settings.ship_date = ship_date
     await session.commit()
-    return {"ok": True, "ship_date": payload.ship_date}
+    return {"ok": True, "ship_date": ship_date}
 
 @app.get("/api/project/ship-date")
 async def get_ship_date(group_id: Optional[int] = None, username: str = Depends(get_current_user_token), session: AsyncSession = Depends(get_db)):
@@ -2044,14 +2502,14 @@ async def get_decisions(username: str = Depends(get_current_user_token), session
     decisions_res = await session.execute(select(Decision).order_by(desc(Decision.created_at)))
     decisions = decisions_res.scalars().all()
     result = []
+    deciders = await get_usernames(session, [d.decided_by for d in decisions])
     for d in decisions:
-        user_obj = await session.get(User, d.decided_by)
         result.append({
             "id": d.id,
             "conflict_id": d.conflict_id,
             "selected_option": d.selected_option.value,
             "reasoning": d.reasoning,
-            "decided_by": user_obj.username if user_obj else "unknown",
+            "decided_by": deciders.get(d.decided_by, "unknown"),
             "created_at": str(d.created_at)
         })
     return {"decisions": result}
@@ -2063,13 +2521,13 @@ async def get_decision_by_conflict(conflict_id: str, username: str = Depends(get
     decision = decision_res.scalar_one_or_none()
     if not decision:
         raise HTTPException(status_code=404, detail="Decision not found")
-    user_obj = await session.get(User, decision.decided_by)
+    decided_by = await get_username(session, decision.decided_by)
     return {
         "id": decision.id,
         "conflict_id": decision.conflict_id,
         "selected_option": decision.selected_option.value,
         "reasoning": decision.reasoning,
-        "decided_by": user_obj.username if user_obj else "unknown",
+        "decided_by": decided_by,
         "created_at": str(decision.created_at)
     }
 
@@ -2125,29 +2583,10 @@ async def get_active_conflicts(group_id: Optional[int] = None, username: str = D
         votes_res = await session.execute(
             select(ConflictVote).where(ConflictVote.conflict_id == c.conflict_id)
         )
-        votes = votes_res.scalars().all()
-        
-        vote_counts = {'A': 0, 'B': 0, 'C': 0}
-        user_votes = {}
-        for vote in votes:
-            vote_counts[vote.selected_option.value] += 1
-            user_obj = await session.get(User, vote.user_id)
-            user_votes[user_obj.username if user_obj else "unknown"] = vote.selected_option.value
-        
-        remaining_time = c.expires_at - datetime.now()
-        hours_left = max(0, int(remaining_time.total_seconds() / 3600))
-        
-        result.append({
-            "conflict_id": c.conflict_id,
-            "user_statement": c.user_statement,
-            "source_file": c.source_file,
-            "severity": c.severity.value,
-            "reason": c.reason,
-            "vote_counts": vote_counts,
-            "user_votes": user_votes,
-            "hours_remaining": hours_left,
-            "created_at": str(c.created_at)
-        })
+        conflict_votes = votes_res.scalars().all()
+        voters = await get_usernames(session, [vote.user_id for vote in conflict_votes])
+        votes = [(vote.selected_option.value, voters.get(vote.user_id)) for vote in conflict_votes]
+        result.append(conflict_to_dict(c, votes))
     
     return {"conflicts": result}
 
@@ -2205,7 +2644,7 @@ async def submit_vote(payload: VotePayload, username: str = Depends(get_current_
     await session.commit()
     
     # Broadcast voting update
-    await manager.broadcast({"type": "voting_updated"})
+    change_notifier.changed("conflicts", conflict.group_id, conflict.conflict_id)
     return {"ok": True}
 
 @app.post("/api/conflicts/{conflict_id}/end")
@@ -2300,8 +2739,8 @@ Start with: "✅ Vote Concluded:"""
     await broadcast_message(session, bot_msg)
     
     # Broadcast update
-    await manager.broadcast({"type": "voting_updated"})
-    await manager.broadcast({"type": "decisions_updated"})
+    change_notifier.changed("conflicts", conflict.group_id, conflict.conflict_id)
+    await manager.publish_group(conflict.group_id, {"type": "decisions_updated"})
     
     return {"ok": True, "winner": winner, "votes": vote_counts}
 
@@ -2371,10 +2810,10 @@ async def get_group_members(group_id: int, username: str = Depends(get_current_u
     memberships_res = await session.execute(select(GroupMembership).where(GroupMembership.group_id == group_id))
     memberships = memberships_res.scalars().all()
     members = []
+    names = await get_usernames(session, [m.user_id for m in memberships])
     for m in memberships:
-        user = await session.get(User, m.user_id)
-        if user:
-            members.append({"username": user.username, "role": m.role})
+        if m.user_id in names:
+            members.append({"username": names[m.user_id], "role": m.role})
     return {"members": members}
 
 class LastActiveGroupPayload(BaseModel):
@@ -2405,148 +2844,75 @@ async def get_last_active_group(username: str = Depends(get_current_user_token),
 @app.get("/api/dashboard")
 async def get_dashboard(username: str = Depends(get_current_user_token), session: AsyncSession = Depends(get_db)):
     """Get comprehensive dashboard data across all user's groups."""
-    from datetime import datetime, date
-    
-    # Get user
     user_res = await session.execute(select(User).where(User.username == username))
     user = user_res.scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=401, detail="Invalid user")
-    
-    # Get all groups user is in
-    memberships_res = await session.execute(select(GroupMembership).where(GroupMembership.user_id == user.id))
-    memberships = memberships_res.scalars().all()
-    group_ids = [m.group_id for m in memberships]
-    
-    dashboard_data = {"groups": []}
-    
-    # Add personal workspace (group_id = None)
-    all_group_ids = [None] + group_ids
-    
-    for gid in all_group_ids:
-        # Get group info
-        if gid:
-            group = await session.get(Group, gid)
-            group_name = group.name if group else "Unknown"
-        else:
-            group_name = "Personal Workspace"
-        
-        # Get tasks for this group
-        if gid:
-            tasks_res = await session.execute(
-                select(Task).where(Task.group_id == gid).order_by(Task.due_date)
-            )
-        else:
-            tasks_res = await session.execute(
-                select(Task).where(Task.group_id == None).order_by(Task.due_date)
-            )
-        all_tasks = tasks_res.scalars().all()
-        
-        # Filter user's tasks
-        my_tasks = [t for t in all_tasks if t.assigned_to and username in t.assigned_to]
-        my_pending = [t for t in my_tasks if t.status == TaskStatus.pending]
-        
-        # Get overdue tasks
-        today = date.today()
-        overdue = [t for t in my_pending if t.due_date and datetime.strptime(t.due_date, "%Y-%m-%d").date() < today]
-        due_soon = [t for t in my_pending if t.due_date and datetime.strptime(t.due_date, "%Y-%m-%d").date() >= today and datetime.strptime(t.due_date, "%Y-%m-%d").date() <= today + timedelta(days=3)]
-        
-        # Get recent messages
-        if gid:
-            msgs_res = await session.execute(
-                select(Message).where(Message.group_id == gid, Message.is_bot == False)
-                .order_by(desc(Message.created_at)).limit(5)
-            )
-        else:
-            msgs_res = await session.execute(
-                select(Message).where(Message.group_id == None, Message.is_bot == False)
-                .order_by(desc(Message.created_at)).limit(5)
-            )
-        recent_messages = msgs_res.scalars().all()
-        
-        # Get active conflicts
-        if gid:
-            conflicts_res = await session.execute(
-                select(ActiveConflict).where(
-                    ActiveConflict.group_id == gid,
-                    ActiveConflict.is_resolved == False,
-                    ActiveConflict.expires_at > datetime.now()
-                )
-            )
-        else:
-            conflicts_res = await session.execute(
-                select(ActiveConflict).where(
-                    ActiveConflict.group_id == None,
-                    ActiveConflict.is_resolved == False,
-                    ActiveConflict.expires_at > datetime.now()
-                )
-            )
-        active_conflicts = conflicts_res.scalars().all()
-        
-        # Get upcoming meetings
-        if gid:
-            meetings_res = await session.execute(
-                select(Meeting).where(
-                    Meeting.group_id == gid,
-                    Meeting.datetime >= datetime.now().isoformat()
-                ).order_by(Meeting.datetime).limit(3)
-            )
-        else:
-            meetings_res = await session.execute(
-                select(Meeting).where(
-                    Meeting.group_id == None,
-                    Meeting.datetime >= datetime.now().isoformat()
-                ).order_by(Meeting.datetime).limit(3)
-            )
-        upcoming_meetings = meetings_res.scalars().all()
-        
-        dashboard_data["groups"].append({
-            "group_id": gid,
-            "group_name": group_name,
-            "stats": {
-                "total_tasks": len(all_tasks),
-                "my_tasks": len(my_tasks),
-                "pending_tasks": len(my_pending),
-                "overdue_tasks": len(overdue),
-                "due_soon_tasks": len(due_soon),
-                "active_conflicts": len(active_conflicts),
-                "upcoming_meetings": len(upcoming_meetings)
-            },
-            "my_tasks": [{
-                "id": t.id,
-                "content": t.content,
-                "due_date": t.due_date,
-                "status": t.status.value,
-                "is_overdue": t.due_date and datetime.strptime(t.due_date, "%Y-%m-%d").date() < today
-            } for t in my_pending[:5]],
-            "recent_activity": [{
-                "type": "message",
-                "content": m.content[:100],
-                "created_at": str(m.created_at)
-            } for m in recent_messages[:3]],
-            "conflicts": [{
-                "conflict_id": c.conflict_id,
-                "reason": c.reason,
-                "severity": c.severity.value
-            } for c in active_conflicts],
-            "meetings": [{
-                "id": m.id,
-                "title": m.title,
-                "datetime": m.datetime
-            } for m in upcoming_meetings]
-        })
-    
-    return dashboard_data
+    return await get_dashboard_cached(session, user.id)
+
+async def _ws_user(token: Optional[str]) -> Optional[User]:
+    """Resolve the user behind a WebSocket token, or None if missing/invalid."""
+    if not token:
+        return None
+    from auth import decode_access_token
+    try:
+        username = decode_access_token(token).get("sub")
+    except Exception:
+        return None
+    async with SessionLocal() as session:
+        res = await session.execute(select(User).where(User.username == username))
+        return res.scalar_one_or_none()
+
+async def _is_group_member(user_id: int, group_id: int) -> bool:
+    async with SessionLocal() as session:
+        res = await session.execute(
+            select(GroupMembership.id).where(GroupMembership.user_id == user_id, GroupMembership.group_id == group_id).limit(1)
+        )
+        return res.scalar_one_or_none() is not None
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    # Optional auth via query param token
-    await manager.connect(websocket)
+    # Auth via query param token (browsers cannot set headers on WebSocket requests)
+    user = await _ws_user(websocket.query_params.get("token"))
+    if not user:
+        # Accept first so the client sees the close code instead of a failed handshake
+        await websocket.accept()
+        await websocket.close(code=4401)
+        return
+    user_id = user.id
+    encoding = negotiate_encoding(websocket.query_params.get("encoding"))
+    async with SessionLocal() as session:
+        group_ids = await _user_group_ids(session, user_id)
+    # Presence is shown to the members of these groups only
+    await manager.connect(websocket, user_id, encoding, user.username, group_ids)
+    # Until the client says which conversation it shows, it sees the default chat
+    manager.subscribe(websocket, group_topic(None))
     try:
         while True:
-            # We don't expect messages from client over WS; ignore/echo if any
             data = await websocket.receive_text()
-            await websocket.send_json({"type": "ack", "echo": data})
+            try:
+                frame = json.loads(data)
+            except ValueError:
+                frame = None
+            if isinstance(frame, dict) and frame.get("type") == "subscribe":
+                dm_user_id = frame.get("dm_user_id")
+                group_id = frame.get("group_id")
+                if isinstance(dm_user_id, int):
+                    topic = dm_topic(user_id, dm_user_id)
+                elif group_id is None:
+                    topic = group_topic(None)
+                elif isinstance(group_id, int) and await _is_group_member(user_id, group_id):
+                    topic = group_topic(group_id)
+                else:
+                    # Keep the current view; only members may stream a group
+                    await manager.send(websocket, {"type": "subscribe_error", "group_id": group_id, "detail": "Not a member of this group"})
+                    continue
+                manager.subscribe(websocket, topic)
+                await manager.send(websocket, {"type": "subscribed", "topic": topic, "seq": manager.seqs.get(topic, 0), "epoch": manager.epoch})
+                if isinstance(frame.get("resume_from"), dict):
+                    await manager.resume(websocket, frame["resume_from"], frame.get("epoch"))
+            else:
+                await manager.send(websocket, {"type": "ack", "echo": data})
     except WebSocketDisconnect:
         manager.disconnect(websocket)
 
@@ -0,0 +1,200 @@
+"""Content-addressed storage for uploaded file bytes.
+
+Blobs are keyed by the SHA-256 of their content, so uploading the same file twice
+stores it once; the database keeps only the key (UploadedFile.blob_key). A blob may be
+shared by several rows, so rows are deleted without touching the store and a periodic
+sweep removes blobs that no row references. The sweep skips blobs stored (or stored
+again) within BLOB_SWEEP_GRACE seconds, whose uploads may not have committed their row yet.
+
+BLOB_STORE selects the backend:
+  local - files under BLOB_DIR, sharded by the first hex digits of the key (default)
+"""
+
+import os
+import time
+import uuid
+import hashlib
+import asyncio
+import tempfile
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterator, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BLOB_STORE = os.getenv("BLOB_STORE", "local").lower()
+BLOB_DIR = os.getenv("BLOB_DIR", "./blob_store")
+# Seconds between sweeps for unreferenced blobs, and the minimum age of a blob it may delete
+BLOB_SWEEP_INTERVAL = float(os.getenv("BLOB_SWEEP_INTERVAL", "3600"))
+BLOB_SWEEP_GRACE = int(os.getenv("BLOB_SWEEP_GRACE", "3600"))
+
+# Read size when streaming a blob out
+BLOB_CHUNK_SIZE = 64 * 1024
+
+class BlobStore(ABC):
+    """Interface: bytes in by content hash, file objects out."""
+
+    name = "base"
+
+    @abstractmethod
+    def put_bytes(self, data: bytes) -> str:
+        ...
+
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        ...
+
+    @abstractmethod
+    def size(self, key: str) -> int:
+        ...
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, key: str):
+        ...
+
+    @abstractmethod
+    def keys_older_than(self, seconds: float) -> Iterator[str]:
+        """Keys of blobs last stored more than seconds ago."""
+        ...
+
+    @abstractmethod
+    def delete_if_older(self, key: str, seconds: float) -> bool:
+        """Delete the blob unless it was stored again in the last seconds; True if deleted."""
+        ...
+
+    def temp_path(self) -> str:
+        """A fresh path for spooling data that will be handed to put_path."""
+        fd, path = tempfile.mkstemp(suffix=".upload")
+        os.close(fd)
+        return path
+
+    def put_path(self, path: str, key: str) -> str:
+        """Store the file at path, whose SHA-256 is key; the file is consumed."""
+        try:
+            with open(path, "rb") as f:
+                return self.put_bytes(f.read())
+        finally:
+            os.remove(path)
+
+    async def put(self, data: bytes) -> str:
+        """Store data (off the event loop) and return its key."""
+        return await asyncio.to_thread(self.put_bytes, data)
+
+    def iter_chunks(self, key: str, start: int = 0, length: Optional[int] = None, chunk_size: int = BLOB_CHUNK_SIZE) -> Iterator[bytes]:
+        """Yield the blob (or length bytes from start) in chunks."""
+        with self.open(key) as f:
+            if start:
+                f.seek(start)
+            remaining = length
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def read(self, key: str) -> bytes:
+        def _read():
+            with self.open(key) as f:
+                return f.read()
+        return await asyncio.to_thread(_read)
+
+class LocalBlobStore(BlobStore):
+    """Blobs as files: BLOB_DIR/ab/cd/abcd...."""
+
+    name = "local"
+
+    def __init__(self, root: str = BLOB_DIR):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def path(self, key: str) -> str:
+        if len(key) != 64 or not all(c in "0123456789abcdef" for c in key):
+            raise ValueError(f"Invalid blob key: {key!r}")
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def _touch(self, path: str) -> bool:
+        """Refresh an existing blob's mtime so the sweep leaves it alone; False if it does not exist."""
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def put_bytes(self, data: bytes) -> str:
+        key = hashlib.sha256(data).hexdigest()
+        path = self.path(key)
+        if self._touch(path):
+            return key  # same content already stored
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a unique name and rename, so readers never see a partial blob
+        tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        return key
+
+    def temp_path(self) -> str:
+        # Inside the store, so put_path is a rename on the same filesystem
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        return os.path.join(tmp_dir, f"{uuid.uuid4().hex}.upload")
+
+    def put_path(self, path: str, key: str) -> str:
+        target = self.path(key)
+        if self._touch(target):
+            os.remove(path)  # same content already stored
+            return key
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+        return key
+
+    def open(self, key: str) -> BinaryIO:
+        return open(self.path(key), "rb")
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self.path(key))
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path(key))
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def keys_older_than(self, seconds: float) -> Iterator[str]:
+        cutoff = time.time() - seconds
+        for shard in os.scandir(self.root):
+            if not shard.is_dir() or len(shard.name) != 2:
+                continue  # e.g. the tmp spool directory
+            for sub in os.scandir(shard.path):
+                if not sub.is_dir():
+                    continue
+                for entry in os.scandir(sub.path):
+                    if len(entry.name) == 64 and entry.stat().st_mtime < cutoff:
+                        yield entry.name
+
+    def delete_if_older(self, key: str, seconds: float) -> bool:
+        path = self.path(key)
+        try:
+            if os.path.getmtime(path) >= time.time() - seconds:
+                return False
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+def create_blob_store(kind: str = BLOB_STORE) -> BlobStore:
+    if kind != "local":
+        print(f"⚠️  Unknown BLOB_STORE '{kind}' - using local files in {BLOB_DIR}")
+    return LocalBlobStore()
+
+# Global store instance
+blob_store = create_blob_store()
@@ -0,0 +1,143 @@
+"""Debounced change events that carry the changed entities.
+
+Code that changes tasks, meetings, milestones or conflict votes records the entity id
+with changed(); ids are collected per (kind, group) for CHANGE_DEBOUNCE seconds and then
+published as one event, e.g.
+
+    {"type": "tasks_updated", "group_id": 3, "upserted": [{...task...}], "deleted": [12]}
+
+The entities are re-read once per burst, so an id that no longer exists (or, for
+conflicts, is no longer open for voting) is reported as deleted. reset() sends the
+group's whole list as "snapshot" instead, for bulk replacements. Clients patch their
+cached lists instead of re-fetching them.
+"""
+
+import os
+import asyncio
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from db import SessionLocal, Task, Meeting, Milestone, ActiveConflict, ConflictVote, UploadedFile, User
+from serializers import task_to_dict, meeting_to_dict, milestone_to_dict, conflict_to_dict
+from websocket_manager import manager
+
+load_dotenv()
+
+CHANGE_DEBOUNCE = float(os.getenv("CHANGE_DEBOUNCE", "0.2"))
+
+def _in_group(column, group_id: Optional[int]):
+    return column == group_id if group_id else column == None
+
+async def _load_tasks(session, group_id, ids):
+    query = select(Task).where(Task.id.in_(ids)) if ids is not None else select(Task).where(_in_group(Task.group_id, group_id)).order_by(Task.created_at.desc())
+    return [task_to_dict(t) for t in (await session.execute(query)).scalars().all()]
+
+async def _load_meetings(session, group_id, ids):
+    query = (
+        select(Meeting, UploadedFile.filename)
+        .outerjoin(UploadedFile, UploadedFile.id == Meeting.transcript_file_id)
+    )
+    if ids is not None:
+        query = query.where(Meeting.id.in_(ids))
+    else:
+        query = query.where(_in_group(Meeting.group_id, group_id)).order_by(Meeting.created_at.desc())
+    return [meeting_to_dict(m, filename) for m, filename in (await session.execute(query)).all()]
+
+async def _load_milestones(session, group_id, ids):
+    query = select(Milestone).where(Milestone.id.in_(ids)) if ids is not None else select(Milestone).where(_in_group(Milestone.group_id, group_id)).order_by(Milestone.start_date)
+    return [milestone_to_dict(m) for m in (await session.execute(query)).scalars().all()]
+
+async def _load_conflicts(session, group_id, ids):
+    query = select(ActiveConflict).where(ActiveConflict.is_resolved == False, ActiveConflict.expires_at > datetime.now())
+    if ids is not None:
+        query = query.where(ActiveConflict.conflict_id.in_(ids))
+    else:
+        query = query.where(_in_group(ActiveConflict.group_id, group_id)).order_by(ActiveConflict.created_at.desc())
+    conflicts = (await session.execute(query)).scalars().all()
+    if not conflicts:
+        return []
+    votes_res = await session.execute(
+        select(ConflictVote.conflict_id, ConflictVote.selected_option, User.username)
+        .outerjoin(User, User.id == ConflictVote.user_id)
+        .where(ConflictVote.conflict_id.in_([c.conflict_id for c in conflicts]))
+    )
+    votes: Dict[str, list] = {}
+    for conflict_id, option, voter in votes_res.all():
+        votes.setdefault(conflict_id, []).append((option.value, voter))
+    return [conflict_to_dict(c, votes.get(c.conflict_id, [])) for c in conflicts]
+
+# kind -> (event type, id field, loader)
+KINDS = {
+    "tasks": ("tasks_updated", "id", _load_tasks),
+    "meetings": ("meetings_updated", "id", _load_meetings),
+    "milestones": ("milestones_updated", "id", _load_milestones),
+    "conflicts": ("voting_updated", "conflict_id", _load_conflicts),
+}
+
+class ChangeNotifier:
+    """Collects entity changes and publishes them as coalesced delta events."""
+
+    def __init__(self, debounce: float = CHANGE_DEBOUNCE):
+        self.debounce = debounce
+        # (kind, group_id) -> changed ids, or None for "send a snapshot"
+        self._pending: Dict[Tuple[str, Optional[int]], Optional[Set]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._stats = {"changes": 0, "events": 0, "snapshots": 0, "errors": 0}
+
+    def changed(self, kind: str, group_id: Optional[int], entity_id):
+        """Record that an entity was created, updated or deleted (after the commit)."""
+        self._stats["changes"] += 1
+        key = (kind, group_id)
+        if key in self._pending and self._pending[key] is None:
+            return  # a snapshot already covers it
+        self._pending.setdefault(key, set()).add(entity_id)
+        self._schedule()
+
+    def reset(self, kind: str, group_id: Optional[int]):
+        """Send the group's full list for kind (bulk replacements)."""
+        self._stats["changes"] += 1
+        self._pending[(kind, group_id)] = None
+        self._schedule()
+
+    def _schedule(self):
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.debounce)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        try:
+            async with SessionLocal() as session:
+                for (kind, group_id), ids in pending.items():
+                    event_type, id_field, loader = KINDS[kind]
+                    entities = await loader(session, group_id, list(ids) if ids is not None else None)
+                    event = {"type": event_type, "group_id": group_id}
+                    if ids is None:
+                        event["snapshot"] = entities
+                        self._stats["snapshots"] += 1
+                    else:
+                        found = {e[id_field] for e in entities}
+                        event["upserted"] = entities
+                        event["deleted"] = [i for i in ids if i not in found]
+                    self._stats["events"] += 1
+                    await manager.publish_group(group_id, event)
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"❌ Failed to publish change events: {e}")
+            # Clients fall back to a full reload on events without data
+            for kind, group_id in pending:
+                await manager.publish_group(group_id, {"type": KINDS[kind][0]})
+
+    def get_stats(self) -> dict:
+        return {"debounce_s": self.debounce, "pending": len(self._pending), **self._stats}
+
+# Global notifier instance
+change_notifier = ChangeNotifier()
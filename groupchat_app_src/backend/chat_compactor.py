@@ -1,6 +1,8 @@
 from llm import chat_completion
+from llm_scheduler import PRIORITY_BACKGROUND
 from sqlalchemy import select, desc, asc
-from db import Message, User, SessionLocal
+from db import Message, SessionLocal
+from user_cache import get_usernames
 from datetime import datetime, timedelta
 
 async def compact_chat_history(threshold_messages: int = 100):
@@ -22,13 +24,10 @@ async def compact_chat_history(threshold_messages: int = 100):
         
         # Create summary
         chat_lines = []
+        names = await get_usernames(session, [msg.user_id for msg in messages_to_compact if not msg.is_bot])
         for msg in messages_to_compact:
             if not msg.is_bot:
-                if msg.user_id:
-                    user = await session.get(User, msg.user_id)
-                    username = user.username if user else "unknown"
-                else:
-                    username = "unknown"
+                username = names.get(msg.user_id, "unknown")
                 chat_lines.append(f"{username}: {msg.content}")
         chat_text = "\n".join(chat_lines)
         
@@ -44,7 +43,7 @@ Create a concise summary covering:
 
 Format as: 📝 CHAT SUMMARY (Messages 1-{compact_count})"""
         
-        summary = await chat_completion([{"role": "user", "content": prompt}])
+        summary = await chat_completion([{"role": "user", "content": prompt}], priority=PRIORITY_BACKGROUND)
         
         # Delete old messages and insert summary
         for msg in messages_to_compact:
@@ -1,6 +1,10 @@
-from typing import List, Dict
+from typing import List, Dict, Optional, Callable, Awaitable
 from vector_db import search_documents
-from llm import chat_completion
+from llm import chat_completion, chat_completion_stream
+
+# Response cache TTLs (seconds) for the classification prompts
+INTENT_CACHE_TTL = 300
+VOTE_QUESTION_CACHE_TTL = 300
 
 class ConversationChain:
     def __init__(self, max_history: int = 10):
@@ -14,8 +18,12 @@ class ConversationChain:
         if len(self.conversation_history) > self.max_history:
             self.conversation_history = self.conversation_history[-self.max_history:]
     
-    async def get_response(self, user_question: str) -> str:
-        """Generate response using conversation history and vector search"""
+    async def get_response(self, user_question: str, on_delta: Optional[Callable[[str], Awaitable[None]]] = None, verdict=None) -> str:
+        """Generate response using conversation history and vector search.
+
+        If on_delta is given, the answer is streamed and each token is passed to it as it arrives.
+        A MessageVerdict from message_analyzer supplies the intent instead of a separate prompt.
+        """
         print(f"\n🤖 Processing: '{user_question}'")
         
         # Skip RAG for simple greetings and short messages
@@ -112,10 +120,15 @@ Examples:
 - "explain this concept" -> NORMAL"""
         
         try:
-            intent_response = await chat_completion([{"role": "user", "content": intent_prompt}], temperature=0.1)
-            intent = intent_response.strip().upper()
+            if verdict is not None and verdict.has("intent"):
+                intent = verdict.section("intent")
+            else:
+                intent_response = await chat_completion([{"role": "user", "content": intent_prompt}], temperature=0.1, cache_ttl=INTENT_CACHE_TTL)
+                intent = intent_response.strip().upper()
             
             if intent == "VOTE":
+                if verdict is not None and verdict.has("vote_question"):
+                    return f"__VOTE_REQUEST__{verdict.section('vote_question')}"
                 # Extract vote question naturally
                 vote_prompt = f"""Extract the main question or topic for voting from this message. Make it a clear yes/no question.
 
@@ -123,7 +136,7 @@ User message: "{user_question}"
 
 Return only the question, nothing else."""
                 try:
-                    vote_question = await chat_completion([{"role": "user", "content": vote_prompt}], temperature=0.1)
+                    vote_question = await chat_completion([{"role": "user", "content": vote_prompt}], temperature=0.1, cache_ttl=VOTE_QUESTION_CACHE_TTL)
                     return f"__VOTE_REQUEST__{vote_question.strip()}"
                 except:
                     return f"__VOTE_REQUEST__Should we proceed with this decision?"
@@ -145,7 +158,14 @@ Return only the question, nothing else."""
         
         # Generate response
         print("🗨️  Calling LLM...")
-        response = await chat_completion(messages)
+        if on_delta:
+            parts = []
+            async for token in chat_completion_stream(messages):
+                parts.append(token)
+                await on_delta(token)
+            response = "".join(parts)
+        else:
+            response = await chat_completion(messages)
         print(f"✅ Response generated: {response[:100]}...\n")
         
         # Update conversation history
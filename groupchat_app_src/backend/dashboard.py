@@ -0,0 +1,184 @@
+"""Cross-group dashboard built from a fixed number of grouped queries.
+
+The dashboard used to run five queries per group and filter tasks in Python. Here every
+section is one query over all of the user's groups (plus the personal workspace,
+group_id NULL): task counts come from a GROUP BY, "top N per group" lists from
+ROW_NUMBER() windows, and recent messages from a UNION ALL of small per-group index
+reads. Results are cached per user for DASHBOARD_CACHE_TTL seconds.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+from sqlalchemy import select, func, case, and_, or_, desc, union_all
+
+from db import Task, TaskStatus, Message, Meeting, ActiveConflict, Group, GroupMembership
+from task_assignees import assigned_to_user
+from dates import iso_date, iso_datetime
+
+load_dotenv()
+
+DASHBOARD_CACHE_TTL = float(os.getenv("DASHBOARD_CACHE_TTL", "15"))
+DASHBOARD_CACHE_SIZE = 512
+
+DUE_SOON_DAYS = 3
+MY_TASKS_PER_GROUP = 5
+MESSAGES_PER_GROUP = 3
+MEETINGS_PER_GROUP = 3
+
+_cache: "OrderedDict[int, tuple]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0}
+
+def _in_groups(column, group_ids: List[int]):
+    """The personal workspace (NULL) or any of group_ids."""
+    return or_(column == None, column.in_(group_ids))
+
+def _rank(partition, order):
+    return func.row_number().over(partition_by=partition, order_by=order).label("rank")
+
+async def _task_stats(session, group_ids, mine, today):
+    pending_mine = and_(mine, Task.status == TaskStatus.pending)
+    count = lambda condition: func.sum(case((condition, 1), else_=0))
+    res = await session.execute(
+        select(
+            Task.group_id,
+            func.count().label("total_tasks"),
+            count(mine).label("my_tasks"),
+            count(pending_mine).label("pending_tasks"),
+            count(and_(pending_mine, Task.due_date < today)).label("overdue_tasks"),
+            count(and_(pending_mine, Task.due_date.between(today, today + timedelta(days=DUE_SOON_DAYS)))).label("due_soon_tasks"),
+        )
+        .where(_in_groups(Task.group_id, group_ids))
+        .group_by(Task.group_id)
+    )
+    return {row.group_id: row for row in res.all()}
+
+async def _my_tasks(session, group_ids, mine, today):
+    ranked = (
+        select(
+            Task.id, Task.group_id, Task.content, Task.due_date, Task.status,
+            (Task.due_date < today).label("is_overdue"),
+            _rank(Task.group_id, Task.due_date),
+        )
+        .where(_in_groups(Task.group_id, group_ids), mine, Task.status == TaskStatus.pending)
+        .subquery()
+    )
+    res = await session.execute(select(ranked).where(ranked.c.rank <= MY_TASKS_PER_GROUP).order_by(ranked.c.rank))
+    return res.all()
+
+async def _recent_messages(session, group_ids):
+    # One LIMIT per group keeps each branch on the (group_id, dm_user_id, id) index
+    branches = [
+        select(Message.group_id, Message.content, Message.created_at)
+        .where(Message.group_id == gid if gid else Message.group_id == None, Message.dm_user_id == None, Message.is_bot == False)
+        .order_by(desc(Message.id))
+        .limit(MESSAGES_PER_GROUP)
+        for gid in [None] + group_ids
+    ]
+    res = await session.execute(union_all(*branches) if len(branches) > 1 else branches[0])
+    return res.all()
+
+async def _conflicts(session, group_ids, now):
+    res = await session.execute(
+        select(ActiveConflict.group_id, ActiveConflict.conflict_id, ActiveConflict.reason, ActiveConflict.severity)
+        .where(_in_groups(ActiveConflict.group_id, group_ids), ActiveConflict.is_resolved == False, ActiveConflict.expires_at > now)
+    )
+    return res.all()
+
+async def _upcoming_meetings(session, group_ids, now):
+    ranked = (
+        select(Meeting.id, Meeting.group_id, Meeting.title, Meeting.datetime, _rank(Meeting.group_id, Meeting.datetime))
+        .where(_in_groups(Meeting.group_id, group_ids), Meeting.datetime >= now)
+        .subquery()
+    )
+    res = await session.execute(select(ranked).where(ranked.c.rank <= MEETINGS_PER_GROUP).order_by(ranked.c.rank))
+    return res.all()
+
+def _by_group(rows) -> Dict[Optional[int], list]:
+    grouped: Dict[Optional[int], list] = {}
+    for row in rows:
+        grouped.setdefault(row.group_id, []).append(row)
+    return grouped
+
+async def build_dashboard(session, user_id: int) -> dict:
+    res = await session.execute(
+        select(GroupMembership.group_id, Group.name)
+        .outerjoin(Group, Group.id == GroupMembership.group_id)
+        .where(GroupMembership.user_id == user_id)
+    )
+    memberships = res.all()
+    group_ids = [gid for gid, _ in memberships]
+
+    today = date.today()
+    now = datetime.now()
+    mine = assigned_to_user(user_id)
+
+    stats = await _task_stats(session, group_ids, mine, today)
+    my_tasks = _by_group(await _my_tasks(session, group_ids, mine, today))
+    messages = _by_group(await _recent_messages(session, group_ids))
+    conflicts = _by_group(await _conflicts(session, group_ids, now))
+    meetings = _by_group(await _upcoming_meetings(session, group_ids, now))
+
+    groups = []
+    for gid, name in [(None, "Personal Workspace")] + memberships:
+        counts = stats.get(gid)
+        group_conflicts = conflicts.get(gid, [])
+        group_meetings = meetings.get(gid, [])
+        groups.append({
+            "group_id": gid,
+            "group_name": name or "Unknown",
+            "stats": {
+                "total_tasks": counts.total_tasks if counts else 0,
+                "my_tasks": int(counts.my_tasks or 0) if counts else 0,
+                "pending_tasks": int(counts.pending_tasks or 0) if counts else 0,
+                "overdue_tasks": int(counts.overdue_tasks or 0) if counts else 0,
+                "due_soon_tasks": int(counts.due_soon_tasks or 0) if counts else 0,
+                "active_conflicts": len(group_conflicts),
+                "upcoming_meetings": len(group_meetings)
+            },
+            "my_tasks": [{
+                "id": t.id,
+                "content": t.content,
+                "due_date": iso_date(t.due_date),
+                "status": t.status.value,
+                "is_overdue": bool(t.is_overdue)
+            } for t in my_tasks.get(gid, [])],
+            "recent_activity": [{
+                "type": "message",
+                "content": m.content[:100],
+                "created_at": str(m.created_at)
+            } for m in sorted(messages.get(gid, []), key=lambda m: m.created_at, reverse=True)],
+            "conflicts": [{
+                "conflict_id": c.conflict_id,
+                "reason": c.reason,
+                "severity": c.severity.value
+            } for c in group_conflicts],
+            "meetings": [{
+                "id": m.id,
+                "title": m.title,
+                "datetime": iso_datetime(m.datetime)
+            } for m in group_meetings]
+        })
+    return {"groups": groups}
+
+async def get_dashboard_cached(session, user_id: int) -> dict:
+    """build_dashboard, reused for DASHBOARD_CACHE_TTL seconds per user."""
+    now = time.monotonic()
+    entry = _cache.get(user_id)
+    if entry and entry[0] > now:
+        _stats["hits"] += 1
+        return entry[1]
+    _stats["misses"] += 1
+    data = await build_dashboard(session, user_id)
+    if DASHBOARD_CACHE_TTL > 0:
+        _cache[user_id] = (now + DASHBOARD_CACHE_TTL, data)
+        _cache.move_to_end(user_id)
+        while len(_cache) > DASHBOARD_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return data
+
+def get_dashboard_stats() -> dict:
+    return {"cached_users": len(_cache), "ttl_s": DASHBOARD_CACHE_TTL, **_stats}
@@ -0,0 +1,51 @@
+"""Parsing and formatting for the DATE/DATETIME columns.
+
+Task due dates, milestone ranges, ship dates and meeting times are real temporal columns,
+but the API, prompts and frontend exchange them as ISO strings ("2025-03-01",
+"2025-03-01T14:30"). The column types in db.py convert both ways, so model attributes
+loaded from the database are always these strings.
+"""
+
+from datetime import date, datetime
+from typing import Optional
+
+def to_date(value) -> Optional[date]:
+    """A date from a date/datetime or an ISO string (any time part is ignored); None if it is not one."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value).strip()[:10])
+    except ValueError:
+        return None
+
+def to_datetime(value) -> Optional[datetime]:
+    """A naive local datetime from a datetime/date or an ISO string; None if it is not one."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).strip())
+        except ValueError:
+            return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+def iso_date(value) -> Optional[str]:
+    parsed = to_date(value)
+    return parsed.isoformat() if parsed else None
+
+def iso_datetime(value) -> Optional[str]:
+    """"YYYY-MM-DDTHH:MM" (the datetime-local input format), with seconds only when set."""
+    parsed = to_datetime(value)
+    if not parsed:
+        return None
+    return parsed.isoformat(timespec="seconds" if parsed.second else "minutes")
@@ -0,0 +1,128 @@
+"""Registry that runs independent message detectors concurrently.
+
+Each detector has a side-effect free detect step (usually an LLM call) and a handle step
+that acts on a positive result. All detect steps start at once under a per-message
+deadline; results are then resolved in priority order. When an exclusive detector claims
+the message, every lower-priority detector still running is cancelled and skipped. A handler
+that raises is logged and its session work rolled back; the remaining handlers still run.
+"""
+
+import os
+import time
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Seconds all detectors together may take for one message
+DETECTOR_DEADLINE = float(os.getenv("DETECTOR_DEADLINE", "30"))
+
+class Detector:
+    """A named detector; lower priority numbers win."""
+
+    def __init__(
+        self,
+        name: str,
+        priority: int,
+        detect: Callable[[Dict[str, Any]], Awaitable[Any]],
+        handle: Callable[[Dict[str, Any], Any], Awaitable[bool]],
+        exclusive: bool = False,
+    ):
+        self.name = name
+        self.priority = priority
+        self.detect = detect
+        self.handle = handle
+        self.exclusive = exclusive
+
+class DetectorRegistry:
+    """Runs registered detectors in parallel and resolves their claims by priority."""
+
+    def __init__(self, deadline: float = DETECTOR_DEADLINE):
+        self.deadline = deadline
+        self._detectors: List[Detector] = []
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    def register(self, detector: Detector):
+        self._detectors.append(detector)
+        self._detectors.sort(key=lambda d: d.priority)
+        self._stats[detector.name] = {"runs": 0, "claims": 0, "cancelled": 0, "timeouts": 0, "errors": 0, "handle_errors": 0, "total_ms": 0.0}
+
+    async def _timed_detect(self, detector: Detector, ctx: Dict[str, Any]):
+        started = time.perf_counter()
+        try:
+            return await detector.detect(ctx)
+        finally:
+            self._stats[detector.name]["total_ms"] += (time.perf_counter() - started) * 1000
+
+    async def detect(self, ctx: Dict[str, Any]) -> List[Tuple[Detector, Any]]:
+        """Run every detector's detect step concurrently and return the winning claims in priority order."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        tasks = {}
+        for detector in self._detectors:
+            self._stats[detector.name]["runs"] += 1
+            tasks[detector.name] = asyncio.create_task(self._timed_detect(detector, ctx))
+
+        claims = []
+        try:
+            for i, detector in enumerate(self._detectors):
+                stats = self._stats[detector.name]
+                try:
+                    result = await asyncio.wait_for(tasks[detector.name], timeout=max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    stats["timeouts"] += 1
+                    print(f"⏱️  Detector '{detector.name}' missed the {self.deadline}s deadline")
+                    continue
+                except Exception as e:
+                    stats["errors"] += 1
+                    print(f"❌ Detector '{detector.name}' failed: {e}")
+                    continue
+
+                if not result:
+                    continue
+                stats["claims"] += 1
+                claims.append((detector, result))
+                if detector.exclusive:
+                    # Higher-priority claim wins; lower detectors are no longer needed
+                    for lower in self._detectors[i + 1:]:
+                        if not tasks[lower.name].done():
+                            self._stats[lower.name]["cancelled"] += 1
+                    break
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+            # Let cancelled detectors unwind and retrieve their exceptions
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+        return claims
+
+    async def run(self, ctx: Dict[str, Any]) -> List[str]:
+        """Detect, then run each claimed handler in priority order. Returns names that handled the message."""
+        handled = []
+        for detector, result in await self.detect(ctx):
+            try:
+                if await detector.handle(ctx, result):
+                    handled.append(detector.name)
+            except Exception as e:
+                # One failing handler must not stop the others or the bot reply
+                self._stats[detector.name]["handle_errors"] += 1
+                print(f"❌ Detector '{detector.name}' handler failed: {e}")
+                session = ctx.get("session")
+                if session is not None:
+                    await session.rollback()
+        return handled
+
+    def get_stats(self) -> dict:
+        stats = {}
+        for name, s in self._stats.items():
+            stats[name] = {
+                "runs": s["runs"],
+                "claims": s["claims"],
+                "cancelled": s["cancelled"],
+                "timeouts": s["timeouts"],
+                "errors": s["errors"],
+                "handle_errors": s["handle_errors"],
+                "avg_ms": round(s["total_ms"] / s["runs"], 1) if s["runs"] else 0,
+            }
+        return {"deadline_s": self.deadline, "detectors": stats}
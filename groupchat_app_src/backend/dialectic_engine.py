@@ -12,50 +12,45 @@ This module implements:
 from typing import Dict, List, Optional
 from vector_db import search_documents
 from llm import chat_completion
+from message_features import extract_features
+
+# Response cache TTLs (seconds) for the deterministic prompts below
+CONFLICT_CHECK_CACHE_TTL = 600
+RELEVANCE_CACHE_TTL = 600
+KEYWORDS_CACHE_TTL = 600
+PAST_DECISION_CACHE_TTL = 300
 
 class ConflictDetector:
     """Detects conflicts between user statements and uploaded document evidence."""
     
     @staticmethod
-    async def check_for_conflicts(user_statement: str, session=None) -> Optional[Dict]:
-        """Check if user statement conflicts with uploaded documents."""
-        print(f"\n🔍 DIALECTIC ENGINE: Monitoring '{user_statement[:60]}...'")
-        
+    def should_check(user_statement: str) -> bool:
+        """Cheap pre-filter: only declarative, non-operational statements are checked."""
+        features = extract_features(user_statement)
         # Skip task/role assignments - these are operational, not strategic
-        task_keywords = ['assign', 'assigned', 'task for', 'give this to', 'can you do', 'responsible for']
-        if any(keyword in user_statement.lower() for keyword in task_keywords):
+        if features.has("operational"):
             print("  ⏭️  Skipped: Task assignment (operational, not strategic)")
-            return None
+            return False
         
         # Skip pure questions (not proposals)
         if user_statement.strip().endswith('?'):
-            rhetorical_indicators = ['i think', 'we should', 'let\'s', 'propose', 'suggest']
-            is_rhetorical = any(indicator in user_statement.lower() for indicator in rhetorical_indicators)
-            if not is_rhetorical:
+            if not features.has("rhetorical"):
                 print("  ⏭️  Skipped: Question (not a declarative statement)")
-                return None
-        
-        # Search past decisions first
-        past_decision = None
-        if session:
-            past_decision = await ConflictDetector._check_past_decisions(user_statement, session)
-            if past_decision:
-                print(f"  📋 Found past decision: {past_decision['decision_summary']}")
-                return past_decision
-        
+                return False
+        return True
+    
+    @staticmethod
+    def find_evidence(user_statement: str):
+        """Return (document, metadata) for the most relevant uploaded evidence, or (None, None)."""
         # Search for relevant documents with better query
         search_query = f"requirements specification {user_statement}"
         print(f"  🔎 Searching for conflicts...")
         search_results = search_documents(search_query, n_results=5)
         
         if not search_results['documents'] or not search_results['documents'][0]:
-            print("  ✅ No conflicts found (no relevant docs)")
-            return None
+            return None, None
         
         # Find the most relevant document (prefer requirements/project docs)
-        best_doc = None
-        best_metadata = None
-        
         for i, docs in enumerate(search_results['documents']):
             if docs:
                 metadata = search_results['metadatas'][i][0]
@@ -63,14 +58,42 @@ class ConflictDetector:
                 
                 # Prioritize project requirements documents
                 if any(keyword in filename for keyword in ['requirement', 'project', 'spec']):
-                    best_doc = docs[0]
-                    best_metadata = metadata
-                    break
+                    return docs[0], metadata
         
         # Fallback to first result if no requirements doc found
+        return search_results['documents'][0][0], search_results['metadatas'][0][0]
+    
+    @staticmethod
+    async def check_for_conflicts(user_statement: str, session=None, verdict=None) -> Optional[Dict]:
+        """Check if user statement conflicts with uploaded documents.
+        
+        A MessageVerdict from message_analyzer replaces the past-decision and conflict prompts.
+        """
+        print(f"\n🔍 DIALECTIC ENGINE: Monitoring '{user_statement[:60]}...'")
+        
+        if not ConflictDetector.should_check(user_statement):
+            return None
+        
+        # Search past decisions first
+        past_decision = None
+        if session:
+            past_decision = await ConflictDetector._check_past_decisions(user_statement, session, verdict)
+            if past_decision:
+                print(f"  📋 Found past decision: {past_decision['decision_summary']}")
+                return past_decision
+        
+        if verdict is not None and (verdict.has("conflict") or verdict.evidence):
+            best_doc, best_metadata = verdict.evidence, verdict.evidence_metadata
+        else:
+            best_doc, best_metadata = ConflictDetector.find_evidence(user_statement)
+        
         if not best_doc:
-            best_doc = search_results['documents'][0][0]
-            best_metadata = search_results['metadatas'][0][0]
+            print("  ✅ No conflicts found (no relevant docs)")
+            return None
+        
+        if verdict is not None and verdict.has("conflict"):
+            print("  🧾 Using combined message analysis")
+            return ConflictDetector._conflict_from_result(verdict.section("conflict"), user_statement, best_doc, best_metadata)
         
         # Use LLM to intelligently detect conflicts with enhanced context
         conflict_check_prompt = f"""You are a JSON-only conflict detector. Respond ONLY with valid JSON, no code, no explanations.
@@ -96,7 +119,7 @@ Respond with ONLY this JSON (no markdown, no code blocks):
 Your JSON:"""
         
         try:
-            response = await chat_completion([{"role": "user", "content": conflict_check_prompt}], temperature=0.0)
+            response = await chat_completion([{"role": "user", "content": conflict_check_prompt}], temperature=0.0, cache_ttl=CONFLICT_CHECK_CACHE_TTL)
             
             # Parse JSON response - extract JSON if wrapped in markdown
             import json
@@ -110,53 +133,51 @@ Your JSON:"""
                 json_str = response.strip()
             
             conflict_data = json.loads(json_str)
-            
-            print(f"  🤖 LLM: {conflict_data}")
-            if conflict_data.get("conflict"):
-                confidence = conflict_data.get("confidence", 50)
-                # Skip low-confidence conflicts (< 70%)
-                if confidence < 70:
-                    print(f"  ⚠️  Low confidence ({confidence}%), skipping")
-                    return None
-                
-                print(f"  🚨 CONFLICT DETECTED!")
-                print(f"     Severity: {conflict_data.get('severity', 'medium').upper()}")
-                print(f"     Category: {conflict_data.get('category', 'general').upper()}")
-                print(f"     Confidence: {confidence}%")
-                print(f"     Source: {best_metadata.get('filename', 'Unknown')}")
-                print(f"     Reason: {conflict_data.get('reason', 'Conflict detected')}")
-                return {
-                    "user_statement": user_statement,
-                    "conflicting_evidence": best_doc,
-                    "source_file": best_metadata.get('filename', 'Unknown'),
-                    "severity": conflict_data.get("severity", "medium"),
-                    "reason": conflict_data.get("reason", "Conflict detected"),
-                    "category": conflict_data.get("category", "general"),
-                    "confidence": confidence,
-                    "metadata": best_metadata
-                }
-            else:
-                print(f"  ✅ No conflict (Doc: {best_doc[:80]}...)")
+            return ConflictDetector._conflict_from_result(conflict_data, user_statement, best_doc, best_metadata)
         except Exception as e:
             print(f"  ❌ Error: {e}")
             print(f"     LLM response: {response if 'response' in locals() else 'N/A'}")
         
         return None
     
+    @staticmethod
+    def _conflict_from_result(conflict_data: Dict, user_statement: str, best_doc: str, best_metadata: Dict) -> Optional[Dict]:
+        """Turn the model's conflict JSON into conflict data, dropping low-confidence hits."""
+        print(f"  🤖 LLM: {conflict_data}")
+        if not conflict_data.get("conflict"):
+            print(f"  ✅ No conflict (Doc: {best_doc[:80]}...)")
+            return None
+        
+        confidence = conflict_data.get("confidence", 50)
+        # Skip low-confidence conflicts (< 70%)
+        if confidence < 70:
+            print(f"  ⚠️  Low confidence ({confidence}%), skipping")
+            return None
+        
+        print(f"  🚨 CONFLICT DETECTED!")
+        print(f"     Severity: {conflict_data.get('severity', 'medium').upper()}")
+        print(f"     Category: {conflict_data.get('category', 'general').upper()}")
+        print(f"     Confidence: {confidence}%")
+        print(f"     Source: {best_metadata.get('filename', 'Unknown')}")
+        print(f"     Reason: {conflict_data.get('reason', 'Conflict detected')}")
+        return {
+            "user_statement": user_statement,
+            "conflicting_evidence": best_doc,
+            "source_file": best_metadata.get('filename', 'Unknown'),
+            "severity": conflict_data.get("severity", "medium"),
+            "reason": conflict_data.get("reason", "Conflict detected"),
+            "category": conflict_data.get("category", "general"),
+            "confidence": confidence,
+            "metadata": best_metadata
+        }
+    
     @staticmethod
     async def _is_project_relevant(statement: str) -> bool:
         """Check if statement is project-related using smart LLM analysis."""
-        casual_keywords = [
-            'hello', 'hi', 'thanks', 'thank you', 'good morning', 'good afternoon',
-            'how are you', 'what\'s up', 'see you', 'bye', 'goodbye',
-            'weather', 'lunch', 'coffee', 'weekend', 'vacation'
-        ]
-        
         statement_lower = statement.lower()
         
         # Skip if clearly casual conversation
-        import re
-        if any(re.search(r'\b' + re.escape(casual) + r'\b', statement_lower) for casual in casual_keywords):
+        if extract_features(statement).has("casual"):
             return False
         
         # Skip very short messages
@@ -177,7 +198,7 @@ A statement is project-relevant if it:
 Respond with only: YES or NO"""
         
         try:
-            response = await chat_completion([{"role": "user", "content": relevance_prompt}], temperature=0.1)
+            response = await chat_completion([{"role": "user", "content": relevance_prompt}], temperature=0.1, cache_ttl=RELEVANCE_CACHE_TTL)
             return "yes" in response.lower()
         except:
             # Fallback to simple keyword check
@@ -210,7 +231,7 @@ Document content: {doc_content[:2000]}
 
 Return ONLY a comma-separated list of lowercase keywords, no explanations:"""
                 
-                response = await chat_completion([{"role": "user", "content": keyword_prompt}], temperature=0.1)
+                response = await chat_completion([{"role": "user", "content": keyword_prompt}], temperature=0.1, cache_ttl=KEYWORDS_CACHE_TTL)
                 
                 # Parse extracted keywords - handle LLM responses that include explanatory text
                 if ':' in response:
@@ -228,8 +249,8 @@ Return ONLY a comma-separated list of lowercase keywords, no explanations:"""
         return ['should', 'must', 'requirement', 'specification', 'technology', 'framework']
     
     @staticmethod
-    async def _check_past_decisions(user_statement: str, session) -> Optional[Dict]:
-        """Check if user statement relates to a previously resolved conflict."""
+    async def recent_decision_context(session) -> Optional[str]:
+        """Format the most recent decisions as prompt context, or None if there are none."""
         from db import Decision, User
         from sqlalchemy import select, desc
         
@@ -245,11 +266,20 @@ Return ONLY a comma-separated list of lowercase keywords, no explanations:"""
         if not decisions:
             return None
         
-        # Build decision context for LLM
-        decision_context = "\n".join([
+        return "\n".join([
             f"- {d.Decision.created_at.strftime('%Y-%m-%d')}: Option {d.Decision.selected_option.value} - {d.Decision.reasoning[:100]}"
             for d in decisions[:10]
         ])
+    
+    @staticmethod
+    async def _check_past_decisions(user_statement: str, session, verdict=None) -> Optional[Dict]:
+        """Check if user statement relates to a previously resolved conflict."""
+        if verdict is not None and verdict.has("past_decision"):
+            return ConflictDetector._past_decision_from_result(verdict.section("past_decision"))
+        
+        decision_context = await ConflictDetector.recent_decision_context(session)
+        if not decision_context:
+            return None
         
         # Check if statement conflicts with past decision
         check_prompt = f"""Does this user statement contradict or revisit a previously resolved decision?
@@ -268,22 +298,26 @@ If no conflict with past decisions, respond:
 Your JSON:"""
         
         try:
-            response = await chat_completion([{"role": "user", "content": check_prompt}], temperature=0.0)
+            response = await chat_completion([{"role": "user", "content": check_prompt}], temperature=0.0, cache_ttl=PAST_DECISION_CACHE_TTL)
             import json, re
             json_match = re.search(r'\{[^}]+\}', response)
             if json_match:
-                result = json.loads(json_match.group(0))
-                if result.get("revisits_decision"):
-                    return {
-                        "is_past_decision_reference": True,
-                        "decision_date": result.get("decision_date"),
-                        "original_choice": result.get("original_choice"),
-                        "decision_summary": result.get("summary", "Previous decision found")
-                    }
+                return ConflictDetector._past_decision_from_result(json.loads(json_match.group(0)))
         except Exception as e:
             print(f"  ⚠️  Past decision check failed: {e}")
         
         return None
+    
+    @staticmethod
+    def _past_decision_from_result(result: Dict) -> Optional[Dict]:
+        if result.get("revisits_decision"):
+            return {
+                "is_past_decision_reference": True,
+                "decision_date": result.get("decision_date"),
+                "original_choice": result.get("original_choice"),
+                "decision_summary": result.get("summary", "Previous decision found")
+            }
+        return None
 
 class SocraticInterventionGenerator:
     """Generates Socratic intervention messages with decision forks."""
@@ -406,7 +440,7 @@ async def get_voting_status_message(conflict_id: str, session) -> str:
 • Chat: `@bot decision {conflict_id} A [your reasoning]`
 • Sidebar: Click A/B/C buttons in Active Votes"""
 
-async def monitor_message_for_conflicts(message_content: str, message_id: int, session, group_id: int = None) -> Optional[Dict]:
+async def monitor_message_for_conflicts(message_content: str, message_id: int, session, group_id: int = None, verdict=None) -> Optional[Dict]:
     """
     Silent observer: Check message for conflicts without responding unless conflict found.
     Returns conflict data if intervention needed.
@@ -420,7 +454,7 @@ async def monitor_message_for_conflicts(message_content: str, message_id: int, s
     clean_content = message_content.replace("@bot", "").strip()
     
     # Check for conflicts (pass session for decision history lookup)
-    conflict = await ConflictDetector.check_for_conflicts(clean_content, session)
+    conflict = await ConflictDetector.check_for_conflicts(clean_content, session, verdict)
     
     if conflict:
         # If this is a past decision reference, don't create new conflict
@@ -1,23 +1,31 @@
 import PyPDF2
 from docx import Document
 import io
-from typing import List
+from typing import List, Union
 
-def extract_text_from_pdf(file_content: bytes) -> str:
+def _open_source(source: Union[bytes, str]):
+    """Raw bytes or a path to a file on disk (e.g. a spooled upload)."""
+    return io.BytesIO(source) if isinstance(source, bytes) else source
+
+def extract_text_from_pdf(file_content: Union[bytes, str]) -> str:
     """Extract text from PDF file"""
-    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() + "\n"
-    return text
+    pdf_reader = PyPDF2.PdfReader(_open_source(file_content))
+    return "".join((page.extract_text() or "") + "\n" for page in pdf_reader.pages)
 
-def extract_text_from_docx(file_content: bytes) -> str:
+def extract_text_from_docx(file_content: Union[bytes, str]) -> str:
     """Extract text from DOCX file"""
-    doc = Document(io.BytesIO(file_content))
-    text = ""
-    for paragraph in doc.paragraphs:
-        text += paragraph.text + "\n"
-    return text
+    doc = Document(_open_source(file_content))
+    return "".join(paragraph.text + "\n" for paragraph in doc.paragraphs)
+
+def extract_text_from_file(path: str, filename: str) -> str:
+    """Extract text from a file on disk, by the extension of its original name (PDF, DOCX, else UTF-8 text)"""
+    name = filename.lower()
+    if name.endswith('.pdf'):
+        return extract_text_from_pdf(path)
+    if name.endswith('.docx'):
+        return extract_text_from_docx(path)
+    with open(path, encoding='utf-8') as f:
+        return f.read()
 
 def chunk_text(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
     """Split text into overlapping chunks"""
@@ -1,6 +1,12 @@
 import os
+import json
+import asyncio
+import time
 import httpx
+from typing import Optional, AsyncIterator, Dict, Tuple
 from dotenv import load_dotenv
+from llm_cache import llm_cache, make_cache_key, LLM_CACHE_ENABLED
+from llm_scheduler import llm_scheduler, PRIORITY_INTERACTIVE
 
 load_dotenv()
 
@@ -8,14 +14,197 @@ LLM_API_BASE = os.getenv("LLM_API_BASE", "http://localhost:8001/v1")
 LLM_MODEL = os.getenv("LLM_MODEL", "llama-3-8b-instruct")
 LLM_API_KEY = os.getenv("LLM_API_KEY", "").strip()
 
-async def chat_completion(messages, temperature: float = 0.2, max_tokens: int = 512) -> str:
+# Connection pool settings for the shared client
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "120"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+LLM_MAX_KEEPALIVE = int(os.getenv("LLM_MAX_KEEPALIVE", "16"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30"))
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "false").lower() in ("1", "true", "yes")
+# Share one upstream call between concurrent identical requests
+LLM_COALESCE = os.getenv("LLM_COALESCE", "true").lower() in ("1", "true", "yes")
+
+# Shared client, owned by the app startup/shutdown hooks
+_client: Optional[httpx.AsyncClient] = None
+_http2_enabled = False
+
+# Pool usage counters (exposed via get_llm_stats)
+_stats = {
+    "requests": 0,
+    "errors": 0,
+    "in_flight": 0,
+    "peak_in_flight": 0,
+    "saturated_requests": 0,
+    "total_latency_ms": 0.0,
+}
+
+# Identical requests currently waiting on the backend: (cache key, priority, timeout) -> future.
+# Priority and timeout are part of the key so an interactive caller never joins a request
+# queued in the background class or bound by another caller's timeout.
+_inflight: Dict[Tuple[str, str, Optional[float]], asyncio.Future] = {}
+_coalesce_stats = {"upstream_calls": 0, "coalesced": 0}
+
+# Time-to-first-token for streamed completions
+_ttft = {
+    "count": 0,
+    "total_ms": 0.0,
+    "max_ms": 0.0,
+    "last_ms": None,
+}
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+def _build_client() -> httpx.AsyncClient:
+    global _http2_enabled
+    http2 = LLM_HTTP2
+    if http2 and not _http2_available():
+        print("⚠️  LLM_HTTP2 is enabled but the 'h2' package is not installed - falling back to HTTP/1.1")
+        http2 = False
+    _http2_enabled = http2
+    limits = httpx.Limits(
+        max_connections=LLM_MAX_CONNECTIONS,
+        max_keepalive_connections=LLM_MAX_KEEPALIVE,
+        keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(timeout=LLM_TIMEOUT, limits=limits, http2=http2)
+
+async def init_http_client():
+    """Create the shared LLM HTTP client (called on app startup)."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+        print(f"✅ LLM client ready (max_connections={LLM_MAX_CONNECTIONS}, keepalive={LLM_MAX_KEEPALIVE}, http2={_http2_enabled})")
+
+async def close_http_client():
+    """Close the shared LLM HTTP client (called on app shutdown)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily for scripts that skip app startup."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = _build_client()
+    return _client
+
+def get_llm_stats() -> dict:
+    """Snapshot of LLM connection pool usage."""
+    requests = _stats["requests"]
+    return {
+        "pool": {
+            "max_connections": LLM_MAX_CONNECTIONS,
+            "max_keepalive_connections": LLM_MAX_KEEPALIVE,
+            "http2": _http2_enabled,
+            "in_flight": _stats["in_flight"],
+            "peak_in_flight": _stats["peak_in_flight"],
+            "saturation": round(_stats["in_flight"] / LLM_MAX_CONNECTIONS, 3) if LLM_MAX_CONNECTIONS else 0,
+            "saturated_requests": _stats["saturated_requests"],
+        },
+        "requests": requests,
+        "errors": _stats["errors"],
+        "avg_latency_ms": round(_stats["total_latency_ms"] / requests, 1) if requests else 0,
+        "streaming": {
+            "streams": _ttft["count"],
+            "avg_ttft_ms": round(_ttft["total_ms"] / _ttft["count"], 1) if _ttft["count"] else 0,
+            "max_ttft_ms": round(_ttft["max_ms"], 1),
+            "last_ttft_ms": round(_ttft["last_ms"], 1) if _ttft["last_ms"] is not None else None,
+        },
+        "cache": llm_cache.get_stats(),
+        "scheduler": llm_scheduler.get_stats(),
+        "single_flight": {
+            **_coalesce_stats,
+            "enabled": LLM_COALESCE,
+            "in_flight_keys": len(_inflight),
+        },
+    }
+
+def _headers() -> dict:
+    headers = {"Content-Type": "application/json"}
+    if LLM_API_KEY:
+        headers["Authorization"] = f"Bearer {LLM_API_KEY}"
+    return headers
+
+def _request_started() -> float:
+    _stats["requests"] += 1
+    _stats["in_flight"] += 1
+    _stats["peak_in_flight"] = max(_stats["peak_in_flight"], _stats["in_flight"])
+    if _stats["in_flight"] > LLM_MAX_CONNECTIONS:
+        # Request has to wait for a free pooled connection
+        _stats["saturated_requests"] += 1
+    return time.perf_counter()
+
+def _request_finished(started: float):
+    _stats["in_flight"] -= 1
+    _stats["total_latency_ms"] += (time.perf_counter() - started) * 1000
+
+def _record_ttft(ms: float):
+    _ttft["count"] += 1
+    _ttft["total_ms"] += ms
+    _ttft["max_ms"] = max(_ttft["max_ms"], ms)
+    _ttft["last_ms"] = ms
+
+async def chat_completion(messages, temperature: float = 0.2, max_tokens: int = 512, cache_ttl: Optional[float] = None, coalesce: bool = True, priority: str = PRIORITY_INTERACTIVE, timeout: Optional[float] = None) -> str:
     """
     Calls an OpenAI-compatible /v1/chat/completions endpoint (e.g., llama.cpp or vLLM).
+
+    Pass cache_ttl (seconds) for deterministic prompts to reuse identical responses.
+    Concurrent identical requests share one upstream call unless coalesce is False.
+    Use priority=PRIORITY_BACKGROUND for work no user is waiting on.
+    timeout (seconds) limits the upstream request only, not the wait for a scheduler slot;
+    it raises asyncio.TimeoutError.
     """
+    use_cache = bool(cache_ttl) and LLM_CACHE_ENABLED
+    use_single_flight = coalesce and LLM_COALESCE
+    key = make_cache_key(LLM_MODEL, messages, temperature, max_tokens) if (use_cache or use_single_flight) else None
+
+    if use_cache:
+        cached = llm_cache.get(key)
+        if cached is not None:
+            return cached
+
+    if use_single_flight:
+        content = await _single_flight(key, messages, temperature, max_tokens, priority, timeout)
+    else:
+        content = await _scheduled_chat_completion(messages, temperature, max_tokens, priority, timeout)
+
+    if use_cache:
+        llm_cache.set(key, content, cache_ttl)
+    return content
+
+def _forget_inflight(key: Tuple[str, str, Optional[float]], future: asyncio.Future):
+    if _inflight.get(key) is future:
+        del _inflight[key]
+    # Mark the error as retrieved in case every waiter was cancelled
+    if not future.cancelled():
+        future.exception()
+
+async def _single_flight(key: str, messages, temperature: float, max_tokens: int, priority: str, timeout: Optional[float] = None) -> str:
+    """Join an identical in-flight request, or start one that later callers can join."""
+    flight = (key, priority, timeout)
+    future = _inflight.get(flight)
+    if future is None:
+        future = asyncio.ensure_future(_scheduled_chat_completion(messages, temperature, max_tokens, priority, timeout))
+        _inflight[flight] = future
+        future.add_done_callback(lambda f: _forget_inflight(flight, f))
+        _coalesce_stats["upstream_calls"] += 1
+    else:
+        _coalesce_stats["coalesced"] += 1
+    # Shield so one cancelled caller does not cancel the call for everyone else
+    return await asyncio.shield(future)
+
+async def _scheduled_chat_completion(messages, temperature: float, max_tokens: int, priority: str, timeout: Optional[float] = None) -> str:
+    """Wait for a scheduler slot in the given priority class, then call the backend."""
+    async with llm_scheduler.slot(priority):
+        return await _post_chat_completion(messages, temperature, max_tokens, timeout)
+
+async def _post_chat_completion(messages, temperature: float, max_tokens: int, timeout: Optional[float] = None) -> str:
     url = f"{LLM_API_BASE}/chat/completions"
-    headers = {"Content-Type": "application/json"}
-    if LLM_API_KEY:
-        headers["Authorization"] = f"Bearer {LLM_API_KEY}"
     payload = {
         "model": LLM_MODEL,
         "messages": messages,
@@ -23,9 +212,59 @@ async def chat_completion(messages, temperature: float = 0.2, max_tokens: int =
         "max_tokens": max_tokens,
         "stream": False
     }
-    async with httpx.AsyncClient(timeout=120.0) as client:
-        r = await client.post(url, headers=headers, json=payload)
+    client = get_http_client()
+    started = _request_started()
+    try:
+        r = await asyncio.wait_for(client.post(url, headers=_headers(), json=payload), timeout=timeout)
         r.raise_for_status()
         data = r.json()
         # OpenAI-like response shape
         return data["choices"][0]["message"]["content"]
+    except Exception:
+        _stats["errors"] += 1
+        raise
+    finally:
+        _request_finished(started)
+
+async def chat_completion_stream(messages, temperature: float = 0.2, max_tokens: int = 512, priority: str = PRIORITY_INTERACTIVE) -> AsyncIterator[str]:
+    """
+    Streams completion tokens from an OpenAI-compatible endpoint as they arrive (server-sent events).
+    The scheduler slot is held until the stream finishes.
+    """
+    url = f"{LLM_API_BASE}/chat/completions"
+    payload = {
+        "model": LLM_MODEL,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+        "stream": True
+    }
+    client = get_http_client()
+    async with llm_scheduler.slot(priority):
+        started = _request_started()
+        first_token = True
+        try:
+            async with client.stream("POST", url, headers=_headers(), json=payload) as r:
+                r.raise_for_status()
+                async for line in r.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = json.loads(data)
+                    choices = chunk.get("choices") or []
+                    if not choices:
+                        continue
+                    token = (choices[0].get("delta") or {}).get("content")
+                    if not token:
+                        continue
+                    if first_token:
+                        first_token = False
+                        _record_ttft((time.perf_counter() - started) * 1000)
+                    yield token
+        except Exception:
+            _stats["errors"] += 1
+            raise
+        finally:
+            _request_finished(started)
@@ -0,0 +1,110 @@
+"""Content-addressed cache for deterministic LLM responses."""
+
+import os
+import json
+import time
+import hashlib
+from collections import OrderedDict
+from typing import Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024"))
+# Optional on-disk tier; leave empty to keep the cache in memory only
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "").strip()
+
+def make_cache_key(model: str, messages, temperature: float, max_tokens: int) -> str:
+    """Hash the model, messages and sampling params into a stable key."""
+    raw = json.dumps(
+        {"model": model, "messages": messages, "temperature": temperature, "max_tokens": max_tokens},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class LLMResponseCache:
+    """In-memory LRU with per-entry TTL, backed by an optional directory of JSON files."""
+
+    def __init__(self, max_entries: int = 1024, disk_dir: Optional[str] = None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir or None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "expired": 0}
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry:
+            value, expires_at = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return value
+            del self._entries[key]
+            self.stats["expired"] += 1
+
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    stored = json.load(f)
+                if stored["expires_at"] > now:
+                    self._remember(key, stored["value"], stored["expires_at"])
+                    self.stats["disk_hits"] += 1
+                    return stored["value"]
+                os.remove(path)
+                self.stats["expired"] += 1
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                print(f"⚠️  LLM cache read failed for {key[:12]}: {e}")
+
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, key: str, value: str, ttl: float):
+        expires_at = time.time() + ttl
+        self._remember(key, value, expires_at)
+        self.stats["stores"] += 1
+        if self.disk_dir:
+            path = self._disk_path(key)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"value": value, "expires_at": expires_at}, f)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"⚠️  LLM cache write failed for {key[:12]}: {e}")
+
+    def clear(self):
+        self._entries.clear()
+
+    def get_stats(self) -> dict:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        lookups = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "enabled": LLM_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "disk_tier": bool(self.disk_dir),
+            "hit_rate": round(hits / lookups, 3) if lookups else 0,
+        }
+
+# Global cache instance
+llm_cache = LLMResponseCache(max_entries=LLM_CACHE_MAX_ENTRIES, disk_dir=LLM_CACHE_DIR)
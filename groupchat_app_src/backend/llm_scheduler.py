@@ -0,0 +1,149 @@
+"""Priority-aware admission control for LLM requests.
+
+Interactive work (bot answers, tone adjustment) is always dispatched before
+background work (document summaries, vote outcomes, chat compaction), and
+background work is capped so it can never take every backend slot.
+"""
+
+import os
+import time
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+# Highest priority first
+PRIORITY_CLASSES = (PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND)
+
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_INTERACTIVE_CONCURRENCY = int(os.getenv("LLM_INTERACTIVE_CONCURRENCY", str(LLM_MAX_CONCURRENCY)))
+LLM_BACKGROUND_CONCURRENCY = int(os.getenv("LLM_BACKGROUND_CONCURRENCY", "4"))
+LLM_INTERACTIVE_QUEUE = int(os.getenv("LLM_INTERACTIVE_QUEUE", "256"))
+LLM_BACKGROUND_QUEUE = int(os.getenv("LLM_BACKGROUND_QUEUE", "64"))
+LLM_INTERACTIVE_QUEUE_TIMEOUT = float(os.getenv("LLM_INTERACTIVE_QUEUE_TIMEOUT", "30"))
+LLM_BACKGROUND_QUEUE_TIMEOUT = float(os.getenv("LLM_BACKGROUND_QUEUE_TIMEOUT", "300"))
+
+class SchedulerFull(Exception):
+    """Raised when a priority class already has its maximum number of queued requests."""
+
+class LLMScheduler:
+    """Grants LLM request slots by priority class with per-class caps and bounded queues."""
+
+    def __init__(self, max_concurrency: int, class_limits: Dict[str, int], queue_limits: Dict[str, int], queue_timeouts: Dict[str, float]):
+        self.max_concurrency = max_concurrency
+        self.class_limits = class_limits
+        self.queue_limits = queue_limits
+        self.queue_timeouts = queue_timeouts
+        self._active = {cls: 0 for cls in PRIORITY_CLASSES}
+        self._waiting = {cls: deque() for cls in PRIORITY_CLASSES}
+        self._total_active = 0
+        self._stats = {
+            cls: {"granted": 0, "rejected": 0, "timeouts": 0, "peak_queue_depth": 0, "total_wait_ms": 0.0}
+            for cls in PRIORITY_CLASSES
+        }
+
+    def _can_start(self, priority: str) -> bool:
+        return self._total_active < self.max_concurrency and self._active[priority] < self.class_limits[priority]
+
+    def _grant(self, priority: str):
+        self._active[priority] += 1
+        self._total_active += 1
+        self._stats[priority]["granted"] += 1
+
+    def _dispatch(self):
+        """Hand free slots to queued requests, highest priority class first."""
+        for priority in PRIORITY_CLASSES:
+            waiting = self._waiting[priority]
+            while waiting and self._can_start(priority):
+                future = waiting.popleft()
+                if future.done():
+                    continue
+                self._grant(priority)
+                future.set_result(True)
+
+    async def acquire(self, priority: str):
+        if priority not in self._waiting:
+            raise ValueError(f"Unknown LLM priority class: {priority}")
+        waiting = self._waiting[priority]
+        if not waiting and self._can_start(priority):
+            self._grant(priority)
+            return
+        if len(waiting) >= self.queue_limits[priority]:
+            self._stats[priority]["rejected"] += 1
+            raise SchedulerFull(f"LLM {priority} queue is full ({len(waiting)} waiting)")
+
+        future = asyncio.get_running_loop().create_future()
+        waiting.append(future)
+        stats = self._stats[priority]
+        stats["peak_queue_depth"] = max(stats["peak_queue_depth"], len(waiting))
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout=self.queue_timeouts[priority])
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                # Slot was granted just as we gave up - hand it back
+                self.release(priority)
+            else:
+                future.cancel()
+                try:
+                    waiting.remove(future)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                stats["timeouts"] += 1
+            raise
+        finally:
+            stats["total_wait_ms"] += (time.perf_counter() - started) * 1000
+
+    def release(self, priority: str):
+        self._active[priority] -= 1
+        self._total_active -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, priority: str = PRIORITY_INTERACTIVE):
+        await self.acquire(priority)
+        try:
+            yield
+        finally:
+            self.release(priority)
+
+    def get_stats(self) -> dict:
+        classes = {}
+        for priority in PRIORITY_CLASSES:
+            stats = self._stats[priority]
+            granted = stats["granted"]
+            classes[priority] = {
+                "active": self._active[priority],
+                "queue_depth": len(self._waiting[priority]),
+                "concurrency_limit": self.class_limits[priority],
+                "queue_limit": self.queue_limits[priority],
+                "granted": granted,
+                "rejected": stats["rejected"],
+                "timeouts": stats["timeouts"],
+                "peak_queue_depth": stats["peak_queue_depth"],
+                "avg_wait_ms": round(stats["total_wait_ms"] / granted, 1) if granted else 0,
+            }
+        return {"max_concurrency": self.max_concurrency, "active": self._total_active, "classes": classes}
+
+# Global scheduler instance
+llm_scheduler = LLMScheduler(
+    max_concurrency=LLM_MAX_CONCURRENCY,
+    class_limits={
+        PRIORITY_INTERACTIVE: LLM_INTERACTIVE_CONCURRENCY,
+        PRIORITY_BACKGROUND: LLM_BACKGROUND_CONCURRENCY,
+    },
+    queue_limits={
+        PRIORITY_INTERACTIVE: LLM_INTERACTIVE_QUEUE,
+        PRIORITY_BACKGROUND: LLM_BACKGROUND_QUEUE,
+    },
+    queue_timeouts={
+        PRIORITY_INTERACTIVE: LLM_INTERACTIVE_QUEUE_TIMEOUT,
+        PRIORITY_BACKGROUND: LLM_BACKGROUND_QUEUE_TIMEOUT,
+    },
+)
@@ -4,7 +4,7 @@ import json
 import re
 from datetime import datetime
 
-async def detect_meeting_request(message: str) -> dict:
+async def detect_meeting_request(message: str, verdict=None) -> dict:
     """Detect if message is a meeting request and extract details including attendees."""
     # Extract Zoom link first using regex
     import re
@@ -13,6 +13,10 @@ async def detect_meeting_request(message: str) -> dict:
     if zoom_match:
         zoom_link = zoom_match.group(0)
     
+    if verdict is not None and verdict.has("meeting"):
+        print(f"Meeting detection result (combined analysis): {verdict.section('meeting')}")
+        return _meeting_data_from_result(verdict.section("meeting"), zoom_link)
+    
     prompt = f"""Analyze if this is a CLEAR meeting scheduling request (not just mentioning meetings).
 
 Message: "{message}"
@@ -58,37 +62,41 @@ JSON:"""
         print(f"Cleaned JSON: '{response}'")
         result = json.loads(response)
         print(f"Meeting detection result: {result}")
-        if result.get("is_meeting") and result.get("is_meeting") is not False:
-            # Only set datetime if date is provided
-            datetime_str = None
-            if result.get("date") and result.get("date") != "null":
-                time_str = result.get("time") or "14:00"
-                datetime_str = f"{result['date']}T{time_str}"
-            
-            # Filter out 'bot' from attendees
-            attendees = result.get("attendees")
-            if attendees:
-                exclude = {'bot', '@bot'}
-                attendees_list = [a.strip() for a in attendees.split(',') if a.strip() not in exclude]
-                attendees = ','.join(attendees_list) if attendees_list else None
-            
-            meeting_data = {
-                "title": result.get("title", "Team Meeting"),
-                "datetime": datetime_str,
-                "duration": result.get("duration"),
-                "attendees": attendees,
-                "zoom_link": zoom_link,
-                "suggested_times": result.get("suggested_times", "")
-            }
-            print(f"Returning meeting data: {meeting_data}")
-            return meeting_data
-        return None
+        return _meeting_data_from_result(result, zoom_link)
     except Exception as e:
         print(f"Meeting detection error: {e}")
         import traceback
         traceback.print_exc()
         return None
 
+def _meeting_data_from_result(result: dict, zoom_link: str = None) -> dict:
+    """Build meeting data from the model's meeting JSON, or None if it is not a meeting request."""
+    if result.get("is_meeting") and result.get("is_meeting") is not False:
+        # Only set datetime if date is provided
+        datetime_str = None
+        if result.get("date") and result.get("date") != "null":
+            time_str = result.get("time") or "14:00"
+            datetime_str = f"{result['date']}T{time_str}"
+        
+        # Filter out 'bot' from attendees
+        attendees = result.get("attendees")
+        if attendees:
+            exclude = {'bot', '@bot'}
+            attendees_list = [a.strip() for a in attendees.split(',') if a.strip() not in exclude]
+            attendees = ','.join(attendees_list) if attendees_list else None
+        
+        meeting_data = {
+            "title": result.get("title", "Team Meeting"),
+            "datetime": datetime_str,
+            "duration": result.get("duration"),
+            "attendees": attendees,
+            "zoom_link": zoom_link,
+            "suggested_times": result.get("suggested_times", "")
+        }
+        print(f"Returning meeting data: {meeting_data}")
+        return meeting_data
+    return None
+
 def generate_zoom_link() -> str:
     """Generate a mock Zoom link (in production, use Zoom API)."""
     meeting_id = ''.join([str(uuid.uuid4().int)[:9]])
@@ -0,0 +1,170 @@
+"""One-shot message analysis: a single LLM call that covers every per-message detector.
+
+post_message used to run the conflict, past-decision, task-assignment, task-action,
+meeting and intent prompts one after another. analyze_message asks for all of the
+sections a message actually needs in one structured verdict, and each handler reads
+its section from the verdict (falling back to its own prompt when there is none).
+"""
+
+import os
+import json
+from datetime import datetime
+from typing import Dict, Optional
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from llm import chat_completion
+from db import Task, TaskStatus
+from dialectic_engine import ConflictDetector
+
+load_dotenv()
+
+MESSAGE_ANALYZER_ENABLED = os.getenv("MESSAGE_ANALYZER_ENABLED", "true").lower() in ("1", "true", "yes")
+MESSAGE_ANALYSIS_CACHE_TTL = 60
+
+# Analyzer usage counters (exposed via the LLM debug endpoint)
+_stats = {"analyses": 0, "skipped": 0, "failures": 0, "sections_requested": 0}
+
+class MessageVerdict:
+    """Per-section results of one combined analysis; missing sections mean 'ask the handler'."""
+
+    def __init__(self, sections: Dict, evidence: Optional[str] = None, evidence_metadata: Optional[Dict] = None):
+        self.sections = sections
+        self.evidence = evidence
+        self.evidence_metadata = evidence_metadata
+
+    def has(self, name: str) -> bool:
+        return self.sections.get(name) is not None
+
+    def section(self, name: str):
+        return self.sections.get(name)
+
+# Prompt fragments, one per section
+_SECTION_PROMPTS = {
+    "conflict": """"conflict": does the message propose a different tech/time/amount/approach than the DOCUMENT?
+  {{"conflict": true/false, "severity": "low|medium|high", "reason": "Streamlit vs React", "category": "technical|timeline|budget|methodology|scope", "confidence": 0-100}}
+  ("use Vue" vs "use React" = conflict, "use React hooks" vs "use React" = no conflict)""",
+    "past_decision": """"past_decision": does the message contradict or revisit one of the PAST DECISIONS?
+  {{"revisits_decision": true/false, "decision_date": "YYYY-MM-DD", "original_choice": "A/B/C", "summary": "brief summary"}}""",
+    "task_assignment": """"task_assignment": is this a request for someone to do work? True for "Can anyone...", "Who can...", "We need to...", "Please...", asking for volunteers. False for information questions, status checks, or plain statements.
+  {{"is_assignment": true/false, "task": "the work to do", "assignee": null}}""",
+    "task_action": """"task_action": does the user say one of the PENDING TASKS is done (complete) or should be removed (delete)? Match tasks by keywords, partial matches allowed.
+  {{"action": "complete|delete|none", "task_id": number}}""",
+    "meeting": """"meeting": is the user actively trying to SCHEDULE a meeting (not just mentioning one)? Dates as YYYY-MM-DD (today is {today}), times as 24-hour HH:MM, duration in minutes, attendees as exact usernames without "bot".
+  {{"is_meeting": true/false, "title": "meeting topic or Team Meeting", "date": "YYYY-MM-DD", "time": "HH:MM", "duration": 60, "attendees": "username1,username2"}}""",
+    "milestone_change": """"milestone_change": true/false - does the user want to change, add, remove or move project milestones/phases?""",
+    "intent": """"intent": one of VOTE (start a team vote/poll), MILESTONE (help creating project milestones/phases/timeline), TASK (create/add tasks), MEETING (schedule a meeting), STATUS (project status/progress), NORMAL (regular question or conversation)
+"vote_question": if intent is VOTE, the topic as a clear yes/no question, otherwise an empty string""",
+}
+
+def get_analyzer_stats() -> dict:
+    return {**_stats, "enabled": MESSAGE_ANALYZER_ENABLED}
+
+async def analyze_message(
+    session,
+    content: str,
+    check_conflicts: bool = False,
+    check_task_assignment: bool = False,
+    check_task_action: bool = False,
+    check_meeting: bool = False,
+    check_milestone: bool = False,
+    check_intent: bool = False,
+) -> Optional[MessageVerdict]:
+    """Run one combined analysis for the detectors enabled by the caller's gates.
+
+    Returns None when the analyzer is disabled or the call fails. When fewer than two
+    sections need the model (a single detector is just as cheap with its own prompt),
+    only the sections settled without the model are returned.
+    """
+    if not MESSAGE_ANALYZER_ENABLED:
+        return None
+
+    sections: Dict = {}
+    requested = []
+    context = ""
+    evidence, evidence_metadata = None, None
+    statement = content.replace("@bot", "").strip()
+
+    if check_conflicts and ConflictDetector.should_check(statement):
+        decision_context = await ConflictDetector.recent_decision_context(session)
+        if decision_context:
+            requested.append("past_decision")
+            context += f"PAST DECISIONS:\n{decision_context}\n\n"
+        else:
+            sections["past_decision"] = {"revisits_decision": False}
+        evidence, evidence_metadata = ConflictDetector.find_evidence(statement)
+        if evidence:
+            requested.append("conflict")
+            context += f"DOCUMENT:\n\"{evidence}\"\n\n"
+        else:
+            sections["conflict"] = {"conflict": False}
+
+    if check_task_assignment:
+        requested.append("task_assignment")
+
+    if check_task_action:
+        tasks_res = await session.execute(select(Task).where(Task.status == TaskStatus.pending))
+        tasks = tasks_res.scalars().all()
+        if tasks:
+            requested.append("task_action")
+            task_list = "\n".join([f"{t.id}. {t.content}" for t in tasks])
+            context += f"PENDING TASKS:\n{task_list}\n\n"
+        else:
+            sections["task_action"] = {"action": "none"}
+
+    if check_meeting:
+        requested.append("meeting")
+    if check_milestone:
+        requested.append("milestone_change")
+    if check_intent:
+        requested.append("intent")
+
+    if len(requested) < 2:
+        _stats["skipped"] += 1
+        return MessageVerdict(sections, evidence, evidence_metadata)
+
+    today = datetime.now().strftime("%Y-%m-%d")
+    section_text = "\n".join(f"- {_SECTION_PROMPTS[name].format(today=today)}" for name in requested)
+    prompt = f"""You analyze one group chat message for several assistants at once. Respond with ONLY one JSON object, no markdown, no explanations.
+
+{context}MESSAGE:
+"{content}"
+
+Return a JSON object with exactly these keys:
+{section_text}
+
+Your JSON:"""
+
+    _stats["analyses"] += 1
+    _stats["sections_requested"] += len(requested)
+    try:
+        response = await chat_completion(
+            [{"role": "user", "content": prompt}],
+            temperature=0.0,
+            max_tokens=700,
+            cache_ttl=MESSAGE_ANALYSIS_CACHE_TTL,
+        )
+        json_start = response.find('{')
+        json_end = response.rfind('}') + 1
+        if json_start == -1 or json_end <= json_start:
+            raise ValueError("no JSON object in response")
+        result = json.loads(response[json_start:json_end])
+    except Exception as e:
+        _stats["failures"] += 1
+        print(f"⚠️  Message analysis failed, falling back to per-detector prompts: {e}")
+        return None
+
+    for name in requested:
+        value = result.get(name)
+        if name == "intent":
+            if isinstance(value, str) and value.strip():
+                sections["intent"] = value.strip().upper()
+                sections["vote_question"] = (result.get("vote_question") or "").strip() or None
+        elif name == "milestone_change":
+            if isinstance(value, bool):
+                sections[name] = value
+        elif isinstance(value, dict):
+            sections[name] = value
+
+    print(f"🧾 Message analysis ({len(requested)} sections in one call): {result}")
+    return MessageVerdict(sections, evidence, evidence_metadata)
@@ -0,0 +1,188 @@
+"""Single-pass routing features that decide which detectors need the LLM.
+
+All keyword groups are compiled into one lookahead regex, so a message is scanned once no
+matter how many groups there are. Because alternatives starting at the same position only
+report the longest match, each match also counts every shorter keyword it contains
+(e.g. "meeting" also counts "meet"). Word-level groups (greetings and small talk) are
+matched against the message's word n-grams instead of raw substrings.
+
+Messages that hit no routing keywords can additionally be checked with a nearest-centroid
+chit-chat classifier on the MiniLM embeddings already used for document search.
+"""
+
+import os
+import re
+import asyncio
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Set
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MESSAGE_CLASSIFIER_ENABLED = os.getenv("MESSAGE_CLASSIFIER_ENABLED", "true").lower() in ("1", "true", "yes")
+# How much closer to the chit-chat centroid than the work centroid a message must be
+CHITCHAT_MARGIN = float(os.getenv("CHITCHAT_MARGIN", "0.05"))
+
+# Substring keyword groups (same semantics as the `kw in text` checks they replace)
+KEYWORD_GROUPS: Dict[str, List[str]] = {
+    "task_indicator": ["assign", "task", "need", "should", "must", "work on", "handle", "take care", "complete", "finish"],
+    "task_action": ["done", "finish", "complete", "cleared", "delete", "remove", "cancel", "get rid of"],
+    "task_extract": ["need to", "should", "must", "todo", "task", "action:", "by ", "deadline", "assign", "due", "presentation", "report", "document", "slide", "demo", "practice"],
+    "meeting": ["meeting", "schedule", "meet", "call", "zoom"],
+    "milestone": ["milestone", "phase", "deadline", "timeline", "schedule", "project plan"],
+    "milestone_action": ["change", "update", "modify", "add", "remove", "delete", "extend", "move", "shift"],
+    "operational": ["assign", "assigned", "task for", "give this to", "can you do", "responsible for"],
+    "rhetorical": ["i think", "we should", "let's", "propose", "suggest"],
+}
+
+# Whole-word groups
+WORD_GROUPS: Dict[str, List[str]] = {
+    "casual": [
+        "hello", "hi", "thanks", "thank you", "good morning", "good afternoon",
+        "how are you", "what's up", "see you", "bye", "goodbye",
+        "weather", "lunch", "coffee", "weekend", "vacation",
+    ],
+}
+
+# Groups that mean a detector may have work to do
+ROUTING_GROUPS = ("task_indicator", "task_action", "task_extract", "meeting", "milestone", "operational")
+
+QUESTION_WORDS = ("what", "how", "why", "when", "where", "who", "which", "can", "could", "would", "should", "is", "are", "do", "does")
+ASSIGNMENT_REPLIES = ("accept ", "decline ", "claim ")
+SYSTEM_COMMANDS = ASSIGNMENT_REPLIES + ("/role", "/assign", "/tasks", "/decisions", "/milestones", "/project", "/vote")
+
+# Labelled examples for the chit-chat classifier
+CHITCHAT_EXAMPLES = [
+    "hi everyone", "hello team", "good morning!", "thanks a lot", "thank you so much",
+    "lol that's funny", "haha nice", "how was your weekend?", "see you tomorrow",
+    "anyone up for coffee?", "have a great weekend", "congrats!", "ok sounds good", "bye all",
+]
+WORK_EXAMPLES = [
+    "we should use React for the frontend", "the deadline for the report is next Friday",
+    "can someone review the pull request", "the budget is $30k for this phase",
+    "I finished the login page", "the API needs authentication before launch",
+    "let's switch the database to PostgreSQL", "the requirements say we support mobile",
+    "schedule a design review for Tuesday at 2pm", "the test suite is failing on main",
+]
+
+def _build_matcher(groups: Dict[str, List[str]]):
+    keywords = sorted({kw for kws in groups.values() for kw in kws}, key=len, reverse=True)
+    pattern = re.compile("(?=(" + "|".join(re.escape(kw) for kw in keywords) + "))")
+    keyword_groups: Dict[str, Set[str]] = {}
+    for name, kws in groups.items():
+        for kw in kws:
+            keyword_groups.setdefault(kw, set()).add(name)
+    # A match also implies every shorter keyword it contains
+    closure = {kw: frozenset(g for other in keywords if other in kw for g in keyword_groups[other]) for kw in keywords}
+    return pattern, closure
+
+_pattern, _closure = _build_matcher(KEYWORD_GROUPS)
+_word_groups = {}
+for _name, _phrases in WORD_GROUPS.items():
+    for _phrase in _phrases:
+        _word_groups.setdefault(_phrase, set()).add(_name)
+_max_phrase_words = max(len(p.split()) for p in _word_groups)
+_token_re = re.compile(r"[a-z0-9']+")
+
+class MessageFeatures:
+    """Routing features for one message."""
+
+    def __init__(self, content: str, groups: FrozenSet[str]):
+        self.content = content
+        self.lower = content.strip().lower()
+        self.groups = groups
+        # Content with @bot mentions removed, as seen by the detectors
+        self.detection_lower = content.replace("@bot", "").strip().lower()
+        # Set by classify_chit_chat; None means "not classified"
+        self.is_chit_chat: Optional[bool] = None
+
+    def has(self, group: str) -> bool:
+        return group in self.groups
+
+    @property
+    def is_command(self) -> bool:
+        return self.content.startswith("/")
+
+    @property
+    def mentions_bot(self) -> bool:
+        return "@bot" in self.lower
+
+    @property
+    def is_system_command(self) -> bool:
+        return self.lower.startswith(SYSTEM_COMMANDS)
+
+    @property
+    def is_assignment_reply(self) -> bool:
+        return self.detection_lower.startswith(ASSIGNMENT_REPLIES)
+
+    @property
+    def is_task_command(self) -> bool:
+        return self.lower.startswith(ASSIGNMENT_REPLIES + ("/vote",))
+
+    @property
+    def is_question(self) -> bool:
+        return "?" in self.content or self.detection_lower.startswith(QUESTION_WORDS)
+
+    @property
+    def is_milestone_request(self) -> bool:
+        return self.has("milestone") and self.has("milestone_action")
+
+    @property
+    def has_routing_keywords(self) -> bool:
+        return any(g in self.groups for g in ROUTING_GROUPS)
+
+@lru_cache(maxsize=512)
+def extract_features(content: str) -> MessageFeatures:
+    """Compute keyword features for a message in one scan (cached per message text)."""
+    lower = content.lower()
+    groups: Set[str] = set()
+    for match in _pattern.finditer(lower):
+        groups.update(_closure[match.group(1)])
+
+    tokens = _token_re.findall(lower)
+    for n in range(1, _max_phrase_words + 1):
+        for i in range(len(tokens) - n + 1):
+            hit = _word_groups.get(" ".join(tokens[i:i + n]))
+            if hit:
+                groups.update(hit)
+    return MessageFeatures(content, frozenset(groups))
+
+_centroids = None
+
+def _cosine(a, b) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = sum(x * x for x in a) ** 0.5
+    nb = sum(y * y for y in b) ** 0.5
+    return dot / (na * nb) if na and nb else 0.0
+
+def _mean(vectors) -> list:
+    return [sum(col) / len(vectors) for col in zip(*vectors)]
+
+def _classify(text: str) -> bool:
+    global _centroids
+    from vector_db import embedding_model
+    if _centroids is None:
+        chat = embedding_model.encode(CHITCHAT_EXAMPLES).tolist()
+        work = embedding_model.encode(WORK_EXAMPLES).tolist()
+        _centroids = (_mean(chat), _mean(work))
+    vector = embedding_model.encode([text]).tolist()[0]
+    return _cosine(vector, _centroids[0]) - _cosine(vector, _centroids[1]) > CHITCHAT_MARGIN
+
+async def classify_chit_chat(features: MessageFeatures) -> bool:
+    """True if the message is small talk. Messages with routing keywords, commands or
+    @bot mentions are never chit-chat; everything else goes to the embedding classifier."""
+    if features.is_chit_chat is not None:
+        return features.is_chit_chat
+    if features.has_routing_keywords or features.is_command or features.mentions_bot:
+        features.is_chit_chat = False
+    elif len(features.lower) < 15 and features.has("casual"):
+        features.is_chit_chat = True
+    elif not MESSAGE_CLASSIFIER_ENABLED:
+        features.is_chit_chat = False
+    else:
+        try:
+            features.is_chit_chat = await asyncio.to_thread(_classify, features.lower)
+        except Exception as e:
+            print(f"⚠️  Chit-chat classifier unavailable: {e}")
+            features.is_chit_chat = False
+    return features.is_chit_chat
@@ -0,0 +1,160 @@
+"""Background pipeline for work that runs after a chat message is saved.
+
+POST /api/messages only persists and broadcasts the message, then hands a message event
+to this pipeline. Events are sharded by conversation so each conversation is processed
+in order, while different conversations are processed concurrently. Each shard has a
+bounded number of pending events; when a shard is full the endpoint rejects new messages
+(backpressure) instead of queueing unbounded work.
+
+The queues themselves are in memory. Each event is also persisted as a message_events row
+in the same transaction as its message and deleted when the handler finishes, so events
+lost to a restart or crash are re-queued by a periodic sweep once their claim is older than
+MESSAGE_EVENT_RECLAIM_AFTER (see requeue). Each sweep first renews the claims of the events
+this process still has queued or running (pending_ids), so a backed-up shard is not
+mistaken for a lost one. Processing is therefore at-least-once: an event
+interrupted mid-way runs again from the start.
+"""
+
+import os
+import time
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from dotenv import load_dotenv
+
+load_dotenv()
+
+MESSAGE_WORKERS = int(os.getenv("MESSAGE_WORKERS", "4"))
+MESSAGE_QUEUE_SIZE = int(os.getenv("MESSAGE_QUEUE_SIZE", "100"))
+# How long POST /api/messages waits for room in a full shard before returning 503
+MESSAGE_SUBMIT_TIMEOUT = float(os.getenv("MESSAGE_SUBMIT_TIMEOUT", "2"))
+# Seconds before another worker may reclaim a persisted event, and how often to look for them
+# (and renew this process's claims; keep the interval well below the reclaim age)
+MESSAGE_EVENT_RECLAIM_AFTER = int(os.getenv("MESSAGE_EVENT_RECLAIM_AFTER", "300"))
+MESSAGE_EVENT_SWEEP_INTERVAL = float(os.getenv("MESSAGE_EVENT_SWEEP_INTERVAL", "60"))
+
+class PipelineFull(Exception):
+    """Raised when a conversation's shard has no room for another message event."""
+
+def conversation_key(group_id: Optional[int] = None, user_id: Optional[int] = None, dm_user_id: Optional[int] = None) -> str:
+    """Ordering key: one per group chat or direct-message pair."""
+    if dm_user_id:
+        a, b = sorted((user_id or 0, dm_user_id))
+        return f"dm:{a}:{b}"
+    return f"group:{group_id}" if group_id else "group:none"
+
+class MessagePipeline:
+    """Sharded worker queues with bounded capacity per shard."""
+
+    def __init__(self, workers: int, queue_size: int, submit_timeout: float):
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.submit_timeout = submit_timeout
+        self._handler: Optional[Callable[[Dict], Awaitable[None]]] = None
+        self._queues: List[asyncio.Queue] = []
+        # Capacity is reserved before the message is saved, so a full shard rejects cleanly
+        self._capacity: List[asyncio.Semaphore] = []
+        self._tasks: List[asyncio.Task] = []
+        # message_ids queued, waiting for room or being processed in this process
+        self._pending: Set[int] = set()
+        self._stats = {
+            "submitted": 0,
+            "processed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "recovered": 0,
+            "total_queue_wait_ms": 0.0,
+            "total_processing_ms": 0.0,
+        }
+
+    def start(self, handler: Callable[[Dict], Awaitable[None]]):
+        if self._tasks:
+            return
+        self._handler = handler
+        self._queues = [asyncio.Queue() for _ in range(self.workers)]
+        self._capacity = [asyncio.Semaphore(self.queue_size) for _ in range(self.workers)]
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        print(f"✅ Message pipeline started ({self.workers} workers, {self.queue_size} events per shard)")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def shard_for(self, key: str) -> int:
+        return hash(key) % self.workers
+
+    async def reserve(self, key: str) -> int:
+        """Reserve room for one event in the key's shard; raises PipelineFull on timeout."""
+        if not self._tasks:
+            raise PipelineFull("Message pipeline is not running")
+        shard = self.shard_for(key)
+        try:
+            await asyncio.wait_for(self._capacity[shard].acquire(), timeout=self.submit_timeout)
+        except asyncio.TimeoutError:
+            self._stats["rejected"] += 1
+            raise PipelineFull(f"Message shard {shard} is full")
+        return shard
+
+    def release(self, shard: int):
+        """Give back a reservation that will not be submitted (e.g. the insert failed)."""
+        self._capacity[shard].release()
+
+    def submit(self, shard: int, event: Dict):
+        """Queue an event in a previously reserved slot."""
+        event["_queued_at"] = time.perf_counter()
+        if "message_id" in event:
+            self._pending.add(event["message_id"])
+        self._queues[shard].put_nowait(event)
+        self._stats["submitted"] += 1
+
+    async def requeue(self, key: str, event: Dict):
+        """Queue a recovered event, waiting as long as it takes for room in the key's shard."""
+        shard = self.shard_for(key)
+        self._pending.add(event["message_id"])
+        await self._capacity[shard].acquire()
+        self.submit(shard, event)
+        self._stats["recovered"] += 1
+
+    async def _worker(self, shard: int):
+        queue = self._queues[shard]
+        while True:
+            event = await queue.get()
+            started = time.perf_counter()
+            self._stats["total_queue_wait_ms"] += (started - event.pop("_queued_at", started)) * 1000
+            try:
+                await self._handler(event)
+                self._stats["processed"] += 1
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["failed"] += 1
+                print(f"❌ Message pipeline failed for message {event.get('message_id')}: {e}")
+            finally:
+                self._stats["total_processing_ms"] += (time.perf_counter() - started) * 1000
+                self._capacity[shard].release()
+                self._pending.discard(event.get("message_id"))
+                queue.task_done()
+
+    def pending_ids(self) -> Set[int]:
+        """message_ids this process has accepted but not finished."""
+        return set(self._pending)
+
+    def get_stats(self) -> dict:
+        done = self._stats["processed"] + self._stats["failed"]
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "running": bool(self._tasks),
+            "queue_depths": [q.qsize() for q in self._queues],
+            "submitted": self._stats["submitted"],
+            "processed": self._stats["processed"],
+            "failed": self._stats["failed"],
+            "rejected": self._stats["rejected"],
+            "recovered": self._stats["recovered"],
+            "avg_queue_wait_ms": round(self._stats["total_queue_wait_ms"] / done, 1) if done else 0,
+            "avg_processing_ms": round(self._stats["total_processing_ms"] / done, 1) if done else 0,
+        }
+
+# Global pipeline instance
+message_pipeline = MessagePipeline(MESSAGE_WORKERS, MESSAGE_QUEUE_SIZE, MESSAGE_SUBMIT_TIMEOUT)
@@ -1,290 +1,211 @@
+"""Versioned schema migrations.
+
+init_db() creates missing tables from the models; this module brings existing databases
+up to date. Each migration has a version number and runs once per database, recorded in
+the schema_version table, so a normal startup costs a single version query. Migrations
+must be idempotent (a fresh database already has everything create_all made) and are
+appended to MIGRATIONS with the next version number - never renumber or edit old ones.
+"""
+
+import base64
 from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession
-from db import SessionLocal
+from sqlalchemy.ext.asyncio import AsyncConnection
+from db import engine
+from task_assignees import parse_assignees
+from dates import to_date, to_datetime
+from blob_store import blob_store
+
+# Serializes migrations between workers that start at the same time
+MIGRATION_LOCK = "groupchat_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 60
+
+async def _column_type(conn: AsyncConnection, table: str, column: str):
+    """DATA_TYPE of a column, or None when it does not exist."""
+    result = await conn.execute(text("""
+        SELECT DATA_TYPE FROM information_schema.columns
+        WHERE table_schema = DATABASE()
+        AND table_name = :table
+        AND column_name = :column
+    """), {"table": table, "column": column})
+    return result.scalar()
+
+async def _index_exists(conn: AsyncConnection, table: str, index_name: str) -> bool:
+    result = await conn.execute(text("""
+        SELECT COUNT(*) as count
+        FROM information_schema.statistics
+        WHERE table_schema = DATABASE()
+        AND table_name = :table
+        AND index_name = :index_name
+    """), {"table": table, "index_name": index_name})
+    return result.scalar() > 0
+
+async def add_column(conn: AsyncConnection, table: str, column: str, definition: str):
+    if await _column_type(conn, table, column) is None:
+        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {definition}"))
+        print(f"✅ Added {column} column to {table} table")
+
+async def create_index(conn: AsyncConnection, table: str, index_name: str, columns: str):
+    if not await _index_exists(conn, table, index_name):
+        await conn.execute(text(f"CREATE INDEX {index_name} ON {table} ({columns})"))
+        print(f"✅ Added {index_name} index to {table} table")
+
+async def _legacy_columns(conn: AsyncConnection):
+    for table, column, definition in (
+        ("uploaded_files", "summary", "TEXT NULL"),
+        ("meetings", "transcript_file_id", "INT NULL"),
+        ("tasks", "assigned_to", "TEXT NULL"),
+        ("tasks", "due_date", "VARCHAR(100) NULL"),
+        ("meetings", "attendees", "TEXT NULL"),
+        ("messages", "group_id", "INT NULL"),
+        ("tasks", "group_id", "INT NULL"),
+        ("meetings", "group_id", "INT NULL"),
+        ("uploaded_files", "group_id", "INT NULL"),
+        ("group_memberships", "role", "VARCHAR(100) NULL"),
+        ("milestones", "group_id", "INT NULL"),
+        ("active_conflicts", "group_id", "INT NULL"),
+        ("users", "last_active_group_id", "INT NULL"),
+        ("decision_log", "group_id", "INT NULL"),
+        ("project_settings", "group_id", "INT NULL"),
+    ):
+        await add_column(conn, table, column, definition)
+
+    # assigned_to used to be a single user id
+    if await _column_type(conn, "tasks", "assigned_to") == "int":
+        await conn.execute(text("ALTER TABLE tasks MODIFY COLUMN assigned_to TEXT NULL"))
+        print("✅ Converted assigned_to column to TEXT")
+
+async def _message_page_indexes(conn: AsyncConnection):
+    await create_index(conn, "messages", "ix_messages_group_dm_id", "group_id, dm_user_id, id")
+    await create_index(conn, "messages", "ix_messages_user_dm_id", "user_id, dm_user_id, id")
+
+async def _hot_path_indexes(conn: AsyncConnection):
+    await create_index(conn, "tasks", "ix_tasks_group_status_created", "group_id, status, created_at")
+    await create_index(conn, "tasks", "ix_tasks_pending_assignment_expires", "pending_assignment, assignment_expires_at")
+    await create_index(conn, "meetings", "ix_meetings_group_datetime", "group_id, datetime")
+    await create_index(conn, "active_conflicts", "ix_active_conflicts_group_resolved_expires", "group_id, is_resolved, expires_at")
+
+async def _backfill_task_assignees(conn: AsyncConnection):
+    user_ids = {username.lower(): user_id for user_id, username in (await conn.execute(text("SELECT id, username FROM users"))).all()}
+    tasks = (await conn.execute(text("SELECT id, assigned_to FROM tasks WHERE assigned_to IS NOT NULL AND assigned_to != ''"))).all()
+    rows = []
+    for task_id, assigned_to in tasks:
+        matched = {user_ids[name.lower()] for name in parse_assignees(assigned_to) if name.lower() in user_ids}
+        rows.extend({"task_id": task_id, "user_id": user_id} for user_id in matched)
+    for start in range(0, len(rows), 1000):
+        await conn.execute(text("INSERT IGNORE INTO task_assignees (task_id, user_id) VALUES (:task_id, :user_id)"), rows[start:start + 1000])
+    print(f"✅ Backfilled {len(rows)} task assignees from {len(tasks)} assigned tasks")
+
+# (table, column, SQL type, parser, NOT NULL) for columns that used to be VARCHAR(100)
+TEMPORAL_COLUMNS = (
+    ("tasks", "due_date", "DATE", to_date, False),
+    ("project_settings", "ship_date", "DATE", to_date, False),
+    ("milestones", "start_date", "DATE", to_date, True),
+    ("milestones", "end_date", "DATE", to_date, True),
+    ("meetings", "datetime", "DATETIME", to_datetime, True),
+)
+
+async def _temporal_columns(conn: AsyncConnection):
+    """Validate the stored strings, rewrite them in a form MySQL accepts, then change the column type.
+
+    Values that do not parse become NULL; in NOT NULL columns they fall back to the
+    row's created_at. Each one is printed so it can be fixed by hand.
+    """
+    for table, column, sql_type, parse, required in TEMPORAL_COLUMNS:
+        if await _column_type(conn, table, column) in ("date", "datetime"):
+            continue
+        rows = (await conn.execute(text(f"SELECT id, `{column}`, created_at FROM {table} WHERE `{column}` IS NOT NULL"))).all()
+        invalid = 0
+        for row_id, raw, created_at in rows:
+            parsed = parse(raw)
+            if parsed is None:
+                invalid += 1
+                parsed = parse(created_at) if required else None
+                print(f"⚠️  {table}.{column} id={row_id}: {raw!r} is not a valid date, replaced with {parsed}")
+            await conn.execute(text(f"UPDATE {table} SET `{column}` = :value WHERE id = :id"), {"value": parsed, "id": row_id})
+        await conn.execute(text(f"ALTER TABLE {table} MODIFY COLUMN `{column}` {sql_type} {'NOT NULL' if required else 'NULL'}"))
+        print(f"✅ Converted {table}.{column} to {sql_type} ({len(rows)} values, {invalid} invalid)")
+
+async def _date_range_indexes(conn: AsyncConnection):
+    await create_index(conn, "tasks", "ix_tasks_status_due", "status, due_date")
+    await create_index(conn, "milestones", "ix_milestones_group_dates", "group_id, start_date, end_date")
+
+async def _files_to_blob_store(conn: AsyncConnection):
+    """Move base64 file_data and extracted content out of uploaded_files into the blob store.
+
+    Rows are moved one at a time and committed, so a crash part-way resumes where it
+    stopped; the old columns are dropped once they are empty.
+    """
+    await add_column(conn, "uploaded_files", "blob_key", "VARCHAR(64) NULL")
+    await add_column(conn, "uploaded_files", "text_key", "VARCHAR(64) NULL")
+    await add_column(conn, "uploaded_files", "size", "INT NULL")
+    await create_index(conn, "uploaded_files", "ix_uploaded_files_blob_key", "blob_key")
+    await create_index(conn, "uploaded_files", "ix_uploaded_files_text_key", "text_key")
+    if await _column_type(conn, "uploaded_files", "file_data") is None:
+        return
+    await conn.execute(text("ALTER TABLE uploaded_files MODIFY COLUMN file_data LONGTEXT NULL, MODIFY COLUMN content TEXT NULL"))
+    await conn.commit()
+
+    ids = (await conn.execute(text("SELECT id FROM uploaded_files WHERE file_data IS NOT NULL OR content IS NOT NULL"))).scalars().all()
+    for file_id in ids:
+        file_data, content = (await conn.execute(text("SELECT file_data, content FROM uploaded_files WHERE id = :id"), {"id": file_id})).one()
+        values = {"id": file_id, "blob_key": None, "text_key": None, "size": None}
+        if file_data:
+            data = base64.b64decode(file_data)
+            values["blob_key"], values["size"] = await blob_store.put(data), len(data)
+        if content:
+            values["text_key"] = await blob_store.put(content.encode("utf-8"))
+        await conn.execute(text("""
+            UPDATE uploaded_files
+            SET blob_key = COALESCE(:blob_key, blob_key), text_key = COALESCE(:text_key, text_key),
+                size = COALESCE(:size, size), file_data = NULL, content = NULL
+            WHERE id = :id
+        """), values)
+        await conn.commit()
+
+    await conn.execute(text("ALTER TABLE uploaded_files DROP COLUMN file_data, DROP COLUMN content"))
+    print(f"✅ Moved {len(ids)} uploaded files to the {blob_store.name} blob store")
+
+# (version, description, migration) - append only
+MIGRATIONS = [
+    (1, "columns added before versioned migrations", _legacy_columns),
+    (2, "message keyset pagination indexes", _message_page_indexes),
+    (3, "composite indexes for task, meeting and conflict queries", _hot_path_indexes),
+    (4, "task_assignees rows for existing assigned tasks", _backfill_task_assignees),
+    (5, "DATE/DATETIME columns for due dates, milestones, ship dates and meetings", _temporal_columns),
+    (6, "indexes for due date and milestone range queries", _date_range_indexes),
+    (7, "uploaded file bytes and text moved to the blob store", _files_to_blob_store),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+async def _current_version(conn: AsyncConnection) -> int:
+    return (await conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version"))).scalar()
 
 async def run_migrations():
-    """Run database migrations to update schema."""
-    async with SessionLocal() as session:
-        # Check if summary column exists
-        result = await session.execute(text("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'uploaded_files' 
-            AND column_name = 'summary'
-        """))
-        
-        count = result.scalar()
-        
-        if count == 0:
-            # Add summary column if it doesn't exist
-            await session.execute(text("ALTER TABLE uploaded_files ADD COLUMN summary TEXT NULL"))
-            await session.commit()
-            print("✅ Added summary column to uploaded_files table")
-        else:
-            print("✅ Summary column already exists")
-        
-        # Check if transcript_file_id column exists
-        result = await session.execute(text("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'meetings' 
-            AND column_name = 'transcript_file_id'
-        """))
-        
-        count = result.scalar()
-        
-        if count == 0:
-            await session.execute(text("ALTER TABLE meetings ADD COLUMN transcript_file_id INT NULL"))
-            await session.commit()
-            print("✅ Added transcript_file_id column to meetings table")
-        else:
-            print("✅ transcript_file_id column already exists")
-        
-        # Check if assigned_to column exists
-        result = await session.execute(text("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'tasks' 
-            AND column_name = 'assigned_to'
-        """))
-        
-        count = result.scalar()
-        
-        if count == 0:
-            await session.execute(text("ALTER TABLE tasks ADD COLUMN assigned_to TEXT NULL"))
-            await session.commit()
-            print("✅ Added assigned_to column to tasks table")
-        else:
-            # Check if it's INT type and needs conversion
-            result = await session.execute(text("""
-                SELECT DATA_TYPE FROM information_schema.columns 
-                WHERE table_schema = DATABASE() 
-                AND table_name = 'tasks' 
-                AND column_name = 'assigned_to'
-            """))
-            data_type = result.scalar()
-            if data_type == 'int':
-                await session.execute(text("ALTER TABLE tasks MODIFY COLUMN assigned_to TEXT NULL"))
-                await session.commit()
-                print("✅ Converted assigned_to column to TEXT")
-            else:
-                print("✅ assigned_to column already exists")
-        
-        # Check if due_date column exists
-        result = await session.execute(text("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'tasks' 
-            AND column_name = 'due_date'
-        """))
-        
-        count = result.scalar()
-        
-        if count == 0:
-            await session.execute(text("ALTER TABLE tasks ADD COLUMN due_date VARCHAR(100) NULL"))
-            await session.commit()
-            print("✅ Added due_date column to tasks table")
-        else:
-            print("✅ due_date column already exists")
-        
-        # Check if attendees column exists
-        result = await session.execute(text("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'meetings' 
-            AND column_name = 'attendees'
-        """))
-        
-        count = result.scalar()
-        
-        if count == 0:
-            await session.execute(text("ALTER TABLE meetings ADD COLUMN attendees TEXT NULL"))
-            await session.commit()
-            print("✅ Added attendees column to meetings table")
-        else:
-            print("✅ attendees column already exists")
-        
-        # Check if group_id column exists in messages table
-        result = await session.execute(text("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'messages' 
-            AND column_name = 'group_id'
-        """))
-        
-        count = result.scalar()
-        
-        if count == 0:
-            await session.execute(text("ALTER TABLE messages ADD COLUMN group_id INT NULL"))
-            await session.commit()
-            print("✅ Added group_id column to messages table")
-        else:
-            print("✅ group_id column already exists")
-        
-        # Check if group_id column exists in tasks table
-        result = await session.execute(text("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'tasks' 
-            AND column_name = 'group_id'
-        """))
-        
-        count = result.scalar()
-        
-        if count == 0:
-            await session.execute(text("ALTER TABLE tasks ADD COLUMN group_id INT NULL"))
-            await session.commit()
-            print("✅ Added group_id column to tasks table")
-        else:
-            print("✅ group_id column already exists")
-        
-        # Check if group_id column exists in meetings table
-        result = await session.execute(text("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'meetings' 
-            AND column_name = 'group_id'
-        """))
-        
-        count = result.scalar()
-        
-        if count == 0:
-            await session.execute(text("ALTER TABLE meetings ADD COLUMN group_id INT NULL"))
-            await session.commit()
-            print("✅ Added group_id column to meetings table")
-        else:
-            print("✅ group_id column already exists")
-        
-        # Check if group_id column exists in uploaded_files table
-        result = await session.execute(text("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'uploaded_files' 
-            AND column_name = 'group_id'
-        """))
-        
-        count = result.scalar()
-        
-        if count == 0:
-            await session.execute(text("ALTER TABLE uploaded_files ADD COLUMN group_id INT NULL"))
-            await session.commit()
-            print("✅ Added group_id column to uploaded_files table")
-        else:
-            print("✅ group_id column already exists")
-        
-        # Check if role column exists in group_memberships table
-        result = await session.execute(text("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'group_memberships' 
-            AND column_name = 'role'
-        """))
-        
-        count = result.scalar()
-        
-        if count == 0:
-            await session.execute(text("ALTER TABLE group_memberships ADD COLUMN role VARCHAR(100) NULL"))
-            await session.commit()
-            print("✅ Added role column to group_memberships table")
-        else:
-            print("✅ role column already exists")
-        
-        # Check if group_id column exists in milestones table
-        result = await session.execute(text("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'milestones' 
-            AND column_name = 'group_id'
-        """))
-        
-        count = result.scalar()
-        
-        if count == 0:
-            await session.execute(text("ALTER TABLE milestones ADD COLUMN group_id INT NULL"))
-            await session.commit()
-            print("✅ Added group_id column to milestones table")
-        else:
-            print("✅ group_id column already exists")
-        
-        # Check if group_id column exists in active_conflicts table
-        result = await session.execute(text("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'active_conflicts' 
-            AND column_name = 'group_id'
-        """))
-        
-        count = result.scalar()
-        
-        if count == 0:
-            await session.execute(text("ALTER TABLE active_conflicts ADD COLUMN group_id INT NULL"))
-            await session.commit()
-            print("✅ Added group_id column to active_conflicts table")
-        else:
-            print("✅ group_id column already exists")
-        
-        # Check if last_active_group_id column exists in users table
-        result = await session.execute(text("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'users' 
-            AND column_name = 'last_active_group_id'
-        """))
-        
-        count = result.scalar()
-        
-        if count == 0:
-            await session.execute(text("ALTER TABLE users ADD COLUMN last_active_group_id INT NULL"))
-            await session.commit()
-            print("✅ Added last_active_group_id column to users table")
-        else:
-            print("✅ last_active_group_id column already exists")
-        
-        # Check if group_id column exists in decision_log table
-        result = await session.execute(text("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'decision_log' 
-            AND column_name = 'group_id'
-        """))
-        
-        count = result.scalar()
-        
-        if count == 0:
-            await session.execute(text("ALTER TABLE decision_log ADD COLUMN group_id INT NULL"))
-            await session.commit()
-            print("✅ Added group_id column to decision_log table")
-        else:
-            print("✅ group_id column already exists in decision_log")
-        
-        # Check if group_id column exists in project_settings table
-        result = await session.execute(text("""
-            SELECT COUNT(*) as count 
-            FROM information_schema.columns 
-            WHERE table_schema = DATABASE() 
-            AND table_name = 'project_settings' 
-            AND column_name = 'group_id'
-        """))
-        
-        count = result.scalar()
-        
-        if count == 0:
-            await session.execute(text("ALTER TABLE project_settings ADD COLUMN group_id INT NULL"))
-            await session.commit()
-            print("✅ Added group_id column to project_settings table")
-        else:
-            print("✅ group_id column already exists in project_settings")
\ No newline at end of file
+    """Apply pending migrations (schema_version is created by init_db)."""
+    async with engine.connect() as conn:
+        version = await _current_version(conn)
+        await conn.commit()
+        if version >= LATEST_VERSION:
+            print(f"✅ Database schema is up to date (version {version})")
+            return
+
+        await conn.execute(text("SELECT GET_LOCK(:name, :timeout)"), {"name": MIGRATION_LOCK, "timeout": MIGRATION_LOCK_TIMEOUT})
+        try:
+            # Another worker may have migrated while we waited for the lock
+            version = await _current_version(conn)
+            await conn.commit()
+            for number, description, migration in MIGRATIONS:
+                if number <= version:
+                    continue
+                print(f"🔧 Applying schema migration {number}: {description}")
+                await migration(conn)
+                await conn.execute(
+                    text("INSERT INTO schema_version (version, description) VALUES (:version, :description)"),
+                    {"version": number, "description": description},
+                )
+                await conn.commit()
+            print(f"✅ Database schema migrated to version {LATEST_VERSION}")
+        finally:
+            await conn.execute(text("SELECT RELEASE_LOCK(:name)"), {"name": MIGRATION_LOCK})
+            await conn.commit()
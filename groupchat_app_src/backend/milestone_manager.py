@@ -1,24 +1,36 @@
 from llm import chat_completion
 from sqlalchemy import select, delete
 from db import Milestone, ProjectSettings, SessionLocal
+from dates import iso_date
 import json
 import re
+from message_features import extract_features
 
-async def detect_milestone_changes(content: str, user_id: int) -> bool:
+def is_milestone_request(content: str) -> bool:
+    """Keyword pre-filter for milestone change requests."""
+    return extract_features(content).is_milestone_request
+
+def wants_milestone_change(content: str, verdict=None) -> bool:
+    """Keyword pre-filter, confirmed by the combined message analysis when there is one."""
+    if not is_milestone_request(content):
+        return False
+    if verdict is not None and verdict.has("milestone_change"):
+        return bool(verdict.section("milestone_change"))
+    return True
+
+async def detect_milestone_changes(content: str, user_id: int, verdict=None) -> bool:
     """Detect if user wants to modify milestones and handle it."""
-    milestone_keywords = ['milestone', 'phase', 'deadline', 'timeline', 'schedule', 'project plan']
-    action_keywords = ['change', 'update', 'modify', 'add', 'remove', 'delete', 'extend', 'move', 'shift']
-    
-    content_lower = content.lower()
-    has_milestone = any(keyword in content_lower for keyword in milestone_keywords)
-    has_action = any(keyword in content_lower for keyword in action_keywords)
-    
-    if has_milestone and has_action:
-        return await process_milestone_change(content, user_id)
-    return False
+    if not wants_milestone_change(content, verdict):
+        return False
+    return await process_milestone_change(content, user_id)
 
 async def process_milestone_change(content: str, user_id: int) -> str:
     """Process milestone change request and return response."""
+    plan = await plan_milestone_change(content)
+    return await apply_milestone_change(plan, user_id)
+
+async def plan_milestone_change(content: str) -> dict:
+    """Ask the LLM for updated milestones without changing anything. Failures carry an "error" reply."""
     async with SessionLocal() as session:
         # Get current milestones
         milestones_res = await session.execute(select(Milestone).order_by(Milestone.start_date))
@@ -28,17 +40,17 @@ async def process_milestone_change(content: str, user_id: int) -> str:
         settings_res = await session.execute(select(ProjectSettings).limit(1))
         settings = settings_res.scalar_one_or_none()
         ship_date = settings.ship_date if settings else None
-        
-        # Build context for LLM
-        current_context = ""
-        if current_milestones:
-            current_context = "Current milestones:\n"
-            for m in current_milestones:
-                current_context += f"- {m.title}: {m.start_date} to {m.end_date}\n"
-        
-        ship_context = f"\nShip date: {ship_date}" if ship_date else ""
-        
-        prompt = f"""User wants to modify project milestones. Analyze their request and provide updated milestones.
+    
+    # Build context for LLM
+    current_context = ""
+    if current_milestones:
+        current_context = "Current milestones:\n"
+        for m in current_milestones:
+            current_context += f"- {m.title}: {m.start_date} to {m.end_date}\n"
+    
+    ship_context = f"\nShip date: {ship_date}" if ship_date else ""
+    
+    prompt = f"""User wants to modify project milestones. Analyze their request and provide updated milestones.
 
 {current_context}{ship_context}
 
@@ -60,24 +72,44 @@ Rules:
 - If ship_date exists, all milestones must end before it
 - If action is "none", return empty milestones array"""
 
+    try:
+        llm_response = await chat_completion([{"role": "user", "content": prompt}])
+        
+        # Extract JSON from response
+        json_match = re.search(r'\{.*\}', llm_response, re.DOTALL)
+        if not json_match:
+            return {"error": "I couldn't understand your milestone request. Please be more specific."}
+        
+        return json.loads(json_match.group())
+    except Exception as e:
+        return {"error": f"Error processing milestone request: {str(e)}"}
+
+async def apply_milestone_change(plan: dict, user_id: int) -> str:
+    """Save a plan from plan_milestone_change and return the reply for the chat."""
+    if plan.get("error"):
+        return plan["error"]
+    
+    if plan.get("action") == "none":
+        return plan.get("response", "No changes needed to milestones.")
+    
+    # Keep only milestones whose dates parse; the columns are NOT NULL
+    milestones = []
+    for m_data in plan.get("milestones", []):
+        start_date, end_date = iso_date(m_data.get("start_date")), iso_date(m_data.get("end_date"))
+        if not m_data.get("title") or not start_date or not end_date or end_date < start_date:
+            print(f"⚠️  Skipping milestone with unreadable dates: {m_data}")
+            continue
+        milestones.append({"title": m_data["title"], "start_date": start_date, "end_date": end_date})
+    if plan.get("milestones") and not milestones:
+        return "I couldn't work out dates for those milestones. Please give them as YYYY-MM-DD."
+    
+    async with SessionLocal() as session:
         try:
-            llm_response = await chat_completion([{"role": "user", "content": prompt}])
-            
-            # Extract JSON from response
-            json_match = re.search(r'\{.*\}', llm_response, re.DOTALL)
-            if not json_match:
-                return "I couldn't understand your milestone request. Please be more specific."
-            
-            result = json.loads(json_match.group())
-            
-            if result.get("action") == "none":
-                return result.get("response", "No changes needed to milestones.")
-            
             # Clear existing milestones
             await session.execute(delete(Milestone))
             
             # Add new milestones
-            for m_data in result.get("milestones", []):
+            for m_data in milestones:
                 milestone = Milestone(
                     title=m_data["title"],
                     start_date=m_data["start_date"],
@@ -89,11 +121,10 @@ Rules:
             await session.commit()
             
             # Broadcast update
-            from websocket_manager import ConnectionManager
-            manager = ConnectionManager()
+            from websocket_manager import manager
             await manager.broadcast({"type": "milestones_updated"})
             
-            return f"✅ **Milestones Updated**\n\n{result.get('response', 'Milestones have been updated.')}"
+            return f"✅ **Milestones Updated**\n\n{plan.get('response', 'Milestones have been updated.')}"
             
         except Exception as e:
-            return f"Error processing milestone request: {str(e)}"
\ No newline at end of file
+            return f"Error processing milestone request: {str(e)}"
@@ -1,6 +1,7 @@
 from llm import chat_completion
 from sqlalchemy import select, desc
 from db import Message, UploadedFile, SessionLocal
+from user_cache import get_usernames
 
 async def analyze_project(timeline_info: str = None):
     """Analyze chat history and files to suggest project structure."""
@@ -108,7 +109,7 @@ Use bullet points and emojis. Be concise and actionable."""
 
 async def get_project_status():
     """Summarize current project progress from actual tasks and recent chat."""
-    from db import Task, TaskStatus, Meeting, User, ProjectSettings
+    from db import Task, TaskStatus, Meeting, ProjectSettings
     from datetime import datetime
     
     async with SessionLocal() as session:
@@ -117,7 +118,7 @@ async def get_project_status():
         tasks = task_res.scalars().all()
         
         # Get upcoming meetings only
-        current_time = datetime.now().isoformat()
+        current_time = datetime.now()
         meeting_res = await session.execute(
             select(Meeting).where(Meeting.datetime >= current_time).order_by(Meeting.datetime)
         )
@@ -158,10 +159,10 @@ async def get_project_status():
             ship_date_context += "No ship date set\n"
         
         chat_context = "\nRECENT CHAT MESSAGES:\n"
+        names = await get_usernames(session, [m.user_id for m in messages[-10:] if not m.is_bot])
         for m in messages[-10:]:
             if not m.is_bot:
-                user = await session.get(User, m.user_id)
-                username = user.username if user else "unknown"
+                username = names.get(m.user_id, "unknown")
                 chat_context += f"{username}: {m.content[:100]}\n"
         
         from datetime import datetime
@@ -1,72 +1,106 @@
 from datetime import datetime, date
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from sqlalchemy import select, func, case
+
+from db import Milestone, Task, TaskStatus
+
+def _phase(title: str, status: str, days_remaining: int, elapsed_days: int, total_days: int, total: int, completed: int) -> Dict[str, Any]:
+    """Progress and urgency for one milestone whose status and day counts are known."""
+    if total > 0:
+        # Task-based progress (preferred)
+        progress = round((completed / total * 100))
+    elif status == "UPCOMING":
+        progress = 0
+    elif status == "COMPLETED":
+        progress = 100
+    else:
+        # Time-based progress (fallback when no tasks)
+        progress = round((elapsed_days / total_days * 100)) if total_days > 0 else 0
+
+    # Determine urgency for active phases
+    if status == "ACTIVE":
+        if days_remaining < 3:
+            urgency = "CRITICAL"
+        elif days_remaining < 7:
+            urgency = "WARNING"
+        else:
+            urgency = "ON_TRACK"
+    else:
+        urgency = "ON_TRACK"
+
+    return {
+        "title": title,
+        "progress": progress,
+        "days_remaining": days_remaining,
+        "status": status,
+        "urgency": urgency
+    }
 
 def calculate_project_pulse(current_date: str, milestones: List[Dict], tasks: List[Dict]) -> Dict[str, Any]:
     """
     Calculate project pulse status for all milestones.
-    
+
     Args:
         current_date: YYYY-MM-DD format
         milestones: [{"title": str, "start_date": str, "end_date": str}]
         tasks: [{"milestone": str, "status": "pending"|"completed"}]
-    
+
     Returns:
         JSON object with phases array containing status for each milestone
     """
     curr = datetime.strptime(current_date, "%Y-%m-%d").date()
-    
+
     phases = []
     for m in milestones:
         start = datetime.strptime(m["start_date"], "%Y-%m-%d").date()
         end = datetime.strptime(m["end_date"], "%Y-%m-%d").date()
-        
-        # Calculate progress based on tasks OR time elapsed
+
         phase_tasks = [t for t in tasks if t.get("milestone") == m["title"]]
-        total = len(phase_tasks)
         completed = len([t for t in phase_tasks if t.get("status") == "completed"])
-        
-        if total > 0:
-            # Task-based progress (preferred)
-            progress = round((completed / total * 100))
-        else:
-            # Time-based progress (fallback when no tasks)
-            total_days = (end - start).days
-            elapsed_days = (curr - start).days
-            if curr < start:
-                progress = 0
-            elif curr > end:
-                progress = 100
-            else:
-                progress = round((elapsed_days / total_days * 100)) if total_days > 0 else 0
-        
-        # Calculate deadline delta
-        days_remaining = (end - curr).days
-        
-        # Determine status
-        if curr < start:
-            status = "UPCOMING"
-        elif curr > end:
-            status = "COMPLETED"
-        else:
-            status = "ACTIVE"
-        
-        # Determine urgency for active phases
-        if status == "ACTIVE":
-            if days_remaining < 3:
-                urgency = "CRITICAL"
-            elif days_remaining < 7:
-                urgency = "WARNING"
-            else:
-                urgency = "ON_TRACK"
-        else:
-            urgency = "ON_TRACK"
-        
-        phases.append({
-            "title": m["title"],
-            "progress": progress,
-            "days_remaining": days_remaining,
-            "status": status,
-            "urgency": urgency
-        })
-    
+        status = "UPCOMING" if curr < start else "COMPLETED" if curr > end else "ACTIVE"
+        phases.append(_phase(m["title"], status, (end - curr).days, (curr - start).days, (end - start).days, len(phase_tasks), completed))
+
+    return {"phases": phases}
+
+async def load_project_pulse(session, group_id: Optional[int], today: Optional[date] = None) -> Dict[str, Any]:
+    """Pulse for a group's stored milestones.
+
+    Phase status (upcoming/active/completed), day counts and per-milestone task totals
+    are computed by the database from the DATE columns, in milestone order.
+    """
+    today = today or date.today()
+    task_counts = (
+        select(
+            Task.milestone_id,
+            func.count().label("total"),
+            func.sum(case((Task.status == TaskStatus.completed, 1), else_=0)).label("completed"),
+        )
+        .where(Task.milestone_id != None)
+        .group_by(Task.milestone_id)
+        .subquery()
+    )
+    status = case(
+        (Milestone.start_date > today, "UPCOMING"),
+        (Milestone.end_date < today, "COMPLETED"),
+        else_="ACTIVE",
+    )
+    res = await session.execute(
+        select(
+            Milestone.id,
+            Milestone.title,
+            status.label("status"),
+            func.datediff(Milestone.end_date, today).label("days_remaining"),
+            func.datediff(today, Milestone.start_date).label("elapsed_days"),
+            func.datediff(Milestone.end_date, Milestone.start_date).label("total_days"),
+            func.coalesce(task_counts.c.total, 0).label("total"),
+            func.coalesce(task_counts.c.completed, 0).label("completed"),
+        )
+        .outerjoin(task_counts, task_counts.c.milestone_id == Milestone.id)
+        .where(Milestone.group_id == group_id if group_id else Milestone.group_id == None)
+        .order_by(Milestone.start_date, Milestone.id)
+    )
+    phases = []
+    for row in res.all():
+        phase = _phase(row.title, row.status, row.days_remaining, row.elapsed_days, row.total_days, int(row.total), int(row.completed))
+        phases.append({"id": row.id, **phase})
     return {"phases": phases}
@@ -2,6 +2,9 @@ from llm import chat_completion
 import json
 import asyncio
 
+# Role titles normalize the same way every time, so cache them for a day
+ROLE_CACHE_TTL = 86400
+
 async def normalize_role(user_input: str) -> str:
     """Use LLM to normalize role titles and understand synonyms. Supports multiple comma-separated roles."""
     # Split by comma or newline to handle multiple roles
@@ -36,7 +39,7 @@ Rules:
 """
         
         try:
-            response = await chat_completion([{"role": "user", "content": prompt}])
+            response = await chat_completion([{"role": "user", "content": prompt}], cache_ttl=ROLE_CACHE_TTL)
             json_start = response.find('{')
             json_end = response.rfind('}') + 1
             if json_start != -1 and json_end > json_start:
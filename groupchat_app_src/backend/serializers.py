@@ -0,0 +1,47 @@
+"""JSON shapes for entities shared by the REST API and WebSocket change events."""
+
+from datetime import datetime
+from typing import Iterable, Optional, Tuple
+
+from dates import iso_date, iso_datetime
+
+def task_to_dict(t) -> dict:
+    return {
+        "id": t.id,
+        "content": t.content,
+        "status": t.status.value,
+        "assigned_to": t.assigned_to,
+        "due_date": iso_date(t.due_date),
+        "milestone_id": t.milestone_id,
+        "pending_assignment": t.pending_assignment if hasattr(t, 'pending_assignment') else False,
+        "created_at": str(t.created_at)
+    }
+
+def meeting_to_dict(m, transcript_filename: Optional[str] = None) -> dict:
+    return {"id": m.id, "title": m.title, "datetime": iso_datetime(m.datetime), "duration_minutes": m.duration_minutes, "zoom_link": m.zoom_link, "transcript_filename": transcript_filename, "attendees": m.attendees, "created_at": str(m.created_at)}
+
+def milestone_to_dict(m) -> dict:
+    return {"id": m.id, "title": m.title, "start_date": iso_date(m.start_date), "end_date": iso_date(m.end_date), "description": m.description, "assigned_roles": m.assigned_roles, "risk_level": m.risk_level, "dependencies": m.dependencies}
+
+def conflict_to_dict(c, votes: Iterable[Tuple[str, Optional[str]]]) -> dict:
+    """votes: (selected option, voter username) pairs for this conflict."""
+    vote_counts = {'A': 0, 'B': 0, 'C': 0}
+    user_votes = {}
+    for option, voter in votes:
+        vote_counts[option] += 1
+        user_votes[voter or "unknown"] = option
+
+    remaining_time = c.expires_at - datetime.now()
+    hours_left = max(0, int(remaining_time.total_seconds() / 3600))
+
+    return {
+        "conflict_id": c.conflict_id,
+        "user_statement": c.user_statement,
+        "source_file": c.source_file,
+        "severity": c.severity.value,
+        "reason": c.reason,
+        "vote_counts": vote_counts,
+        "user_votes": user_votes,
+        "hours_remaining": hours_left,
+        "created_at": str(c.created_at)
+    }
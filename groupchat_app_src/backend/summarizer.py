@@ -1,4 +1,5 @@
 from llm import chat_completion
+from llm_scheduler import PRIORITY_BACKGROUND
 
 async def generate_summary(text: str, filename: str) -> str:
     """Generate a concise summary of the document text."""
@@ -16,8 +17,8 @@ async def generate_summary(text: str, filename: str) -> str:
     
     try:
         import asyncio
-        # Add timeout to prevent hanging
-        summary = await asyncio.wait_for(chat_completion(messages), timeout=10.0)
+        # Time out the upstream call only; queueing behind other background work is bounded by the scheduler
+        summary = await chat_completion(messages, priority=PRIORITY_BACKGROUND, timeout=10.0)
         # Remove common prefixes if LLM still includes them
         summary = summary.strip()
         prefixes = [
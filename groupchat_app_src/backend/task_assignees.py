@@ -0,0 +1,62 @@
+"""Task assignees as rows in task_assignees.
+
+Task.assigned_to stays the comma-separated display string the UI and LLM prompts use;
+set_task_assignees keeps the rows in step with it. Queries that ask "whose tasks" go
+through the rows (an index lookup per user) instead of LIKE on the string.
+"""
+
+from typing import Dict, Iterable, List, Optional
+from sqlalchemy import select, delete, func
+
+from db import Task, TaskAssignee, TaskStatus, User
+
+def parse_assignees(assigned_to: Optional[str]) -> List[str]:
+    """Usernames in an assigned_to string ("alice, @bob" -> ["alice", "bob"])."""
+    names = []
+    for name in (assigned_to or "").split(","):
+        name = name.strip().lstrip("@").strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+async def set_task_assignees(session, task: Task, assigned_to: Optional[str]):
+    """Set task.assigned_to and replace its task_assignees rows (the caller commits).
+
+    New tasks are flushed first so they have an id. Names that match no user are kept
+    in the display string but get no row.
+    """
+    task.assigned_to = assigned_to or None
+    if task.id is None:
+        await session.flush()
+    await session.execute(delete(TaskAssignee).where(TaskAssignee.task_id == task.id))
+    names = parse_assignees(assigned_to)
+    if not names:
+        return
+    res = await session.execute(select(User.id).where(User.username.in_(names)))
+    for user_id in set(res.scalars().all()):
+        session.add(TaskAssignee(task_id=task.id, user_id=user_id))
+
+def assigned_to_user(user_id: int):
+    """Filter for tasks assigned to user_id."""
+    return Task.id.in_(select(TaskAssignee.task_id).where(TaskAssignee.user_id == user_id))
+
+def assigned_to_username(username: str):
+    """Filter for tasks assigned to the user with this username."""
+    return Task.id.in_(
+        select(TaskAssignee.task_id)
+        .join(User, User.id == TaskAssignee.user_id)
+        .where(User.username == username)
+    )
+
+async def pending_task_counts(session, user_ids: Iterable[int]) -> Dict[int, int]:
+    """Pending tasks per user; a task with several assignees counts once for each."""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return {}
+    res = await session.execute(
+        select(TaskAssignee.user_id, func.count())
+        .join(Task, Task.id == TaskAssignee.task_id)
+        .where(TaskAssignee.user_id.in_(user_ids), Task.status == TaskStatus.pending)
+        .group_by(TaskAssignee.user_id)
+    )
+    return {user_id: count for user_id, count in res.all()}
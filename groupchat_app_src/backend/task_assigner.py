@@ -1,6 +1,8 @@
 from llm import chat_completion
 from sqlalchemy import select
-from db import User, Task, TaskStatus, Milestone, GroupMembership
+from db import User, Task, Milestone, GroupMembership
+from task_assignees import set_task_assignees, pending_task_counts
+from dates import iso_date
 import json
 from datetime import datetime
 
@@ -36,13 +38,7 @@ async def assign_task_to_user(session, task_content: str, task_id: int = None, u
     milestone_context = "\n".join([f"- {m.title}: {m.start_date} to {m.end_date}" for m in milestones]) if milestones else "No milestones set"
     
     # Get task counts per user
-    from sqlalchemy import func
-    task_counts_res = await session.execute(
-        select(Task.assigned_to, func.count(Task.id))
-        .where(Task.status == TaskStatus.pending)
-        .group_by(Task.assigned_to)
-    )
-    task_counts = {row[0]: row[1] for row in task_counts_res.all()}
+    task_counts = await pending_task_counts(session, [user.id for _, user in users])
     
     # Build user list with roles and workload
     user_list = []
@@ -50,7 +46,7 @@ async def assign_task_to_user(session, task_content: str, task_id: int = None, u
     for membership, user in users:
         # Use group-specific role if available, otherwise fall back to user's global role
         role = membership.role if membership and membership.role else (user.role if user.role else "No role")
-        pending_tasks = task_counts.get(user.username, 0)
+        pending_tasks = task_counts.get(user.id, 0)
         user_list.append(f"{user.username} ({role}, {pending_tasks} pending tasks)")
         print(f"      - {user.username}: role='{role}', pending={pending_tasks}")
     
@@ -94,6 +90,11 @@ Rules:
         json_end = response.rfind('}') + 1
         if json_start != -1 and json_end > json_start:
             result = json.loads(response[json_start:json_end])
+            # Callers store due_date in a DATE column; free-text dates ("next Friday") are dropped
+            raw_due = result.get("due_date")
+            result["due_date"] = iso_date(raw_due)
+            if raw_due and result["due_date"] is None:
+                print(f"   ⚠️  Ignoring unparseable due date: {raw_due!r}")
             print(f"   ✅ Assigned to: {result.get('assigned_to')}")
             print(f"      Due date: {result.get('due_date')}")
             print(f"      Reason: {result.get('reason')}")
@@ -102,7 +103,7 @@ Rules:
             if task_id:
                 task = await session.get(Task, task_id)
                 if task:
-                    task.assigned_to = result.get("assigned_to")
+                    await set_task_assignees(session, task, result.get("assigned_to"))
                     if result.get("due_date"):
                         task.due_date = result.get("due_date")
                     await session.commit()
@@ -112,4 +113,5 @@ Rules:
         return {"assigned_to": users[0][1].username, "reason": "Default assignment", "due_date": None}
     except Exception as e:
         print(f"   ❌ Error: {e}")
+        await session.rollback()
         return {"assigned_to": users[0][1].username, "reason": "Default assignment", "due_date": None}
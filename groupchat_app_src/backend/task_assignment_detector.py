@@ -1,8 +1,21 @@
 from llm import chat_completion
 import json
 
-async def detect_task_assignment(message: str) -> dict:
+def _valid_assignment(result) -> dict:
+    """The result if it is an assignment with a non-empty task, else None."""
+    if not isinstance(result, dict) or not result.get("is_assignment"):
+        return None
+    task = result.get("task")
+    if not isinstance(task, str) or not task.strip():
+        print(f"Ignoring task assignment without a task: {result}")
+        return None
+    return result
+
+async def detect_task_assignment(message: str, verdict=None) -> dict:
     """Detect if user wants to assign a task using natural language."""
+    if verdict is not None and verdict.has("task_assignment"):
+        return _valid_assignment(verdict.section("task_assignment"))
+    
     prompt = f"""Respond with ONLY JSON. No other text.
 
 Message: "{message}"
@@ -40,8 +53,7 @@ Your response (JSON only):
         if json_start != -1 and json_end > json_start:
             result = json.loads(response[json_start:json_end])
             print(f"Parsed task assignment result: {result}")
-            if result.get("is_assignment"):
-                return result
+            return _valid_assignment(result)
         return None
     except Exception as e:
         print(f"Task assignment detection error: {e}")
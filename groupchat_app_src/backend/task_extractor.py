@@ -1,13 +1,13 @@
 from llm import chat_completion
+from message_features import extract_features
 import json
 
 async def extract_tasks(message: str) -> list[dict]:
     """Extract actionable tasks with due dates and assignees from a message using AI."""
     # Quick check for task indicators
-    indicators = ["need to", "should", "must", "todo", "task", "action:", "by ", "deadline", "assign", "due", "presentation", "report", "document", "slide", "demo", "practice"]
     # Also check for pattern: "X to username" which suggests assignment
     has_to_pattern = " to " in message.lower() and any(c.isalpha() for c in message)
-    if not any(ind in message.lower() for ind in indicators) and not has_to_pattern:
+    if not extract_features(message).has("task_extract") and not has_to_pattern:
         return []
     
     from datetime import datetime
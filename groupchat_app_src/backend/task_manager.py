@@ -3,12 +3,16 @@ from sqlalchemy import select
 from db import Task, TaskStatus
 import json
 
-async def detect_task_action(session, message: str) -> dict:
+async def detect_task_action(session, message: str, verdict=None) -> dict:
     """Detect if user wants to complete or delete a task."""
     # Skip task assignment commands
     if message.strip().lower().startswith(("accept ", "decline ", "claim ")):
         return None
     
+    if verdict is not None and verdict.has("task_action"):
+        result = verdict.section("task_action")
+        return result if result.get("action") not in (None, "none") and result.get("task_id") else None
+    
     # Get pending tasks
     tasks_res = await session.execute(select(Task).where(Task.status == TaskStatus.pending))
     tasks = tasks_res.scalars().all()
@@ -0,0 +1,86 @@
+"""Spool uploaded files to disk in chunks while hashing them.
+
+Uploads are copied from the request in UPLOAD_CHUNK_SIZE pieces into a temporary file
+inside the blob store, computing the SHA-256 on the way and stopping with 413 as soon
+as MAX_UPLOAD_MB is exceeded. Text extraction reads the spooled file, and the file is
+then moved into the blob store under its hash, so no stage holds the whole upload in
+memory.
+"""
+
+import os
+import hashlib
+import asyncio
+from typing import Optional
+from dotenv import load_dotenv
+from fastapi import HTTPException, UploadFile
+
+from blob_store import blob_store
+from file_processor import extract_text_from_file
+
+load_dotenv()
+
+MAX_UPLOAD_MB = float(os.getenv("MAX_UPLOAD_MB", "25"))
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+class SpooledUpload:
+    """An upload copied to a temporary file: path, SHA-256 (the blob key) and size."""
+
+    def __init__(self, path: str, key: str, size: int):
+        self.path = path
+        self.key = key
+        self.size = size
+
+    async def store(self) -> str:
+        """Move the file into the blob store and return its key."""
+        return await asyncio.to_thread(blob_store.put_path, self.path, self.key)
+
+    def discard(self):
+        """Remove the temporary file if it was not stored."""
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+def too_large(content_length: Optional[str], max_bytes: int = MAX_UPLOAD_BYTES) -> bool:
+    """Whether a request's Content-Length already rules it out (multipart overhead allowed for)."""
+    try:
+        return int(content_length) > max_bytes + UPLOAD_CHUNK_SIZE
+    except (TypeError, ValueError):
+        return False
+
+async def spool_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> SpooledUpload:
+    path = blob_store.temp_path()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File is larger than {MAX_UPLOAD_MB:g} MB")
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return SpooledUpload(path, digest.hexdigest(), size)
+
+async def store_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES):
+    """Spool an upload, extract its text from disk and move it into the blob store.
+
+    Returns (spooled upload, blob key, extracted text).
+    """
+    spooled = await spool_upload(file, max_bytes)
+    try:
+        try:
+            text = await asyncio.to_thread(extract_text_from_file, spooled.path, file.filename)
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="Text files must be UTF-8 encoded")
+        blob_key = await spooled.store()
+    finally:
+        spooled.discard()
+    return spooled, blob_key, text
@@ -0,0 +1,65 @@
+"""Process-wide user id -> username cache.
+
+Message listings, broadcasts and LLM context builders used to load the whole User row
+once per message. get_usernames resolves a batch of ids with at most one query, and
+recently used names are kept in a bounded LRU. Call invalidate_user after changing a
+user row.
+"""
+
+import os
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+from dotenv import load_dotenv
+from sqlalchemy import select
+
+from db import User
+
+load_dotenv()
+
+USERNAME_CACHE_SIZE = int(os.getenv("USERNAME_CACHE_SIZE", "2048"))
+
+_usernames: "OrderedDict[int, str]" = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "queries": 0}
+
+def remember_username(user_id: int, username: str):
+    _usernames[user_id] = username
+    _usernames.move_to_end(user_id)
+    while len(_usernames) > USERNAME_CACHE_SIZE:
+        _usernames.popitem(last=False)
+
+def invalidate_user(user_id: Optional[int] = None):
+    """Forget one user (or everyone when user_id is None)."""
+    if user_id is None:
+        _usernames.clear()
+    else:
+        _usernames.pop(user_id, None)
+
+async def get_usernames(session, user_ids: Iterable[Optional[int]]) -> Dict[int, str]:
+    """Usernames for the given ids (unknown ids are left out), with one query for all misses."""
+    found: Dict[int, str] = {}
+    missing = set()
+    for user_id in user_ids:
+        if not user_id or user_id in found:
+            continue
+        if user_id in _usernames:
+            _usernames.move_to_end(user_id)
+            found[user_id] = _usernames[user_id]
+            _stats["hits"] += 1
+        else:
+            missing.add(user_id)
+    if missing:
+        _stats["misses"] += len(missing)
+        _stats["queries"] += 1
+        res = await session.execute(select(User.id, User.username).where(User.id.in_(missing)))
+        for user_id, username in res.all():
+            remember_username(user_id, username)
+            found[user_id] = username
+    return found
+
+async def get_username(session, user_id: Optional[int], default: str = "unknown") -> str:
+    if not user_id:
+        return default
+    return (await get_usernames(session, [user_id])).get(user_id, default)
+
+def get_user_cache_stats() -> dict:
+    return {"size": len(_usernames), "max_size": USERNAME_CACHE_SIZE, **_stats}
@@ -1,26 +1,436 @@
-from typing import List
+"""Topic-routed WebSocket fan-out with a bounded outbound queue per connection.
+
+publish/broadcast only enqueue; each connection has its own writer task, so one slow
+client cannot stall delivery to the others or the request that produced the event.
+When a connection's queue overflows it is either disconnected (close code 1013, the
+client reconnects and reloads) or, with WS_SLOW_CONSUMER_POLICY=drop, loses its
+oldest pending events.
+
+Each event is encoded once per wire format and the same frame is queued for every
+recipient. JSON uses orjson when it is installed; clients may opt in to binary
+MessagePack frames with /ws?encoding=msgpack (needs the optional msgpack package).
+
+publish/broadcast go through a backplane (ws_backplane) so that, with several uvicorn
+workers, each worker delivers the event to the sockets it holds.
+
+Delivered events are numbered per topic ("seq") within this process ("epoch") and kept
+in a bounded replay ring. A reconnecting client sends the last seq it saw per topic
+(resume_from) and gets the missed events replayed, or a "resync" event when they are
+no longer in the ring or it was connected to another process.
+
+Sockets are authenticated, so the manager indexes them by user: user topics are
+delivered through that index, events for a user with no socket yet are held for
+WS_USER_HOLD seconds (e.g. the login summary), and presence (online/offline) is
+published when a user's first socket connects or last socket leaves on any worker.
+Presence goes to the user's group topics only, never to everyone. Events are held only
+while no worker reports the user as present; if several workers held one, the worker that
+delivers it publishes the event ids so the others drop their copies.
+"""
+
+import os
+import json
+import time
+import uuid
+import asyncio
+from collections import deque
+from typing import Dict, Iterable, List, Optional, Set
 from fastapi import WebSocket
+from dotenv import load_dotenv
+
+from ws_backplane import Backplane, create_backplane
+
+load_dotenv()
+
+# Pseudo-topic for events that go to every socket
+BROADCAST_TOPIC = "*"
+
+WS_SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", "256"))
+# What to do with a connection whose queue is full: "disconnect" or "drop"
+WS_SLOW_CONSUMER_POLICY = os.getenv("WS_SLOW_CONSUMER_POLICY", "disconnect").lower()
+# Seconds a single send may take before the connection is treated as dead
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+# Events kept per topic for replay after a reconnect
+WS_REPLAY_BUFFER = int(os.getenv("WS_REPLAY_BUFFER", "200"))
+# Seconds events for a user without a connected socket are held for their next connect
+WS_USER_HOLD = float(os.getenv("WS_USER_HOLD", "30"))
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+def encode_frame(message: dict, encoding: str = "json"):
+    """Encode an event for the wire: text for JSON, bytes for MessagePack."""
+    if encoding == "msgpack":
+        return msgpack.packb(message, use_bin_type=True, default=str)
+    if orjson is not None:
+        return orjson.dumps(message, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False, default=str)
+
+def negotiate_encoding(requested: Optional[str]) -> str:
+    """Wire format for a client's ?encoding= request (JSON unless msgpack is available)."""
+    if requested == "msgpack" and msgpack is not None:
+        return "msgpack"
+    return "json"
+
+def group_topic(group_id: Optional[int]) -> str:
+    """Topic for a group chat (group_id None is the default chat without a group)."""
+    return f"group:{group_id}" if group_id else "group:none"
+
+def dm_topic(user_a: int, user_b: int) -> str:
+    """Topic for a direct-message pair, independent of who sent the message."""
+    a, b = sorted((user_a, user_b))
+    return f"dm:{a}:{b}"
+
+def user_topic(user_id: int) -> str:
+    """Topic for events meant for a single user on all of their sockets."""
+    return f"user:{user_id}"
+
+def message_topic(group_id: Optional[int] = None, user_id: Optional[int] = None, dm_user_id: Optional[int] = None) -> str:
+    """Topic of the conversation a message belongs to."""
+    if dm_user_id and user_id:
+        return dm_topic(user_id, dm_user_id)
+    return group_topic(group_id)
+
+class Outbox:
+    """Outbound queue, writer task and lag counters for one socket."""
+
+    def __init__(self, websocket: WebSocket, size: int, encoding: str = "json"):
+        self.websocket = websocket
+        self.encoding = encoding
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=size)
+        self.writer: Optional[asyncio.Task] = None
+        self.connected_at = time.time()
+        self.sent = 0
+        self.dropped = 0
+        self.last_lag_ms = 0.0
+        self.max_lag_ms = 0.0
 
 class ConnectionManager:
-    def __init__(self):
+    def __init__(self, queue_size: int = WS_SEND_QUEUE, policy: str = WS_SLOW_CONSUMER_POLICY, backplane: Optional[Backplane] = None):
+        self.backplane = backplane or Backplane()
+        self.queue_size = queue_size
+        self.policy = policy
         self.active_connections: List[WebSocket] = []
+        self.outboxes: Dict[WebSocket, Outbox] = {}
+        # topic -> sockets, and socket -> the conversation topic it is viewing
+        self.topics: Dict[str, Set[WebSocket]] = {}
+        self.views: Dict[WebSocket, str] = {}
+        # socket -> user and user -> sockets on this worker
+        self.users: Dict[WebSocket, int] = {}
+        self.user_sockets: Dict[int, Set[WebSocket]] = {}
+        self.usernames: Dict[int, str] = {}
+        # user -> ids of the groups whose members see the user's presence
+        self.user_groups: Dict[int, List[int]] = {}
+        # user -> epochs of the workers where the user has a socket
+        self.presence: Dict[int, Set[str]] = {}
+        # user -> [(held at, backplane event id, event)] for users without a socket here
+        self.held: Dict[int, List] = {}
+        # Per-topic sequence numbers and replay rings; seqs are only comparable within one epoch
+        self.epoch = uuid.uuid4().hex[:12]
+        self.seqs: Dict[str, int] = {}
+        self.replay: Dict[str, deque] = {}
+        self._stats = {"slow_disconnects": 0, "dropped": 0, "send_errors": 0, "encodes": 0, "frames": 0, "replayed": 0, "resyncs": 0}
+
+    async def start(self):
+        """Start receiving events from the backplane (called on app startup)."""
+        await self.backplane.start(self._deliver)
 
-    async def connect(self, websocket: WebSocket):
+    async def stop(self):
+        await self.backplane.stop()
+
+    async def connect(self, websocket: WebSocket, user_id: Optional[int] = None, encoding: str = "json", username: Optional[str] = None, group_ids: Optional[Iterable[int]] = None):
         await websocket.accept()
         self.active_connections.append(websocket)
+        outbox = Outbox(websocket, self.queue_size, encoding)
+        outbox.writer = asyncio.create_task(self._writer(outbox))
+        self.outboxes[websocket] = outbox
+        if user_id:
+            self.users[websocket] = user_id
+            if username:
+                self.usernames[user_id] = username
+            if group_ids is not None:
+                self.user_groups[user_id] = list(group_ids)
+            sockets = self.user_sockets.setdefault(user_id, set())
+            sockets.add(websocket)
+            now = time.monotonic()
+            delivered = []
+            for held_at, event_id, event in self.held.pop(user_id, []):
+                if now - held_at <= WS_USER_HOLD:
+                    self._enqueue(outbox, encode_frame(event, outbox.encoding))
+                    delivered.append(event_id)
+            if delivered:
+                # Other workers held the same events; they must not deliver them again
+                await self.publish_user(user_id, {"type": "held_delivered", "event_ids": delivered, "worker": self.epoch})
+            if len(sockets) == 1:
+                await self._publish_presence(user_id, True)
 
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+        outbox = self.outboxes.pop(websocket, None)
+        if outbox and outbox.writer and outbox.writer is not asyncio.current_task():
+            outbox.writer.cancel()
+        view = self.views.pop(websocket, None)
+        if view:
+            self._remove(view, websocket)
+        user_id = self.users.pop(websocket, None)
+        if user_id:
+            sockets = self.user_sockets.get(user_id)
+            if sockets:
+                sockets.discard(websocket)
+                if not sockets:
+                    del self.user_sockets[user_id]
+                    asyncio.create_task(self._publish_presence(user_id, False, self.user_groups.pop(user_id, [])))
 
-    async def broadcast(self, message: dict):
-        for connection in list(self.active_connections):
+    async def _publish_presence(self, user_id: int, online: bool, group_ids: Optional[List[int]] = None):
+        # Every worker tracks presence; clients only see it on the user's group topics (see _deliver)
+        await self.backplane.publish(BROADCAST_TOPIC, {
+            "type": "presence",
+            "user_id": user_id,
+            "username": self.usernames.get(user_id),
+            "online": online,
+            "worker": self.epoch,
+            "group_ids": self.user_groups.get(user_id, []) if group_ids is None else group_ids,
+        })
+
+    def _track_presence(self, message: dict) -> dict:
+        """Fold a worker's presence change into the cross-worker view; returns the client event."""
+        workers = self.presence.setdefault(message["user_id"], set())
+        if message["online"]:
+            workers.add(message["worker"])
+        else:
+            workers.discard(message["worker"])
+        if message.get("username"):
+            self.usernames[message["user_id"]] = message["username"]
+        online = bool(workers)
+        if not online:
+            del self.presence[message["user_id"]]
+        return {"type": "presence", "user_id": message["user_id"], "username": message.get("username"), "online": online}
+
+    def online_users(self, user_ids: Optional[Set[int]] = None) -> List[dict]:
+        """Users connected on any worker, limited to user_ids when given."""
+        return [
+            {"user_id": user_id, "username": self.usernames.get(user_id)}
+            for user_id in self.presence
+            if user_ids is None or user_id in user_ids
+        ]
+
+    def _hold(self, user_id: int, event_id: str, event: dict):
+        now = time.monotonic()
+        held = [item for item in self.held.get(user_id, []) if now - item[0] <= WS_USER_HOLD]
+        held.append((now, event_id, event))
+        self.held[user_id] = held[-WS_REPLAY_BUFFER:]
+
+    def _release(self, user_id: int, event_ids: List[str]):
+        """Drop held events that another worker has delivered."""
+        delivered = set(event_ids)
+        held = [item for item in self.held.get(user_id, []) if item[1] not in delivered]
+        if held:
+            self.held[user_id] = held
+        else:
+            self.held.pop(user_id, None)
+
+    def _add(self, topic: str, websocket: WebSocket):
+        self.topics.setdefault(topic, set()).add(websocket)
+
+    def _remove(self, topic: str, websocket: WebSocket):
+        sockets = self.topics.get(topic)
+        if sockets:
+            sockets.discard(websocket)
+            if not sockets:
+                del self.topics[topic]
+
+    def subscribe(self, websocket: WebSocket, topic: str):
+        """Switch the socket's conversation view to topic (one view per socket)."""
+        previous = self.views.get(websocket)
+        if previous == topic:
+            return
+        if previous:
+            self._remove(previous, websocket)
+        self.views[websocket] = topic
+        self._add(topic, websocket)
+
+    async def _writer(self, outbox: Outbox):
+        websocket = outbox.websocket
+        while True:
+            enqueued_at, frame = await outbox.queue.get()
+            send = websocket.send_bytes(frame) if isinstance(frame, bytes) else websocket.send_text(frame)
             try:
-                await connection.send_json(message)
+                await asyncio.wait_for(send, timeout=WS_SEND_TIMEOUT)
+            except asyncio.CancelledError:
+                raise
             except Exception:
-                # Drop broken connections silently
-                try:
-                    await connection.close()
-                except Exception:
-                    pass
-                self.disconnect(connection)
+                # Broken or stuck connection: drop it silently
+                self._stats["send_errors"] += 1
+                await self._close(websocket)
+                return
+            outbox.sent += 1
+            outbox.last_lag_ms = (time.perf_counter() - enqueued_at) * 1000
+            outbox.max_lag_ms = max(outbox.max_lag_ms, outbox.last_lag_ms)
+
+    async def _close(self, websocket: WebSocket, code: int = 1000):
+        self.disconnect(websocket)
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def _enqueue(self, outbox: Outbox, frame):
+        item = (time.perf_counter(), frame)
+        try:
+            outbox.queue.put_nowait(item)
+            return
+        except asyncio.QueueFull:
+            pass
+        if self.policy == "drop":
+            # Keep the newest events; the client catches up on its next reload
+            outbox.queue.get_nowait()
+            outbox.queue.put_nowait(item)
+            outbox.dropped += 1
+            self._stats["dropped"] += 1
+        else:
+            self._stats["slow_disconnects"] += 1
+            print(f"🐢 Disconnecting slow WebSocket client ({outbox.queue.qsize()} events pending)")
+            # Unsubscribe now so no further events are queued; 1013 = try again later
+            self.disconnect(outbox.websocket)
+            asyncio.create_task(self._close(outbox.websocket, code=1013))
+
+    async def _send(self, connections: Iterable[WebSocket], message: dict):
+        # Encode once per wire format, not once per connection
+        frames = {}
+        for connection in list(connections):
+            outbox = self.outboxes.get(connection)
+            if not outbox:
+                continue
+            frame = frames.get(outbox.encoding)
+            if frame is None:
+                frame = frames[outbox.encoding] = encode_frame(message, outbox.encoding)
+                self._stats["encodes"] += 1
+            self._enqueue(outbox, frame)
+            self._stats["frames"] += 1
+
+    async def send(self, websocket: WebSocket, message: dict):
+        """Send to one socket through its queue (keeps ordering with published events)."""
+        await self._send((websocket,), message)
+
+    async def _deliver(self, topic: str, message: dict, event_id: str):
+        """Handle a backplane event: worker-internal bookkeeping, then fan-out to this worker's sockets."""
+        if message.get("type") == "held_delivered" and "worker" in message:
+            # Internal to the workers: nothing is sent to clients
+            self._release(int(topic[5:]), message["event_ids"])
+            return
+        if message.get("type") == "presence" and "worker" in message:
+            event = self._track_presence(message)
+            for group_id in message.get("group_ids") or []:
+                await self._fanout(group_topic(group_id), event, event_id)
+            return
+        await self._fanout(topic, message, event_id)
+
+    async def _fanout(self, topic: str, message: dict, event_id: str):
+        """Number an event on topic, keep it for replay and deliver it to the topic's sockets."""
+        seq = self.seqs.get(topic, 0) + 1
+        self.seqs[topic] = seq
+        event = {**message, "topic": topic, "seq": seq, "epoch": self.epoch}
+        ring = self.replay.get(topic)
+        if ring is None:
+            ring = self.replay[topic] = deque(maxlen=WS_REPLAY_BUFFER)
+        ring.append(event)
+        if topic == BROADCAST_TOPIC:
+            await self._send(self.active_connections, event)
+        elif topic.startswith("user:"):
+            user_id = int(topic[5:])
+            if user_id in self.user_sockets:
+                await self._send(self.user_sockets[user_id], event)
+            elif user_id not in self.presence:
+                # Not connected anywhere yet; otherwise the worker with the user's socket delivers it
+                self._hold(user_id, event_id, event)
+        else:
+            await self._send(self.topics.get(topic, ()), event)
+
+    def socket_topics(self, websocket: WebSocket) -> List[str]:
+        """Every topic the socket receives events from."""
+        topics = [BROADCAST_TOPIC]
+        if websocket in self.users:
+            topics.append(user_topic(self.users[websocket]))
+        if websocket in self.views:
+            topics.append(self.views[websocket])
+        return topics
+
+    async def resume(self, websocket: WebSocket, positions: Dict[str, int], epoch: Optional[str]):
+        """Replay events the socket missed since the given per-topic seqs, or tell it to resync."""
+        outbox = self.outboxes.get(websocket)
+        if not outbox:
+            return
+        for topic in self.socket_topics(websocket):
+            if topic not in positions:
+                continue
+            current = self.seqs.get(topic, 0)
+            try:
+                last = int(positions[topic])
+            except (TypeError, ValueError):
+                last = -1
+            if epoch == self.epoch and last == current:
+                continue
+            ring = self.replay.get(topic)
+            if epoch == self.epoch and 0 <= last < current and ring and ring[0]["seq"] <= last + 1:
+                missed = [event for event in ring if event["seq"] > last]
+                for event in missed:
+                    self._enqueue(outbox, encode_frame(event, outbox.encoding))
+                self._stats["replayed"] += len(missed)
+            else:
+                self._stats["resyncs"] += 1
+                self._enqueue(outbox, encode_frame({"type": "resync", "topic": topic, "seq": current, "epoch": self.epoch}, outbox.encoding))
+
+    async def publish(self, topic: str, message: dict):
+        """Send to the sockets subscribed to topic, on every worker."""
+        await self.backplane.publish(topic, message)
+
+    async def publish_group(self, group_id: Optional[int], message: dict):
+        await self.publish(group_topic(group_id), message)
+
+    async def publish_user(self, user_id: int, message: dict):
+        await self.publish(user_topic(user_id), message)
+
+    async def broadcast(self, message: dict):
+        """Send to every socket; only for project-wide events."""
+        await self.backplane.publish(BROADCAST_TOPIC, message)
+
+    def get_stats(self) -> dict:
+        connections = []
+        for outbox in self.outboxes.values():
+            connections.append({
+                "user_id": self.users.get(outbox.websocket),
+                "topic": self.views.get(outbox.websocket),
+                "encoding": outbox.encoding,
+                "queued": outbox.queue.qsize(),
+                "sent": outbox.sent,
+                "dropped": outbox.dropped,
+                "last_lag_ms": round(outbox.last_lag_ms, 1),
+                "max_lag_ms": round(outbox.max_lag_ms, 1),
+                "connected_s": round(time.time() - outbox.connected_at),
+            })
+        return {
+            "connections": len(self.outboxes),
+            "users": len(self.user_sockets),
+            "online_users": len(self.presence),
+            "held_users": len(self.held),
+            "topics": {topic: len(sockets) for topic, sockets in self.topics.items()},
+            "queue_size": self.queue_size,
+            "slow_consumer_policy": self.policy,
+            "backplane": self.backplane.get_stats(),
+            "epoch": self.epoch,
+            "replay_buffer": WS_REPLAY_BUFFER,
+            "json_encoder": "orjson" if orjson is not None else "json",
+            "msgpack_available": msgpack is not None,
+            **self._stats,
+            "per_connection": connections,
+        }
+
+# Shared manager for the app and helper modules
+manager = ConnectionManager(backplane=create_backplane())
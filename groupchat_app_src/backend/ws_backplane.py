@@ -0,0 +1,271 @@
+"""Pub/sub backplane that fans WebSocket events out across uvicorn workers.
+
+Every worker holds only its own sockets. Published events are wrapped in an envelope
+with a unique event id and handed to the backplane; each worker delivers them to its
+local sockets. The publishing worker delivers immediately and remembers the id, so its
+own echo (and any event seen twice, e.g. by the SQL poller) is dropped.
+
+WS_BACKPLANE selects the implementation:
+  memory - single process, no cross-worker fan-out (default)
+  redis  - Redis-compatible pub/sub (needs the optional redis package)
+  sql    - polls a ws_events table in the app database (no extra service needed)
+"""
+
+import os
+import json
+import uuid
+import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+WS_BACKPLANE = os.getenv("WS_BACKPLANE", "memory").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+WS_REDIS_CHANNEL = os.getenv("WS_REDIS_CHANNEL", "groupchat:ws")
+WS_POLL_INTERVAL = float(os.getenv("WS_POLL_INTERVAL", "0.25"))
+# Seconds SQL events are kept before the poller deletes them
+WS_EVENT_RETENTION = int(os.getenv("WS_EVENT_RETENTION", "60"))
+# Seconds a skipped ws_events id is re-checked, for inserts that commit out of order
+WS_POLL_GAP_WAIT = float(os.getenv("WS_POLL_GAP_WAIT", "5"))
+# Seconds published events are collected into one INSERT by the SQL backplane
+WS_SQL_BATCH_DELAY = float(os.getenv("WS_SQL_BATCH_DELAY", "0.05"))
+
+# Skipped ids tracked at most (older gaps are given up first)
+MAX_POLL_GAPS = 1000
+
+# Event ids remembered for deduplication
+SEEN_EVENTS = 4096
+
+# (topic, message, event id shared by every worker)
+Deliver = Callable[[str, dict, str], Awaitable[None]]
+
+class Backplane:
+    """Base backplane: local delivery with event-id deduplication."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._stats = {"published": 0, "received": 0, "duplicates": 0, "errors": 0}
+
+    async def start(self, deliver: Deliver):
+        self._deliver = deliver
+
+    async def stop(self):
+        pass
+
+    def _remember(self, event_id: str) -> bool:
+        """Record an event id; False if it was already delivered."""
+        if event_id in self._seen:
+            return False
+        self._seen[event_id] = None
+        if len(self._seen) > SEEN_EVENTS:
+            self._seen.popitem(last=False)
+        return True
+
+    async def _dispatch(self, envelope: Dict):
+        if not self._remember(envelope["event_id"]):
+            self._stats["duplicates"] += 1
+            return
+        if self._deliver:
+            await self._deliver(envelope["topic"], envelope["message"], envelope["event_id"])
+
+    async def publish(self, topic: str, message: dict):
+        envelope = {"event_id": uuid.uuid4().hex, "topic": topic, "message": message}
+        self._stats["published"] += 1
+        # Local sockets get the event right away; remote workers get it via _send
+        await self._dispatch(envelope)
+        try:
+            await self._send(envelope)
+        except Exception as e:
+            self._stats["errors"] += 1
+            print(f"⚠️  WebSocket backplane publish failed ({self.name}): {e}")
+
+    async def _send(self, envelope: Dict):
+        """Hand the envelope to other workers (nothing to do in-process)."""
+
+    async def _receive(self, envelope: Dict):
+        self._stats["received"] += 1
+        await self._dispatch(envelope)
+
+    def get_stats(self) -> dict:
+        return {"backend": self.name, **self._stats}
+
+class RedisBackplane(Backplane):
+    """Redis (or compatible) pub/sub channel shared by all workers."""
+
+    name = "redis"
+
+    def __init__(self, url: str = REDIS_URL, channel: str = WS_REDIS_CHANNEL):
+        super().__init__()
+        import redis.asyncio as redis
+        self._client = redis.from_url(url)
+        self.channel = channel
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Deliver):
+        await super().start(deliver)
+        self._listener = asyncio.create_task(self._listen())
+        print(f"✅ WebSocket backplane: redis channel '{self.channel}'")
+
+    async def stop(self):
+        if self._listener:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+        await self._client.aclose()
+
+    async def _send(self, envelope: Dict):
+        await self._client.publish(self.channel, json.dumps(envelope, default=str))
+
+    async def _listen(self):
+        while True:
+            try:
+                pubsub = self._client.pubsub()
+                await pubsub.subscribe(self.channel)
+                async for item in pubsub.listen():
+                    if item.get("type") == "message":
+                        await self._receive(json.loads(item["data"]))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"⚠️  Redis backplane listener error, reconnecting: {e}")
+                await asyncio.sleep(1)
+
+class SqlBackplane(Backplane):
+    """Fallback that stores events in the ws_events table and polls for new rows.
+
+    Published events are buffered for WS_SQL_BATCH_DELAY and written with one INSERT, so a
+    streamed answer's frequent message_delta events cost a few transactions, not one each.
+    The poller reads ids above the last one seen, plus ids it skipped recently: a lower id
+    can commit after a higher one, so each gap is re-checked for WS_POLL_GAP_WAIT seconds.
+    """
+
+    name = "sql"
+
+    def __init__(self, interval: float = WS_POLL_INTERVAL, batch_delay: float = WS_SQL_BATCH_DELAY):
+        super().__init__()
+        self.interval = interval
+        self.batch_delay = batch_delay
+        self._last_id = 0
+        # Skipped id -> loop time it was first missed
+        self._gaps: "OrderedDict[int, float]" = OrderedDict()
+        self._buffer = []
+        self._buffered = asyncio.Event()
+        self._poller: Optional[asyncio.Task] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+    async def start(self, deliver: Deliver):
+        from sqlalchemy import func, select
+        from db import SessionLocal, WsEvent
+        await super().start(deliver)
+        async with SessionLocal() as session:
+            self._last_id = (await session.execute(select(func.max(WsEvent.id)))).scalar() or 0
+        self._poller = asyncio.create_task(self._poll())
+        self._flusher = asyncio.create_task(self._flush_loop())
+        print(f"✅ WebSocket backplane: polling ws_events every {self.interval}s")
+
+    async def stop(self):
+        for task in (self._poller, self._flusher):
+            if task:
+                task.cancel()
+        await asyncio.gather(*(t for t in (self._poller, self._flusher) if t), return_exceptions=True)
+        # Events published just before shutdown still reach the other workers
+        await self._flush()
+
+    async def _send(self, envelope: Dict):
+        self._buffer.append({
+            "event_id": envelope["event_id"],
+            "topic": envelope["topic"],
+            "payload": json.dumps(envelope["message"], default=str),
+        })
+        self._buffered.set()
+
+    async def _flush(self):
+        if not self._buffer:
+            return
+        from sqlalchemy import insert
+        from db import SessionLocal, WsEvent
+        rows, self._buffer = self._buffer, []
+        async with SessionLocal() as session:
+            await session.execute(insert(WsEvent), rows)
+            await session.commit()
+
+    async def _flush_loop(self):
+        while True:
+            await self._buffered.wait()
+            # Let the events published meanwhile join this INSERT
+            await asyncio.sleep(self.batch_delay)
+            self._buffered.clear()
+            try:
+                await self._flush()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"⚠️  SQL backplane publish failed: {e}")
+
+    def _track(self, row_id: int, now: float):
+        """Advance past row_id, remembering any ids skipped on the way."""
+        self._gaps.pop(row_id, None)
+        if row_id <= self._last_id:
+            return
+        for missing in range(max(self._last_id + 1, row_id - MAX_POLL_GAPS), row_id):
+            self._gaps[missing] = now
+        self._last_id = row_id
+        while len(self._gaps) > MAX_POLL_GAPS:
+            self._gaps.popitem(last=False)
+
+    async def _poll(self):
+        from sqlalchemy import delete, select, or_
+        from db import SessionLocal, WsEvent
+        loop = asyncio.get_running_loop()
+        polls = 0
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                now = loop.time()
+                for gap, missed_at in list(self._gaps.items()):
+                    if now - missed_at > WS_POLL_GAP_WAIT:
+                        del self._gaps[gap]  # rolled back, or already deleted
+                condition = WsEvent.id > self._last_id
+                if self._gaps:
+                    condition = or_(condition, WsEvent.id.in_(list(self._gaps)))
+                async with SessionLocal() as session:
+                    res = await session.execute(select(WsEvent).where(condition).order_by(WsEvent.id).limit(1000))
+                    for row in res.scalars().all():
+                        self._track(row.id, now)
+                        await self._receive({"event_id": row.event_id, "topic": row.topic, "message": json.loads(row.payload)})
+
+                    polls += 1
+                    if polls % 200 == 0:
+                        cutoff = datetime.now() - timedelta(seconds=WS_EVENT_RETENTION)
+                        await session.execute(delete(WsEvent).where(WsEvent.created_at < cutoff))
+                        await session.commit()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._stats["errors"] += 1
+                print(f"⚠️  SQL backplane poll failed: {e}")
+
+    async def _receive(self, envelope: Dict):
+        # This worker's own events come back from the table; those are not news
+        if envelope["event_id"] in self._seen:
+            return
+        await super()._receive(envelope)
+
+def create_backplane(kind: str = WS_BACKPLANE) -> Backplane:
+    if kind == "redis":
+        try:
+            return RedisBackplane()
+        except ImportError:
+            print("⚠️  WS_BACKPLANE=redis but the 'redis' package is not installed - using in-process fan-out")
+    elif kind == "sql":
+        return SqlBackplane()
+    elif kind != "memory":
+        print(f"⚠️  Unknown WS_BACKPLANE '{kind}' - using in-process fan-out")
+    return Backplane()
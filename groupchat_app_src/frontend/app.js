@@ -143,6 +143,13 @@ let botAlwaysOn = localStorage.getItem("botAlwaysOn") === "true";
 const API = location.origin + "/api";
 let token = localStorage.getItem("token") || "";
 let ws;
+// Last event seq seen per topic and the server epoch they belong to, for resume after reconnect
+let wsEpoch = null;
+let wsLastSeq = {};
+let wsViewTopic = null;
+let wsResyncTimer = null;
+// Usernames with a connected WebSocket (from /api/presence and presence events)
+let onlineUsers = new Set();
 
 function showAuth() {
   authPanel.classList.remove("hidden");
@@ -270,14 +277,88 @@ async function callAPI(path, method = "GET", body) {
     method, headers, body: body ? JSON.stringify(body) : undefined
   });
   if (!res.ok) throw new Error((await res.json()).detail || ("HTTP "+res.status));
+  // Our own change: the next list load refetches instead of waiting for the delta event
+  if (method !== "GET") clearListCache();
   return res.json();
 }
 
-async function addMessage(m) {
+// Lists kept current by delta events (tasks_updated etc.); null = not loaded for this view
+const listCache = {tasks: null, meetings: null, milestones: null, "active-conflicts": null};
+const listFields = {tasks: "tasks", meetings: "meetings", milestones: "milestones", "active-conflicts": "conflicts"};
+let listCacheView = null;
+
+function clearListCache() {
+  for (const path in listCache) listCache[path] = null;
+}
+
+// Same result shape as callAPI(`/${path}?group_id=...`), served from the cache when loaded
+async function cachedList(path) {
+  const view = String(currentGroupId);
+  if (listCacheView !== view) {
+    clearListCache();
+    listCacheView = view;
+  }
+  if (!listCache[path]) {
+    const params = currentGroupId ? `?group_id=${currentGroupId}` : '';
+    const data = await callAPI(`/${path}${params}`);
+    if (listCacheView === view) listCache[path] = data[listFields[path]];
+    return data;
+  }
+  return {[listFields[path]]: listCache[path].slice()};
+}
+
+const deltaEvents = {
+  tasks_updated: ["tasks", "id"],
+  meetings_updated: ["meetings", "id"],
+  milestones_updated: ["milestones", "id"],
+  voting_updated: ["active-conflicts", "conflict_id"],
+};
+
+// Patch a cached list with a change event: snapshot, upserted/deleted, or (no data) invalidate
+function applyListDelta(data) {
+  const [path, idField] = deltaEvents[data.type];
+  if (data.group_id !== undefined && String(data.group_id) !== listCacheView) return;
+  if (data.snapshot) {
+    listCache[path] = data.snapshot;
+    return;
+  }
+  if (!data.upserted) {
+    listCache[path] = null;
+    return;
+  }
+  if (!listCache[path]) return;
+  const deleted = new Set(data.deleted || []);
+  const list = listCache[path].filter(e => !deleted.has(e[idField]));
+  for (const entity of data.upserted) {
+    const i = list.findIndex(e => e[idField] === entity[idField]);
+    if (i >= 0) list[i] = entity;
+    else list.unshift(entity);  // lists are newest first
+  }
+  if (path === "milestones") list.sort((a, b) => String(a.start_date).localeCompare(String(b.start_date)));
+  listCache[path] = list;
+}
+
+// Message ids shown in the current conversation, for cursor paging (see loadMessages)
+let oldestMessageId = null;
+let newestMessageId = null;
+let hasOlderMessages = false;
+let loadingOlderMessages = false;
+
+function messageShown(m) {
+  return m.id > 0 && messagesDiv.querySelector(`[data-message-id="${m.id}"]`);
+}
+
+async function addMessage(m, prepend = false) {
+  if (messageShown(m)) return;
+  if (m.id > 0) {
+    if (newestMessageId === null || m.id > newestMessageId) newestMessageId = m.id;
+    if (oldestMessageId === null || m.id < oldestMessageId) oldestMessageId = m.id;
+  }
   const el = document.createElement("div");
   const currentUser = localStorage.getItem("username");
   const isCurrentUser = !m.is_bot && m.username === currentUser;
   el.className = "message" + (m.is_bot ? " bot" : "") + (isCurrentUser ? " current-user" : "");
+  if (m.id) el.dataset.messageId = m.id;
   const meta = document.createElement("div");
   meta.className = "meta";
   
@@ -304,6 +385,7 @@ async function addMessage(m) {
   
   meta.textContent = `${displayName} • ${new Date(m.created_at).toLocaleString()}`;
   const body = document.createElement("div");
+  body.className = "message-body";
   body.style.whiteSpace = "pre-wrap";
   if (m.is_bot) {
     body.innerHTML = m.content
@@ -315,24 +397,112 @@ async function addMessage(m) {
   }
   el.appendChild(meta);
   el.appendChild(body);
+  if (messageShown(m)) return;  // arrived twice while the role lookup was pending
+  if (prepend) {
+    // Older history goes on top without moving what the user is reading
+    const fromBottom = messagesDiv.scrollHeight - messagesDiv.scrollTop;
+    messagesDiv.insertBefore(el, messagesDiv.firstChild);
+    messagesDiv.scrollTop = messagesDiv.scrollHeight - fromBottom;
+    return;
+  }
   messagesDiv.appendChild(el);
   messagesDiv.scrollTop = messagesDiv.scrollHeight;
 }
 
+// Messages edited after posting (e.g. tone adjustment finished in the background)
+function updateMessage(m) {
+  const el = messagesDiv.querySelector(`[data-message-id="${m.id}"]`);
+  if (!el) return;
+  const body = el.querySelector(".message-body");
+  if (body) body.textContent = m.content;
+}
+
+// Streamed bot answers: show tokens as they arrive, replaced by the saved message when done
+function appendStreamDelta(streamId, delta) {
+  let el = messagesDiv.querySelector(`[data-stream-id="${streamId}"]`);
+  if (!el) {
+    el = document.createElement("div");
+    el.className = "message bot streaming";
+    el.dataset.streamId = streamId;
+    const meta = document.createElement("div");
+    meta.className = "meta";
+    meta.textContent = `LLM Bot • ${new Date().toLocaleString()}`;
+    const body = document.createElement("div");
+    body.className = "stream-body";
+    body.style.whiteSpace = "pre-wrap";
+    el.appendChild(meta);
+    el.appendChild(body);
+    messagesDiv.appendChild(el);
+  }
+  el.querySelector(".stream-body").textContent += delta;
+  messagesDiv.scrollTop = messagesDiv.scrollHeight;
+}
+
+function removeStreamPlaceholder(streamId) {
+  const el = messagesDiv.querySelector(`[data-stream-id="${streamId}"]`);
+  if (el) el.remove();
+}
+
+// The answer failed part-way: keep what arrived, marked as interrupted
+function failStreamPlaceholder(streamId) {
+  const el = messagesDiv.querySelector(`[data-stream-id="${streamId}"]`);
+  if (!el) return;
+  el.classList.remove("streaming");
+  el.removeAttribute("data-stream-id");
+  el.querySelector(".stream-body").textContent += "\n⚠️ (answer interrupted)";
+}
+
+function messageParams() {
+  if (currentDmUserId) return `?dm_user_id=${currentDmUserId}`;
+  if (currentGroupId) return `?group_id=${currentGroupId}`;
+  return '?';
+}
+
+function resetMessages() {
+  messagesDiv.innerHTML = "";
+  oldestMessageId = null;
+  newestMessageId = null;
+  hasOlderMessages = false;
+}
+
+// Newest page of the conversation; older pages load on scroll (before_id cursor)
 async function loadMessages() {
-  let params = '';
-  if (currentDmUserId) {
-    params = `?dm_user_id=${currentDmUserId}`;
-  } else if (currentGroupId) {
-    params = `?group_id=${currentGroupId}`;
-  }
+  const params = messageParams();
   console.log('loadMessages: currentGroupId=', currentGroupId, 'currentDmUserId=', currentDmUserId, 'params=', params);
   const data = await callAPI(`/messages${params}`);
   console.log('loadMessages: received', data.messages.length, 'messages');
-  messagesDiv.innerHTML = "";
+  resetMessages();
+  hasOlderMessages = !!data.has_more;
   for (const m of data.messages) await addMessage(m);
 }
 
+async function loadOlderMessages() {
+  if (!hasOlderMessages || loadingOlderMessages || oldestMessageId === null) return;
+  loadingOlderMessages = true;
+  try {
+    const data = await callAPI(`/messages${messageParams()}&before_id=${oldestMessageId}`);
+    hasOlderMessages = !!data.has_more;
+    // Newest first, so each one goes on top of the previous
+    for (const m of data.messages.slice().reverse()) await addMessage(m, true);
+  } finally {
+    loadingOlderMessages = false;
+  }
+}
+
+// Fetch only what arrived after the newest shown message (after_id cursor), e.g. after a reconnect
+async function catchUpMessages() {
+  if (newestMessageId === null) return loadMessages();
+  let data;
+  do {
+    data = await callAPI(`/messages${messageParams()}&after_id=${newestMessageId}`);
+    for (const m of data.messages) await addMessage(m);
+  } while (data.has_more && data.messages.length);
+}
+
+messagesDiv.addEventListener("scroll", () => {
+  if (messagesDiv.scrollTop < 100) loadOlderMessages();
+});
+
 async function loadFiles() {
   try {
     const params = currentGroupId ? `?group_id=${currentGroupId}` : '';
@@ -386,14 +556,139 @@ async function deleteFile(fileId) {
   }
 }
 
+// Minimal MessagePack decoder for binary WebSocket frames (opt-in via localStorage wsEncoding=msgpack)
+const wsEncoding = localStorage.getItem("wsEncoding") === "msgpack" ? "msgpack" : "json";
+const utf8Decoder = new TextDecoder();
+
+function decodeMsgpack(buffer) {
+  const view = new DataView(buffer);
+  const bytes = new Uint8Array(buffer);
+  let pos = 0;
+  const str = (n) => { const s = utf8Decoder.decode(bytes.subarray(pos, pos + n)); pos += n; return s; };
+  const bin = (n) => { const b = bytes.slice(pos, pos + n); pos += n; return b; };
+  const arr = (n) => { const a = []; for (let i = 0; i < n; i++) a.push(read()); return a; };
+  const map = (n) => { const o = {}; for (let i = 0; i < n; i++) { const k = read(); o[k] = read(); } return o; };
+  function read() {
+    const t = bytes[pos++];
+    if (t <= 0x7f) return t;
+    if (t <= 0x8f) return map(t & 0x0f);
+    if (t <= 0x9f) return arr(t & 0x0f);
+    if (t <= 0xbf) return str(t & 0x1f);
+    if (t >= 0xe0) return t - 0x100;
+    let v;
+    switch (t) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: return bin(bytes[pos++]);
+      case 0xc5: v = view.getUint16(pos); pos += 2; return bin(v);
+      case 0xc6: v = view.getUint32(pos); pos += 4; return bin(v);
+      case 0xca: v = view.getFloat32(pos); pos += 4; return v;
+      case 0xcb: v = view.getFloat64(pos); pos += 8; return v;
+      case 0xcc: return bytes[pos++];
+      case 0xcd: v = view.getUint16(pos); pos += 2; return v;
+      case 0xce: v = view.getUint32(pos); pos += 4; return v;
+      case 0xcf: v = Number(view.getBigUint64(pos)); pos += 8; return v;
+      case 0xd0: v = view.getInt8(pos); pos += 1; return v;
+      case 0xd1: v = view.getInt16(pos); pos += 2; return v;
+      case 0xd2: v = view.getInt32(pos); pos += 4; return v;
+      case 0xd3: v = Number(view.getBigInt64(pos)); pos += 8; return v;
+      case 0xd9: return str(bytes[pos++]);
+      case 0xda: v = view.getUint16(pos); pos += 2; return str(v);
+      case 0xdb: v = view.getUint32(pos); pos += 4; return str(v);
+      case 0xdc: v = view.getUint16(pos); pos += 2; return arr(v);
+      case 0xdd: v = view.getUint32(pos); pos += 4; return arr(v);
+      case 0xde: v = view.getUint16(pos); pos += 2; return map(v);
+      case 0xdf: v = view.getUint32(pos); pos += 4; return map(v);
+    }
+    throw new Error("Unsupported msgpack type 0x" + t.toString(16));
+  }
+  return read();
+}
+
+// Tell the server which conversation this socket shows, so it only receives that topic.
+// On (re)connect, also ask it to replay what we missed since the last seen seqs.
+function sendSubscription(resume = false) {
+  if (!ws || ws.readyState !== WebSocket.OPEN) return;
+  const frame = currentDmUserId
+    ? {type: "subscribe", dm_user_id: currentDmUserId}
+    : {type: "subscribe", group_id: currentGroupId};
+  if (resume && wsEpoch) {
+    frame.epoch = wsEpoch;
+    frame.resume_from = wsLastSeq;
+  }
+  ws.send(JSON.stringify(frame));
+}
+
+// Reload everything the socket keeps fresh (after missed events that cannot be replayed)
+function resyncView() {
+  clearTimeout(wsResyncTimer);
+  wsResyncTimer = setTimeout(() => {
+    clearListCache();
+    catchUpMessages();
+    loadTasks();
+    loadSidebarTasks();
+    loadMeetings();
+    loadNextMeeting();
+    loadActiveConflicts();
+    loadDecisions();
+    loadFiles();
+    loadProjectPulse();
+  }, 100);
+}
+
+function resetSeqIfNewEpoch(epoch) {
+  if (epoch !== wsEpoch) {
+    wsEpoch = epoch;
+    wsLastSeq = {};
+  }
+}
+
+// Returns false for events already seen (replayed twice); resyncs when a gap shows up
+function trackSeq(data) {
+  resetSeqIfNewEpoch(data.epoch);
+  const last = wsLastSeq[data.topic];
+  if (last !== undefined && data.seq <= last) return false;
+  wsLastSeq[data.topic] = data.seq;
+  if (last !== undefined && data.seq > last + 1) resyncView();
+  return true;
+}
+
 function connectWS() {
   if (ws) ws.close();
   const proto = location.protocol === "https:" ? "wss" : "ws";
-  ws = new WebSocket(`${proto}://${location.host}/ws`);
+  ws = new WebSocket(`${proto}://${location.host}/ws?token=${encodeURIComponent(token)}&encoding=${wsEncoding}`);
+  // The server falls back to JSON text frames when msgpack is unavailable, so decode per frame
+  ws.binaryType = "arraybuffer";
+  ws.onopen = () => {
+    sendSubscription(true);
+    loadPresence();
+  };
   ws.onmessage = (ev) => {
     try {
-      const data = JSON.parse(ev.data);
+      const data = typeof ev.data === "string" ? JSON.parse(ev.data) : decodeMsgpack(ev.data);
+      if (data.type === "subscribed") {
+        resetSeqIfNewEpoch(data.epoch);
+        if (wsViewTopic && wsViewTopic !== data.topic) delete wsLastSeq[wsViewTopic];
+        wsViewTopic = data.topic;
+        if (wsLastSeq[data.topic] === undefined) wsLastSeq[data.topic] = data.seq;
+        return;
+      }
+      if (data.type === "subscribe_error") {
+        showNotification(data.detail, 'error');
+        return;
+      }
+      if (data.type === "resync") {
+        resetSeqIfNewEpoch(data.epoch);
+        wsLastSeq[data.topic] = data.seq;
+        resyncView();
+        return;
+      }
+      if (data.seq && !trackSeq(data)) return;
+      if (data.type === "message_delta") appendStreamDelta(data.stream_id, data.delta);
+      if (data.type === "message_stream_error") failStreamPlaceholder(data.stream_id);
       if (data.type === "message") {
+        if (data.stream_id) removeStreamPlaceholder(data.stream_id);
         addMessage(data.message);
         if (data.message.content && data.message.content.includes('Your role has been set to:')) {
           loadTeamRoles();
@@ -405,9 +700,16 @@ function connectWS() {
           loadActiveConflicts();
         }
       }
-      if (data.type === "clear") messagesDiv.innerHTML = "";
+      if (data.type === "message_updated") updateMessage(data.message);
+      if (data.type === "notice") showNotification(data.message, 'info');
+      if (data.type === "presence" && data.username) {
+        if (data.online) onlineUsers.add(data.username);
+        else onlineUsers.delete(data.username);
+        renderPresence();
+      }
+      if (data.type === "clear") resetMessages();
+      if (deltaEvents[data.type]) applyListDelta(data);
       if (data.type === "tasks_updated") {
-        console.log('Received tasks_updated event, reloading tasks...');
         loadTasks();
         loadSidebarTasks();
         const tasksDecisionsContent = $("tasksDecisionsContent");
@@ -419,7 +721,6 @@ function connectWS() {
         }
       }
       if (data.type === "meetings_updated") {
-        console.log('Received meetings_updated event, reloading meetings...');
         loadMeetings();
         loadNextMeeting();
       }
@@ -458,7 +759,14 @@ function connectWS() {
       }
     } catch (e) {}
   };
-  ws.onclose = () => {
+  ws.onclose = (ev) => {
+    // Deltas may be missed while disconnected
+    clearListCache();
+    // Token rejected at the handshake: sign in again instead of retrying
+    if (ev.code === 4401) {
+      logoutBtn.onclick();
+      return;
+    }
     if (token) {
       setTimeout(connectWS, 2000);
     }
@@ -567,7 +875,7 @@ async function editTaskInline(task, taskElement) {
   
   // Get milestones for dropdown
   const params = currentGroupId ? `?group_id=${currentGroupId}` : '';
-  const milestonesData = await callAPI(`/milestones${params}`);
+  const milestonesData = await cachedList("milestones");
   const milestones = milestonesData.milestones;
   
   // Create inline edit form
@@ -660,7 +968,7 @@ window.deleteTask = async function(taskId) {
 async function loadArchivedTasks() {
   try {
     const params = currentGroupId ? `?group_id=${currentGroupId}` : '';
-    const tasksData = await callAPI(`/tasks${params}`);
+    const tasksData = await cachedList("tasks");
     const tasks = tasksData.tasks.filter(t => t.status === 'completed').slice(0, 10);
     
     let users = [];
@@ -710,11 +1018,11 @@ async function loadArchivedTasks() {
 async function loadSidebarTasks() {
   try {
     const params = currentGroupId ? `?group_id=${currentGroupId}` : '';
-    const tasksData = await callAPI(`/tasks${params}`);
+    const tasksData = await cachedList("tasks");
     const tasks = tasksData.tasks.filter(t => t.status === 'pending').slice(0, 5);
     
     // Get milestones for display
-    const milestonesData = await callAPI(`/milestones${params}`);
+    const milestonesData = await cachedList("milestones");
     const milestones = milestonesData.milestones;
     
     let users = [];
@@ -794,7 +1102,7 @@ let pulseExpanded = false;
 async function loadNextMeeting() {
   try {
     const params = currentGroupId ? `?group_id=${currentGroupId}` : '';
-    const data = await callAPI(`/meetings${params}`);
+    const data = await cachedList("meetings");
     const now = new Date();
     const upcoming = data.meetings.filter(m => new Date(m.datetime) > now).sort((a,b) => new Date(a.datetime) - new Date(b.datetime));
     const container = $("sidebarMeetings");
@@ -836,7 +1144,7 @@ async function loadNextMeeting() {
 async function editMeetingSidebar(meetingId) {
   try {
     const params = currentGroupId ? `?group_id=${currentGroupId}` : '';
-    const data = await callAPI(`/meetings${params}`);
+    const data = await cachedList("meetings");
     const meeting = data.meetings.find(m => m.id === meetingId);
     if (!meeting) return;
     await populateMeetingAttendees();
@@ -924,8 +1232,7 @@ let brainSummariesVisible = true;
 async function loadProjectPulse() {
   try {
     const params = currentGroupId ? `?group_id=${currentGroupId}` : '';
-    const tasks = await callAPI(`/tasks${params}`);
-    const milestonesData = await callAPI(`/milestones${params}`);
+    const milestonesData = await cachedList("milestones");
     const shipDateData = await callAPI(`/project/ship-date${params}`);
     
     if (!milestonesData.milestones || milestonesData.milestones.length === 0) {
@@ -935,14 +1242,8 @@ async function loadProjectPulse() {
     }
     
     const milestones = milestonesData.milestones;
-    const taskData = tasks.tasks.map(t => ({milestone: milestones[0]?.title || "General", status: t.status}));
-    const currentDate = new Date().toISOString().split('T')[0];
-    
-    const pulse = await callAPI("/project-pulse", "POST", {
-      current_date: currentDate,
-      milestones: milestones,
-      tasks: taskData
-    });
+    // Phase status, days left and task progress come from the server's date columns
+    const pulse = await callAPI(`/project-pulse${params}`);
     
     const container = $("projectPulse");
     const shipDateHtml = shipDateData.ship_date ? `<div style="font-size:10px;margin-bottom:8px;cursor:pointer" onclick="editShipDate()">📅 Ship: ${shipDateData.ship_date}</div>` : '<input type="date" id="shipDateInput" placeholder="Set ship date" style="width:100%;padding:6px;margin-bottom:8px;border:1px solid #374151;border-radius:4px;background:#0b1220;color:#e2e8f0;font-size:11px">';
@@ -954,8 +1255,8 @@ async function loadProjectPulse() {
       const urgencyBg = phase.urgency === "CRITICAL" ? "#fecaca" : phase.urgency === "WARNING" ? "#fed7aa" : "#dbeafe";
       const urgencyIcon = phase.urgency === "CRITICAL" ? "🚨" : phase.urgency === "WARNING" ? "⚠️" : "";
       
-      const milestoneIndex = pulseExpanded ? i : i;
-      const milestone = milestones[milestoneIndex];
+      const milestone = milestones.find(m => m.id === phase.id);
+      if (!milestone) return;
       const riskColor = milestone.risk_level === 'high' ? '#fecaca' : milestone.risk_level === 'medium' ? '#fed7aa' : '#d1fae5';
       const riskIcon = milestone.risk_level === 'high' ? '🔴' : milestone.risk_level === 'medium' ? '🟡' : '🟢';
       const card = document.createElement("div");
@@ -1169,7 +1470,7 @@ async function saveMilestoneEdit() {
 async function editSingleMilestone(milestoneId) {
   try {
     const params = currentGroupId ? `?group_id=${currentGroupId}` : '';
-    const data = await callAPI(`/milestones${params}`);
+    const data = await cachedList("milestones");
     const milestone = data.milestones.find(m => m.id === milestoneId);
     if (!milestone) return;
     
@@ -1187,7 +1488,7 @@ async function editSingleMilestone(milestoneId) {
 async function editMilestones() {
   try {
     const params = currentGroupId ? `?group_id=${currentGroupId}` : '';
-    const data = await callAPI(`/milestones${params}`);
+    const data = await cachedList("milestones");
     if (data.milestones.length === 0) {
       suggestMilestones();
       return;
@@ -1245,7 +1546,7 @@ function closeClearMilestonesModal() {
 async function confirmClearMilestones() {
   try {
     const params = currentGroupId ? `?group_id=${currentGroupId}` : '';
-    const data = await callAPI(`/milestones${params}`);
+    const data = await cachedList("milestones");
     for (const m of data.milestones) {
       await callAPI(`/milestones/${m.id}`, 'DELETE');
     }
@@ -1579,7 +1880,7 @@ async function loadTasks() {
   try {
     console.log('loadTasks() called');
     const params = currentGroupId ? `?group_id=${currentGroupId}` : '';
-    const data = await callAPI(`/tasks${params}`);
+    const data = await cachedList("tasks");
     console.log('Received tasks:', data.tasks.length);
     let tasks = data.tasks;
     
@@ -1732,7 +2033,7 @@ saveTaskBtn.onclick = async () => {
 async function loadMeetings() {
   try {
     const params = currentGroupId ? `?group_id=${currentGroupId}` : '';
-    const data = await callAPI(`/meetings${params}`);
+    const data = await cachedList("meetings");
     meetingList.innerHTML = "";
     if (data.meetings.length === 0) {
       meetingList.innerHTML = '<div class="no-meetings">No meetings scheduled</div>';
@@ -2084,7 +2385,7 @@ saveZoomLinkBtn.onclick = async () => {
 async function loadActiveConflicts() {
   try {
     const params = currentGroupId ? `?group_id=${currentGroupId}` : '';
-    const data = await callAPI(`/active-conflicts${params}`);
+    const data = await cachedList("active-conflicts");
     const container = $("activeConflicts");
     if (!container) return;
     
@@ -2429,6 +2730,7 @@ async function switchToGroup(groupId, groupName) {
     localStorage.setItem('currentGroupId', groupId);
     localStorage.setItem('currentGroupName', groupName);
   }
+  sendSubscription();
   await callAPI('/user/last-active-group', 'POST', {group_id: groupId});
   $("dashboard").classList.add("hidden");
   $("chat").classList.remove("hidden");
@@ -2655,6 +2957,22 @@ function toggleDMs() {
   }
 }
 
+async function loadPresence() {
+  try {
+    const data = await callAPI('/presence');
+    onlineUsers = new Set(data.online.map(u => u.username));
+    renderPresence();
+  } catch (e) {
+    console.error('Failed to load presence:', e);
+  }
+}
+
+function renderPresence() {
+  document.querySelectorAll('#dmUsersContainer [data-username]').forEach(el => {
+    el.textContent = `${onlineUsers.has(el.dataset.username) ? '🟢' : '⚪'} ${el.dataset.username}`;
+  });
+}
+
 async function loadDMUsers() {
   try {
     const data = await callAPI('/users');
@@ -2664,10 +2982,11 @@ async function loadDMUsers() {
     data.users.filter(u => u.username !== currentUser).forEach(u => {
       const el = document.createElement('div');
       el.style.cssText = `padding:8px;margin:4px 0;background:#ffffff;color:#000;border-radius:4px;cursor:pointer;font-size:12px`;
-      el.textContent = u.username;
+      el.dataset.username = u.username;
       el.onclick = () => switchToDM(u.username);
       container.appendChild(el);
     });
+    renderPresence();
   } catch (e) {
     console.error('Failed to load DM users:', e);
   }
@@ -2682,6 +3001,7 @@ async function switchToDM(username) {
     currentDmUserId = user.id;
     currentDmUsername = username;
     currentGroupId = null;
+    sendSubscription();
     
     document.getElementById('dashboard').classList.add('hidden');
     document.getElementById('chat').classList.remove('hidden');
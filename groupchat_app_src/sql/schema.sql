@@ -1,4 +1,7 @@
 -- Optional: If you prefer manual SQL instead of SQLAlchemy auto-creation
+-- Mirrors the models in backend/db.py. On startup the app still runs backend/migrations.py;
+-- every migration is idempotent, so on a database created from this file they only record
+-- the schema version. Keep this file in step with db.py when a migration changes the schema.
 CREATE DATABASE IF NOT EXISTS groupchat CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
 CREATE USER IF NOT EXISTS 'chatuser'@'localhost' IDENTIFIED BY 'ChatPass123!';
 GRANT ALL PRIVILEGES ON groupchat.* TO 'chatuser'@'localhost';
@@ -6,30 +9,71 @@ FLUSH PRIVILEGES;
 
 USE groupchat;
 
+-- users and groups reference each other, so the tables are created with checks off
+SET FOREIGN_KEY_CHECKS = 0;
+
 CREATE TABLE IF NOT EXISTS users (
   id INT AUTO_INCREMENT PRIMARY KEY,
-  username VARCHAR(50) NOT NULL UNIQUE,
+  username VARCHAR(50) NOT NULL,
   password_hash VARCHAR(255) NOT NULL,
   role VARCHAR(100) NULL,
-  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+  last_active_group_id INT NULL,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE INDEX ix_users_username (username),
+  CONSTRAINT fk_user_last_active_group FOREIGN KEY (last_active_group_id) REFERENCES `groups`(id) ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS `groups` (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  name VARCHAR(100) NOT NULL UNIQUE,
+  created_by INT NOT NULL,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  CONSTRAINT fk_group_creator FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS group_memberships (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  user_id INT NOT NULL,
+  group_id INT NOT NULL,
+  role VARCHAR(100) NULL,
+  joined_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  CONSTRAINT fk_membership_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+  CONSTRAINT fk_membership_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 CREATE TABLE IF NOT EXISTS messages (
   id INT AUTO_INCREMENT PRIMARY KEY,
   user_id INT NULL,
   content TEXT NOT NULL,
-  is_bot BOOLEAN DEFAULT FALSE,
-  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-  CONSTRAINT fk_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+  is_bot BOOLEAN NOT NULL DEFAULT FALSE,
+  group_id INT NULL,
+  dm_user_id INT NULL,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  CONSTRAINT fk_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+  CONSTRAINT fk_message_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE,
+  CONSTRAINT fk_message_dm_user FOREIGN KEY (dm_user_id) REFERENCES users(id) ON DELETE CASCADE,
+  INDEX ix_messages_dm_user_id (dm_user_id),
+  -- Keyset pagination for group chats and DMs
+  INDEX ix_messages_group_dm_id (group_id, dm_user_id, id),
+  INDEX ix_messages_user_dm_id (user_id, dm_user_id, id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
--- Project Settings Table
-CREATE TABLE IF NOT EXISTS project_settings (
+-- File bytes and extracted text live in the blob store under their SHA-256 keys
+CREATE TABLE IF NOT EXISTS uploaded_files (
   id INT AUTO_INCREMENT PRIMARY KEY,
-  ship_date DATE NULL,
+  filename VARCHAR(255) NOT NULL,
+  file_id VARCHAR(255) NOT NULL,
+  user_id INT NOT NULL,
+  blob_key VARCHAR(64) NULL,
+  text_key VARCHAR(64) NULL,
+  size INT NULL,
+  summary TEXT NULL,
   group_id INT NULL,
-  updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-  CONSTRAINT fk_project_settings_group FOREIGN KEY (group_id) REFERENCES groups(id) ON DELETE CASCADE
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  CONSTRAINT fk_file_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+  CONSTRAINT fk_file_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE,
+  INDEX ix_uploaded_files_blob_key (blob_key),
+  INDEX ix_uploaded_files_text_key (text_key)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- Project Milestones Table
@@ -44,24 +88,81 @@ CREATE TABLE IF NOT EXISTS milestones (
   dependencies TEXT NULL,
   created_by INT NOT NULL,
   group_id INT NULL,
-  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   CONSTRAINT fk_milestone_user FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE CASCADE,
-  CONSTRAINT fk_milestone_group FOREIGN KEY (group_id) REFERENCES groups(id) ON DELETE CASCADE
+  CONSTRAINT fk_milestone_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE,
+  INDEX ix_milestones_group_dates (group_id, start_date, end_date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+CREATE TABLE IF NOT EXISTS tasks (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  content TEXT NOT NULL,
+  extracted_from_message_id INT NULL,
+  assigned_to TEXT NULL,
+  due_date DATE NULL,
+  milestone_id INT NULL,
+  status ENUM('pending', 'completed') NOT NULL,
+  pending_assignment BOOLEAN NOT NULL DEFAULT FALSE,
+  assignment_expires_at DATETIME NULL,
+  group_id INT NULL,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  CONSTRAINT fk_task_message FOREIGN KEY (extracted_from_message_id) REFERENCES messages(id) ON DELETE CASCADE,
+  CONSTRAINT fk_task_milestone FOREIGN KEY (milestone_id) REFERENCES milestones(id) ON DELETE SET NULL,
+  CONSTRAINT fk_task_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE,
+  INDEX ix_tasks_group_status_created (group_id, status, created_at),
+  INDEX ix_tasks_pending_assignment_expires (pending_assignment, assignment_expires_at),
+  INDEX ix_tasks_status_due (status, due_date)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- One row per (task, assigned user); tasks.assigned_to keeps the display string
+CREATE TABLE IF NOT EXISTS task_assignees (
+  task_id INT NOT NULL,
+  user_id INT NOT NULL,
+  PRIMARY KEY (task_id, user_id),
+  CONSTRAINT fk_task_assignee_task FOREIGN KEY (task_id) REFERENCES tasks(id) ON DELETE CASCADE,
+  CONSTRAINT fk_task_assignee_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+  INDEX ix_task_assignees_user_task (user_id, task_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
--- Decision Log for Project Audit Trail
+CREATE TABLE IF NOT EXISTS meetings (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  title VARCHAR(255) NOT NULL,
+  datetime DATETIME NOT NULL,
+  duration_minutes INT NOT NULL,
+  zoom_link TEXT NULL,
+  transcript_file_id INT NULL,
+  attendees TEXT NULL,
+  created_by INT NOT NULL,
+  group_id INT NULL,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  CONSTRAINT fk_meeting_transcript FOREIGN KEY (transcript_file_id) REFERENCES uploaded_files(id) ON DELETE SET NULL,
+  CONSTRAINT fk_meeting_user FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE CASCADE,
+  CONSTRAINT fk_meeting_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE,
+  INDEX ix_meetings_group_datetime (group_id, datetime)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Project Settings Table
+CREATE TABLE IF NOT EXISTS project_settings (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  ship_date DATE NULL,
+  group_id INT NULL,
+  updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  CONSTRAINT fk_project_settings_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Decision Log for Project Audit Trail (enum columns store the Python member names)
 CREATE TABLE IF NOT EXISTS decision_log (
   id INT AUTO_INCREMENT PRIMARY KEY,
   decision_text VARCHAR(500) NOT NULL,
   rationale TEXT NOT NULL,
-  category ENUM('Methodology', 'Logistics', 'Topic') NOT NULL,
+  category ENUM('methodology', 'logistics', 'topic') NOT NULL,
   decision_type ENUM('locked', 'resolved', 'consensus') NOT NULL,
   created_by VARCHAR(100) NOT NULL,
   chat_reference_id INT NULL,
   group_id INT NULL,
-  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   CONSTRAINT fk_decision_log_message FOREIGN KEY (chat_reference_id) REFERENCES messages(id) ON DELETE SET NULL,
-  CONSTRAINT fk_decision_log_group FOREIGN KEY (group_id) REFERENCES groups(id) ON DELETE CASCADE
+  CONSTRAINT fk_decision_log_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- Dialectic Engine: Decision Log Table
@@ -72,27 +173,27 @@ CREATE TABLE IF NOT EXISTS decisions (
   selected_option ENUM('A', 'B', 'C') NOT NULL,
   reasoning TEXT NOT NULL,
   decided_by INT NOT NULL,
-  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   CONSTRAINT fk_decision_user FOREIGN KEY (decided_by) REFERENCES users(id) ON DELETE CASCADE,
-  INDEX idx_conflict_id (conflict_id)
+  INDEX ix_decisions_conflict_id (conflict_id)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- Voting System: Active Conflicts Table
 CREATE TABLE IF NOT EXISTS active_conflicts (
   id INT AUTO_INCREMENT PRIMARY KEY,
-  conflict_id VARCHAR(255) NOT NULL UNIQUE,
+  conflict_id VARCHAR(255) NOT NULL,
   user_statement TEXT NOT NULL,
   conflicting_evidence TEXT NOT NULL,
   source_file VARCHAR(255) NOT NULL,
   severity ENUM('low', 'medium', 'high') NOT NULL,
   reason TEXT NOT NULL,
-  expires_at TIMESTAMP NOT NULL,
-  is_resolved BOOLEAN DEFAULT FALSE,
+  expires_at DATETIME NOT NULL,
+  is_resolved BOOLEAN NOT NULL DEFAULT FALSE,
   group_id INT NULL,
-  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-  INDEX idx_conflict_id (conflict_id),
-  INDEX idx_expires_at (expires_at),
-  CONSTRAINT fk_active_conflicts_group FOREIGN KEY (group_id) REFERENCES groups(id) ON DELETE CASCADE
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  UNIQUE INDEX ix_active_conflicts_conflict_id (conflict_id),
+  INDEX ix_active_conflicts_group_resolved_expires (group_id, is_resolved, expires_at),
+  CONSTRAINT fk_active_conflicts_group FOREIGN KEY (group_id) REFERENCES `groups`(id) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
 -- Voting System: Votes Table
@@ -102,8 +203,37 @@ CREATE TABLE IF NOT EXISTS conflict_votes (
   user_id INT NOT NULL,
   selected_option ENUM('A', 'B', 'C') NOT NULL,
   reasoning TEXT NOT NULL,
-  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   CONSTRAINT fk_vote_user FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
   UNIQUE KEY unique_user_vote (conflict_id, user_id),
-  INDEX idx_conflict_id (conflict_id)
+  INDEX ix_conflict_votes_conflict_id (conflict_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- WebSocket events shared between workers by the SQL backplane (short-lived rows)
+CREATE TABLE IF NOT EXISTS ws_events (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  event_id VARCHAR(32) NOT NULL,
+  topic VARCHAR(100) NOT NULL,
+  payload LONGTEXT NOT NULL,
+  created_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  INDEX ix_ws_events_created_at (created_at)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Saved messages still waiting for the background pipeline
+CREATE TABLE IF NOT EXISTS message_events (
+  id INT AUTO_INCREMENT PRIMARY KEY,
+  message_id INT NOT NULL UNIQUE,
+  payload TEXT NOT NULL,
+  claimed_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+  CONSTRAINT fk_message_event_message FOREIGN KEY (message_id) REFERENCES messages(id) ON DELETE CASCADE,
+  INDEX ix_message_events_claimed_at (claimed_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Migrations applied to this database (see backend/migrations.py)
+CREATE TABLE IF NOT EXISTS schema_version (
+  version INT NOT NULL PRIMARY KEY,
+  description VARCHAR(255) NOT NULL,
+  applied_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+SET FOREIGN_KEY_CHECKS = 1;